@@ -1,11 +1,16 @@
-from flask import Flask, request, render_template, redirect, url_for, flash, jsonify
-import openai
-import base64
+from flask import Flask, request, render_template, redirect, url_for, flash, jsonify, g, Response
 import os
 import json
-from PIL import Image
-import io
-from compare import OdooIntegration
+import time
+from compare import OdooIntegration, parsed_ok
+from extraction import extract_document, spool_upload
+from jobs import JobQueue, QueueFull
+from batch import BatchRunner, iter_uploads
+from cache import cache_key, cache_stats
+from drafts import DraftStore
+from speculate import Speculator
+import llm
+import metrics
 from dotenv import load_dotenv
 import logging
 
@@ -14,44 +19,127 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = "your_secret_key"
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
-
-# Set your OpenAI API key
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# Set up logging; DEBUG includes extracted text and parsed documents
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
 
 # Initialize Odoo integration
 odoo_integration = OdooIntegration()
 
-def resize_image(image_bytes, max_size=800):
-    """Resize image to reduce token usage"""
+# Background extraction: capacity is set here, not by the number of web workers
+EXTRACT_CONCURRENCY = int(os.getenv("EXTRACT_CONCURRENCY", "4"))
+EXTRACT_QUEUE_DEPTH = int(os.getenv("EXTRACT_QUEUE_DEPTH", "32"))
+extraction_jobs = JobQueue(
+    "extract",
+    max_workers=EXTRACT_CONCURRENCY,
+    max_pending=EXTRACT_QUEUE_DEPTH,
+    ttl=int(os.getenv("EXTRACT_JOB_TTL", "3600")),
+)
+
+# Batch ingestion runs one or two large jobs at a time; each has its own
+# per-stage concurrency inside BatchRunner
+BATCH_DIR = os.getenv("BATCH_DIR", "batches")
+batch_jobs = JobQueue("batch", max_workers=int(os.getenv("BATCH_JOBS", "1")), max_pending=8)
+batch_runners = {}
+
+# Validated orders wait here under a short ID instead of travelling in URLs;
+# set DRAFT_STORE_PATH to share drafts between worker processes
+drafts = DraftStore(
+    path=os.getenv("DRAFT_STORE_PATH") or None,
+    ttl=int(os.getenv("DRAFT_TTL", str(24 * 3600))),
+)
+
+# Parse and validate extracted text while the user reviews it, so /confirm
+# usually finds both done; SPECULATIVE_CONFIRM=0 waits for /confirm instead.
+# A parse that fell back to the placeholder (say, after an OpenAI error) is
+# not kept, so /confirm parses again
+SPECULATIVE_CONFIRM = os.getenv("SPECULATIVE_CONFIRM", "1") != "0"
+speculation = Speculator(
+    odoo_integration.parse_extracted_text,
+    odoo_integration.validate_data,
+    max_workers=int(os.getenv("SPECULATIVE_WORKERS", "2")),
+    ttl=int(os.getenv("SPECULATIVE_TTL", "600")),
+    usable=parsed_ok,
+)
+
+# Values other objects already keep, read when /metrics is scraped
+def _cache_counts(field):
+    return lambda: {(namespace,): counts[field] for namespace, counts in cache_stats().items()}
+
+def _cache_ratios():
+    return {
+        (namespace,): counts["hits"] / (counts["hits"] + counts["misses"])
+        for namespace, counts in cache_stats().items() if counts["hits"] + counts["misses"]
+    }
+
+# Streaming /confirm searches Odoo this many lines at a time, so the first
+# matches reach the live order builder before the whole document is searched
+STREAM_MATCH_CHUNK_SIZE = int(os.getenv("STREAM_MATCH_CHUNK_SIZE", "5"))
+
+metrics.CallbackGauge("cache_hits_total", "Cache hits by namespace.", ["namespace"],
+                      _cache_counts("hits"), kind="counter")
+metrics.CallbackGauge("cache_misses_total", "Cache misses by namespace.", ["namespace"],
+                      _cache_counts("misses"), kind="counter")
+metrics.CallbackGauge("cache_hit_ratio", "Share of cache lookups that hit.", ["namespace"], _cache_ratios)
+metrics.CallbackGauge(
+    "parser_documents_total", "Documents parsed by outcome (local, cache, llm).", ["outcome"],
+    lambda: {(outcome,): count for outcome, count in odoo_integration.local_parser.counts.items()},
+    kind="counter",
+)
+metrics.CallbackGauge(
+    "speculation_events_total", "Speculative parse/validate runs started and reused at /confirm.", ["event"],
+    lambda: {(event,): value for event, value in speculation.stats().items() if event != "entries"},
+    kind="counter",
+)
+metrics.CallbackGauge(
+    "llm_gateway_events_total", "LLM gateway retries, hedges and throttling.", ["event"],
+    lambda: {(event,): value for event, value in llm.gateway.stats().items()
+             if event not in ("prompt_tokens", "completion_tokens")},
+    kind="counter",
+)
+metrics.CallbackGauge(
+    "job_queue_pending", "Jobs queued or running.", ["queue"],
+    lambda: {("extract",): extraction_jobs.stats()["pending"], ("batch",): batch_jobs.stats()["pending"]},
+)
+
+@app.before_request
+def start_trace():
+    g.started = time.perf_counter()
+    metrics.start_trace()
+
+@app.after_request
+def finish_trace(response):
+    trace = metrics.finish_trace()
+    if not hasattr(g, "started"):
+        return response
+    elapsed = time.perf_counter() - g.started
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    if metrics.METRICS_ENABLED and endpoint != "/metrics":
+        metrics.HTTP_SECONDS.observe(elapsed, endpoint=endpoint, method=request.method,
+                                     status=response.status_code)
+    if trace:
+        logging.info(f"{request.method} {endpoint} {response.status_code} {elapsed:.3f}s "
+                     f"{metrics.format_trace(trace)}")
+    return response
+
+def extract_upload(upload, report):
+    """Extract an upload's text and start parsing and validating it for /confirm."""
+    extracted_text, parsed = extract_document(upload, report)
+    if parsed:
+        odoo_integration.remember_parse(extracted_text, parsed)
+    if SPECULATIVE_CONFIRM:
+        speculation.start(extracted_text)
+    return extracted_text
+
+def extract_spooled(upload):
+    report = {}
+    metrics.start_trace()
     try:
-        # Open image
-        img = Image.open(io.BytesIO(image_bytes))
-        
-        # Convert to RGB if necessary
-        if img.mode in ('RGBA', 'LA', 'P'):
-            img = img.convert('RGB')
-        
-        # Calculate new size maintaining aspect ratio
-        width, height = img.size
-        if width > height:
-            new_width = min(width, max_size)
-            new_height = int((height * new_width) / width)
-        else:
-            new_height = min(height, max_size)
-            new_width = int((width * new_height) / height)
-        
-        # Resize image
-        img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        
-        # Save to bytes
-        buffer = io.BytesIO()
-        img.save(buffer, format='JPEG', quality=75, optimize=True)
-        return buffer.getvalue()
-    except Exception as e:
-        logging.error(f"Error resizing image: {e}")
-        return image_bytes
+        return {"text": extract_upload(upload, report), "report": report}
+    finally:
+        upload.close()
+        trace = metrics.finish_trace()
+        if trace:
+            logging.info(f"extraction job {metrics.format_trace(trace)}")
 
 @app.route("/", methods=["GET"])
 def index():
@@ -68,49 +156,133 @@ def extract():
         flash("No image file selected.")
         return redirect(url_for("index"))
 
-    try:
-        # Read and resize the image
-        image_bytes = image.read()
-        
-        # Resize image to reduce token usage
-        resized_image_bytes = resize_image(image_bytes)
-        base64_image = base64.b64encode(resized_image_bytes).decode("utf-8")
+    if request.values.get("mode") == "async":
+        # Spool the upload now; the request is gone by the time a worker runs
+        upload = spool_upload(image.stream)
+        try:
+            job_id = extraction_jobs.submit(extract_spooled, upload)
+        except QueueFull as e:
+            upload.close()
+            logging.warning(f"Rejecting extraction: {e}")
+            response = jsonify({"error": "Extraction queue is full, please retry shortly."})
+            response.headers["Retry-After"] = "5"
+            return response, 429
+        return jsonify({
+            "job_id": job_id,
+            "status_url": url_for("extract_status", job_id=job_id),
+            "result_url": url_for("extract_result", job_id=job_id),
+        }), 202
 
-        logging.debug("Sending image to OpenAI API for text extraction.")
-        
-        # Use the old OpenAI API format (compatible with openai==0.28)
-        response = openai.ChatCompletion.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text", 
-                            "text": "Extract all text from this image. Focus on: company names, invoice/PO numbers, dates, product names, quantities, prices, and totals. Provide clear, structured text."
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}",
-                                "detail": "low"
-                            },
-                        },
-                    ],
-                }
-            ],
-            max_tokens=800,
-        )
-        
-        extracted_text = response.choices[0].message["content"]
-        logging.debug(f"Extracted Text: {extracted_text}")
+    try:
+        report = {}
+        extracted_text = extract_upload(image.stream, report)
         flash("Text extracted successfully!")
-        return render_template("index.html", extracted_text=extracted_text)
+        return render_template("index.html", extracted_text=extracted_text, report=report)
     except Exception as e:
         logging.error(f"Error extracting text: {e}")
         flash(f"Error extracting text: {str(e)}")
         return redirect(url_for("index"))
 
+@app.route("/extract/jobs/<job_id>", methods=["GET"])
+def extract_status(job_id):
+    job = extraction_jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Unknown or expired job."}), 404
+    result = job["result"] or {}
+    return jsonify({
+        "job_id": job_id,
+        "status": job["status"],
+        "extracted_text": result.get("text"),
+        "report": result.get("report"),
+        "error": job["error"],
+    })
+
+@app.route("/extract/jobs/<job_id>/result", methods=["GET"])
+def extract_result(job_id):
+    job = extraction_jobs.get(job_id)
+    if not job:
+        flash("Extraction job not found or expired.")
+        return redirect(url_for("index"))
+    if job["status"] == "failed":
+        flash(f"Error extracting text: {job['error']}")
+        return redirect(url_for("index"))
+    if job["status"] != "done":
+        flash("Extraction is still running, please wait.")
+        return redirect(url_for("index"))
+    flash("Text extracted successfully!")
+    return render_template("index.html", extracted_text=job["result"]["text"],
+                           report=job["result"]["report"])
+
+@app.route("/batch", methods=["POST"])
+def batch():
+    uploads = [(f.filename, f.read()) for f in request.files.getlist("documents") if f and f.filename]
+    if not uploads:
+        return jsonify({"error": "Upload one or more images or a zip file as 'documents'."}), 400
+
+    create_type = request.form.get("create_type") or None
+    if create_type not in (None, "po", "invoice"):
+        return jsonify({"error": "create_type must be 'po' or 'invoice'."}), 400
+
+    # The same set of files maps to the same progress file, so re-posting
+    # an interrupted batch resumes it
+    os.makedirs(BATCH_DIR, exist_ok=True)
+    batch_key = cache_key(create_type, *sorted(cache_key(data) for _, data in uploads))[:16]
+    runner = BatchRunner(
+        odoo_integration,
+        create_type=create_type,
+        progress_path=os.path.join(BATCH_DIR, f"{batch_key}.progress.jsonl"),
+    )
+    documents = list(iter_uploads(uploads))
+    try:
+        job_id = batch_jobs.submit(runner.run, documents)
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 429
+    for stale_id in [j for j in batch_runners if not batch_jobs.get(j)]:
+        del batch_runners[stale_id]
+    batch_runners[job_id] = runner
+    return jsonify({
+        "job_id": job_id,
+        "documents": len(documents),
+        "status_url": url_for("batch_status", job_id=job_id),
+    }), 202
+
+@app.route("/batch/<job_id>", methods=["GET"])
+def batch_status(job_id):
+    job = batch_jobs.get(job_id)
+    runner = batch_runners.get(job_id)
+    if not job or not runner:
+        return jsonify({"error": "Unknown or expired batch."}), 404
+    return jsonify({
+        "job_id": job_id,
+        "status": job["status"],
+        "error": job["error"],
+        "progress": runner.progress(),
+        "report": runner.report() if job["status"] == "done" else None,
+    })
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    return jsonify({"status": "ok"})
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    health = odoo_integration.health()
+    health["jobs"] = {"extract": extraction_jobs.stats(), "batch": batch_jobs.stats()}
+    ready = health["odoo"]["connected"]
+    if not ready:
+        # Served by something other than app.py or wsgi.py: start connecting now
+        odoo_integration.connect_in_background()
+    health["status"] = "ready" if ready else "not ready"
+    return jsonify(health), 200 if ready else 503
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/api/parser/stats", methods=["GET"])
+def parser_stats():
+    return jsonify(odoo_integration.local_parser.stats())
+
 @app.route("/confirm", methods=["POST"])
 def confirm():
     extracted_text = request.form.get("extracted_text")
@@ -118,23 +290,28 @@ def confirm():
         flash("No extracted text provided.")
         return redirect(url_for("index"))
 
-    # Parse the extracted text
-    logging.debug("Parsing extracted text.")
-    parsed_data = odoo_integration.parse_extracted_text(extracted_text)
+    if request.form.get("stream") == "1" and not speculation.ready(extracted_text):
+        # Open the live order builder now; it fills in from draft_stream
+        # as the text is parsed and validated
+        draft_id = drafts.create(None, text=extracted_text, status="pending")
+        return redirect(url_for("live_order_draft", draft_id=draft_id))
+
+    # Parse and validate the text, reusing the work /extract started when
+    # the text (or what it parses to) is unchanged
+    logging.debug("Parsing and validating extracted text.")
+    parsed_data, validated_data = speculation.confirm(extracted_text)
     if not parsed_data:
         flash("Failed to parse extracted text. Please check the format.")
         return redirect(url_for("index"))
 
-    # Validate the parsed data
-    logging.debug("Validating parsed data against Odoo database.")
-    validated_data = odoo_integration.validate_data(parsed_data)
     if not validated_data or not validated_data.get('products'):
         flash("No valid products found in the database. Please check if products exist in Odoo.")
         return redirect(url_for("index"))
 
     flash("Data parsed and validated successfully!")
     # Redirect to live order builder instead of static confirm page
-    return redirect(url_for("live_order", **{'data': json.dumps(validated_data)}))
+    draft_id = drafts.create(validated_data)
+    return redirect(url_for("live_order_draft", draft_id=draft_id))
 
 @app.route("/live-order")
 def live_order():
@@ -150,15 +327,140 @@ def live_order():
         flash("Invalid order data.")
         return redirect(url_for("index"))
 
+@app.route("/live-order/<draft_id>")
+def live_order_draft(draft_id):
+    draft = drafts.get(draft_id)
+    if not draft:
+        flash("This order draft has expired. Please process the document again.")
+        return redirect(url_for("index"))
+    if draft.get("status") == "failed":
+        flash(draft.get("error") or "Failed to process the document.")
+        return redirect(url_for("index"))
+    return render_template(
+        "live_order.html",
+        validated_data=draft["validated"] or {},
+        draft_id=draft_id,
+        draft_lines=draft["lines"],
+        stream_url=url_for("draft_stream", draft_id=draft_id) if draft["validated"] is None else None,
+    )
+
+@app.route("/api/drafts/<draft_id>", methods=["GET"])
+def get_draft(draft_id):
+    draft = drafts.get(draft_id)
+    if not draft:
+        return jsonify({"error": "Unknown or expired draft."}), 404
+    return jsonify(draft)
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def draft_events(draft_id, draft):
+    """Server-sent events that fill in a pending draft.
+
+    ``token`` events carry the LLM's reply as it is written, ``parsed``
+    the invoice's lines, ``vendor`` the resolved vendor and ``line`` each
+    line's matched products. ``done`` carries the validated order, which
+    is saved in the draft; ``error`` ends the stream instead when a stage
+    fails. Work /extract started speculatively is reused, not repeated.
+    """
+    if draft["validated"] is not None:
+        yield sse("done", draft["validated"])
+        return
+
+    def failed(message):
+        drafts.update(draft_id, status="failed", error=message)
+        return sse("error", {"message": message})
+
+    try:
+        yield sse("status", {"stage": "parsing"})
+        parsed_data = None
+        for event, data in speculation.iter_stage("parse", odoo_integration.iter_parse, draft["text"], "parsed"):
+            if event == "token":
+                yield sse("token", {"text": data})
+            else:
+                parsed_data = data
+        if not parsed_data:
+            yield failed("Failed to parse extracted text. Please check the format.")
+            return
+        yield sse("parsed", {
+            "vendor": parsed_data.get("vendor"),
+            "invoice_number": parsed_data.get("invoice_number"),
+            "currency": parsed_data.get("currency"),
+            "lines": [
+                {"index": index, "name": product.get("name"), "quantity": product.get("quantity"),
+                 "price": product.get("price")}
+                for index, product in enumerate(parsed_data.get("products", []))
+            ],
+        })
+
+        yield sse("status", {"stage": "validating"})
+        validated_data = None
+        validation = lambda parsed: odoo_integration.iter_validation(parsed, STREAM_MATCH_CHUNK_SIZE)
+        for event, data in speculation.iter_stage("validate", validation, parsed_data, "validated"):
+            if event == "validated":
+                validated_data = data
+            else:
+                yield sse(event, data)
+        if not validated_data or not validated_data.get("products"):
+            yield failed("No valid products found in the database. Please check if products exist in Odoo.")
+            return
+        drafts.update(draft_id, validated=validated_data, status="ready")
+        yield sse("done", validated_data)
+    except Exception as e:
+        logging.error(f"Error streaming draft {draft_id}: {e}")
+        yield failed(f"Error processing the document: {e}")
+
+@app.route("/api/drafts/<draft_id>/stream", methods=["GET"])
+def draft_stream(draft_id):
+    draft = drafts.get(draft_id)
+    if not draft:
+        return jsonify({"error": "Unknown or expired draft."}), 404
+    return Response(draft_events(draft_id, draft), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/api/drafts/<draft_id>/lines", methods=["PATCH", "POST"])
+def update_draft_lines(draft_id):
+    payload = request.get_json(silent=True) or {}
+    changes = payload.get("lines")
+    if not isinstance(changes, list):
+        return jsonify({"error": "Expected a JSON body with a 'lines' list."}), 400
+    try:
+        draft = drafts.update_lines(draft_id, changes, replace=bool(payload.get("replace")))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not draft:
+        return jsonify({"error": "Unknown or expired draft."}), 404
+    return jsonify({"lines": draft["lines"]})
+
+def simulated_order(validated_data, create_type):
+    """Order details for the success page when Odoo is not connected."""
+    import random
+    import datetime
+
+    order_id = random.randint(1000, 9999)
+    return {
+        "id": order_id,
+        "type": create_type,
+        "vendor_name": validated_data.get("vendor_name", "New Vendor"),
+        "date_created": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "products": validated_data.get("products", []),
+        "total_amount": sum(product.get('price', 0) * product.get('quantity', 1)
+                            for product in validated_data.get('products', [])),
+        "currency": validated_data.get("currency", "USD"),
+        "status": "Simulated",
+        "invoice_number": validated_data.get("invoice_number", f"SIM-{order_id}"),
+        "is_simulation": True
+    }
+
 @app.route("/create", methods=["POST"])
 def create():
     create_type = request.form.get("create_type")
+    draft_id = request.form.get("draft_id")
     validated_data_str = request.form.get("validated_data")
 
-    logging.debug(f"Received create request - Type: {create_type}")
-    logging.debug(f"Order data: {validated_data_str}")
+    logging.debug(f"Received create request - Type: {create_type}, draft: {draft_id}")
 
-    if not validated_data_str:
+    if not draft_id and not validated_data_str:
         flash("No validated data provided.")
         return redirect(url_for("index"))
 
@@ -167,8 +469,15 @@ def create():
         return redirect(url_for("index"))
 
     try:
-        # Parse JSON string back to dict
-        validated_data = json.loads(validated_data_str)
+        if draft_id:
+            # The draft already holds the validated order and chosen lines
+            validated_data = drafts.order(draft_id)
+            if validated_data is None:
+                flash("This order draft has expired or is still being validated. Please try again.")
+                return redirect(url_for("index"))
+        else:
+            # Parse JSON string back to dict
+            validated_data = json.loads(validated_data_str)
         
         if not validated_data.get("products"):
             flash("No products found to create order.")
@@ -176,43 +485,36 @@ def create():
         
         logging.debug(f"Products in order: {len(validated_data.get('products', []))}")
         
-        # Try actual creation first, fall back to simulation
-        try:
-            result = odoo_integration.create_po_or_invoice(validated_data, create_type)
-            if result:
-                # Real creation succeeded
-                flash(f"✅ {create_type.upper()} created successfully in Odoo with ID: {result}!")
-                return redirect(url_for("order_history"))
-        except Exception as e:
-            logging.warning(f"Real creation failed, using simulation: {e}")
-        
-        # Simulation fallback
-        import random
-        import datetime
-        
-        # Generate simulated order data
-        order_id = random.randint(1000, 9999)
-        current_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # Calculate total
-        total_amount = sum(product.get('price', 0) * product.get('quantity', 1) 
-                          for product in validated_data.get('products', []))
-        
-        simulated_order = {
-            "id": order_id,
-            "type": create_type,
-            "vendor_name": validated_data.get("vendor_name", "New Vendor"),
-            "date_created": current_date,
-            "products": validated_data.get("products", []),
-            "total_amount": total_amount,
-            "currency": validated_data.get("currency", "USD"),
-            "status": "Simulated",
-            "invoice_number": validated_data.get("invoice_number", f"SIM-{order_id}"),
-            "is_simulation": True
-        }
-        
-        # Redirect to success page with order data
-        return render_template("order_success.html", order=simulated_order)
+        if not odoo_integration.wait_connected():
+            # Demo mode: nothing can have been written, so show a simulated order
+            odoo_integration.history.record(create_type, None, validated_data, state="simulated")
+            return render_template("order_success.html", order=simulated_order(validated_data, create_type))
+
+        result = odoo_integration.create_po_or_invoice(validated_data, create_type)
+        outcome = odoo_integration.last_create_status() or {}
+        if result and outcome.get("status") == "existing":
+            flash(f"ℹ️ This {create_type.upper()} already exists in Odoo with ID: {result}. Nothing new was created.")
+            return redirect(url_for("order_history"))
+        if result:
+            logging.info(f"{create_type} {result} created with {odoo_integration.last_create_rpcs()} Odoo RPCs")
+            flash(f"✅ {create_type.upper()} created successfully in Odoo with ID: {result}!")
+            return redirect(url_for("order_history"))
+
+        back = url_for("live_order_draft", draft_id=draft_id) if draft_id else url_for("index")
+        if outcome.get("status") == "in_flight":
+            flash(f"This {create_type.upper()} is already being created by another request. "
+                  "Check the order history before submitting it again.")
+            return redirect(url_for("order_history"))
+        if outcome.get("written"):
+            retry = ("Submitting again is safe: Odoo is checked for it first."
+                     if validated_data.get("invoice_number") else
+                     "It has no invoice number to look it up by, so check Odoo before submitting again.")
+            flash(f"⚠️ The connection to Odoo failed after the {create_type.upper()} was sent, so it may "
+                  f"have been created. {retry}")
+        else:
+            flash(f"❌ Could not create the {create_type.upper()}: {outcome.get('error') or 'unknown error'}. "
+                  f"No {create_type.upper()} was written to Odoo.")
+        return redirect(back)
         
     except json.JSONDecodeError as e:
         logging.error(f"JSON decode error: {e}")
@@ -233,8 +535,33 @@ def cart():
 def order_history():
     return render_template("order_history.html")
 
+@app.route("/api/history", methods=["GET"])
+def history_api():
+    """A page of order history; filters and ``cursor`` come from the query string."""
+    args = request.args
+    if args.get("type") not in (None, "", "po", "invoice"):
+        return jsonify({"error": "type must be 'po' or 'invoice'."}), 400
+    # Documents created or changed in Odoo show up from the next page load
+    odoo_integration.history.sync_in_background()
+    try:
+        page = odoo_integration.history.query(
+            create_type=args.get("type") or None,
+            vendor=args.get("vendor") or None,
+            vendor_id=args.get("vendor_id") or None,
+            invoice_number=args.get("invoice_number") or None,
+            state=args.get("state") or None,
+            date_from=args.get("date_from") or None,
+            date_to=args.get("date_to") or None,
+            cursor=args.get("cursor") or None,
+            limit=args.get("limit") or 50,
+        )
+    except ValueError:
+        return jsonify({"error": "Invalid vendor_id, limit or cursor."}), 400
+    page["synced_at"] = odoo_integration.history.synced_at
+    return jsonify(page)
+
 if __name__ == "__main__":
-    if not odoo_integration.connect_to_odoo():
-        logging.error("Failed to connect to Odoo. Please check your configuration.")
-    else:
-        app.run(debug=True)
+    # Serve right away; Odoo is connected (and reconnected) in the background
+    # and /readyz reports 503 until it is
+    odoo_integration.connect_in_background()
+    app.run(port=int(os.getenv("PORT", "5000")), debug=os.getenv("FLASK_DEBUG") == "1")
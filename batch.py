@@ -0,0 +1,309 @@
+"""Batch ingestion of invoice and purchase-order scans.
+
+Documents go through resize -> extract -> parse -> validate -> create as a
+pipeline: each document runs on its own worker, and every stage has its
+own concurrency limit, so slow vision calls overlap with Odoo lookups of
+documents that are already further along. Progress is appended to a JSONL
+file keyed by the document's content hash; re-running with the same file
+skips documents that already finished.
+
+    python batch.py invoices/ --create po --report report.json
+    python batch.py scans.zip --progress scans.progress.jsonl
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from extraction import (EXTRACTION_MODE, PIPELINE_MODE, document_kind, extract_document,
+                        extraction_cache, extraction_key, new_report, read_image_text, resize_image)
+
+DOCUMENT_EXTENSIONS = (".png", ".jpg", ".jpeg", ".pdf", ".tif", ".tiff")
+STAGES = ("resize", "extract", "parse", "validate", "create")
+DEFAULT_CONCURRENCY = {
+    "resize": int(os.getenv("BATCH_RESIZE_CONCURRENCY", "4")),
+    "extract": int(os.getenv("BATCH_EXTRACT_CONCURRENCY", "4")),
+    "parse": int(os.getenv("BATCH_PARSE_CONCURRENCY", "4")),
+    "validate": int(os.getenv("BATCH_VALIDATE_CONCURRENCY", "4")),
+    "create": int(os.getenv("BATCH_CREATE_CONCURRENCY", "2")),
+}
+BULK_CREATE_SIZE = int(os.getenv("BATCH_BULK_CREATE_SIZE", "50"))
+
+
+def is_document(name):
+    return name.lower().endswith(DOCUMENT_EXTENSIONS) and not os.path.basename(name).startswith(".")
+
+
+def iter_documents(path):
+    """Yield ``(name, load)`` pairs for a directory or a zip file.
+
+    ``load`` reads the bytes on demand so only documents currently in the
+    pipeline are held in memory.
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            names = sorted(n for n in archive.namelist() if is_document(n))
+        for name in names:
+            def load(name=name):
+                with zipfile.ZipFile(path) as archive:
+                    return archive.read(name)
+            yield name, load
+        return
+    if os.path.isdir(path):
+        for root, _, files in sorted(os.walk(path)):
+            for filename in sorted(files):
+                if is_document(filename):
+                    full_path = os.path.join(root, filename)
+
+                    def load(full_path=full_path):
+                        with open(full_path, "rb") as f:
+                            return f.read()
+                    yield os.path.relpath(full_path, path), load
+        return
+    if os.path.isfile(path):
+        def load():
+            with open(path, "rb") as f:
+                return f.read()
+        yield os.path.basename(path), load
+        return
+    raise FileNotFoundError(path)
+
+
+def iter_uploads(files):
+    """Yield ``(name, load)`` pairs for in-memory ``(filename, bytes)`` uploads.
+
+    Zip uploads are expanded into their member documents.
+    """
+    import io
+    for filename, data in files:
+        if filename.lower().endswith(".zip"):
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                for name in sorted(archive.namelist()):
+                    if is_document(name):
+                        member = archive.read(name)
+                        yield f"{filename}/{name}", lambda member=member: member
+        elif is_document(filename):
+            yield filename, lambda data=data: data
+
+
+class BatchRunner:
+    """Run documents through the ingestion pipeline with per-stage limits."""
+
+    def __init__(self, integration, create_type=None, concurrency=None, progress_path=None,
+                 bulk_create=False):
+        self.integration = integration
+        self.create_type = create_type
+        self.bulk_create = bulk_create
+        self.pending_creates = []
+        self.concurrency = dict(DEFAULT_CONCURRENCY)
+        self.concurrency.update(concurrency or {})
+        self.stage_slots = {
+            stage: threading.BoundedSemaphore(max(1, self.concurrency[stage]))
+            for stage in STAGES
+        }
+        self.progress_path = progress_path
+        self.completed = self._load_progress()
+        self.results = []
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def _load_progress(self):
+        completed = {}
+        if self.progress_path and os.path.exists(self.progress_path):
+            with open(self.progress_path) as f:
+                for line in f:
+                    try:
+                        result = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # partially written line from an interrupted run
+                    if result.get("status") == "done":
+                        completed[result["sha256"]] = result
+        return completed
+
+    def _record(self, result):
+        with self.lock:
+            self.results.append(result)
+            if self.progress_path and not result.get("resumed"):
+                with open(self.progress_path, "a") as f:
+                    f.write(json.dumps(result) + "\n")
+
+    def process(self, name, load):
+        """Run one document through every stage and record its result."""
+        started = time.perf_counter()
+        result = {"document": name, "status": "failed", "stage": None, "error": None}
+        try:
+            image_bytes = load()
+            result["sha256"] = hashlib.sha256(image_bytes).hexdigest()
+            previous = self.completed.get(result["sha256"])
+            if previous:
+                self._record(dict(previous, document=name, resumed=True))
+                return
+
+            result["stage"] = "extract"
+            report = new_report()
+            text = parsed = None
+            if (PIPELINE_MODE == "fused" or EXTRACTION_MODE == "adaptive"
+                    or document_kind(image_bytes) != "image"):
+                # Pages and tiles are prepared and read concurrently inside this
+                # call, which also keeps its own cache
+                with self.stage_slots["extract"]:
+                    text, parsed = extract_document(image_bytes, report)
+            else:
+                key = extraction_key(image_bytes)
+                text = extraction_cache.get(key)
+                if text is None:
+                    result["stage"] = "resize"
+                    with self.stage_slots["resize"]:
+                        resized = resize_image(image_bytes)
+                    result["stage"] = "extract"
+                    with self.stage_slots["extract"]:
+                        text = read_image_text(resized, report)
+                    extraction_cache.set(key, text)
+            del image_bytes
+            result["extraction"] = {k: report[k] for k in ("tiles", "bytes_sent", "prompt_tokens",
+                                                           "completion_tokens")}
+
+            if parsed is None:
+                result["stage"] = "parse"
+                with self.stage_slots["parse"]:
+                    parsed = self.integration.parse_extracted_text(text)
+            if not parsed:
+                raise ValueError("could not parse extracted text")
+
+            result["stage"] = "validate"
+            with self.stage_slots["validate"]:
+                validated = self.integration.validate_data(parsed)
+            if not validated or not validated.get("products"):
+                raise ValueError("no products matched in Odoo")
+            result.update({
+                "vendor_name": validated.get("vendor_name"),
+                "vendor_id": validated.get("vendor_id"),
+                "invoice_number": validated.get("invoice_number"),
+                "products": len(validated["products"]),
+                "currency": validated.get("currency"),
+            })
+
+            if self.create_type and self.bulk_create:
+                # Created together with other documents once all are validated
+                result["stage"] = "create"
+                result["seconds"] = round(time.perf_counter() - started, 3)
+                with self.lock:
+                    self.pending_creates.append((result, validated))
+                return
+
+            if self.create_type:
+                result["stage"] = "create"
+                with self.stage_slots["create"]:
+                    record_id = self.integration.create_po_or_invoice(validated, self.create_type)
+                if not record_id:
+                    raise ValueError(f"{self.create_type} creation failed")
+                result["record_id"] = record_id
+                result["create_type"] = self.create_type
+                result["rpcs"] = self.integration.last_create_rpcs()
+
+            result["stage"] = None
+            result["status"] = "done"
+        except Exception as e:
+            logging.error(f"Batch document {name} failed at {result['stage']}: {e}")
+            result["error"] = str(e)
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        self._record(result)
+
+    def run(self, documents):
+        """Process ``(name, load)`` pairs and return the per-document results."""
+        documents = list(documents)
+        self.total = len(documents)
+        workers = sum(self.concurrency[stage] for stage in STAGES)
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="batch") as pool:
+            for name, load in documents:
+                pool.submit(self.process, name, load)
+        self._create_pending()
+        return self.results
+
+    def _create_pending(self):
+        """Create the documents held back in bulk mode, one call per chunk."""
+        pending, self.pending_creates = self.pending_creates, []
+        for start in range(0, len(pending), BULK_CREATE_SIZE):
+            chunk = pending[start:start + BULK_CREATE_SIZE]
+            try:
+                record_ids = self.integration.create_many([v for _, v in chunk], self.create_type)
+                rpcs = self.integration.last_create_rpcs()
+                for (result, _), record_id in zip(chunk, record_ids):
+                    if not record_id:
+                        result["error"] = f"{self.create_type} is already being created by another request"
+                        continue
+                    result.update(stage=None, status="done", record_id=record_id,
+                                  create_type=self.create_type, rpcs=rpcs)
+            except Exception as e:
+                logging.error(f"Bulk {self.create_type} creation failed: {e}")
+                for result, _ in chunk:
+                    result["error"] = str(e)
+            for result, _ in chunk:
+                self._record(result)
+
+    def progress(self):
+        with self.lock:
+            done = sum(1 for r in self.results if r["status"] == "done")
+            return {"total": self.total, "processed": len(self.results),
+                    "done": done, "failed": len(self.results) - done}
+
+    def report(self):
+        """Summary plus per-document results, ordered by document name."""
+        return {
+            "summary": self.progress(),
+            "concurrency": self.concurrency,
+            "create_type": self.create_type,
+            "documents": sorted(self.results, key=lambda r: r["document"]),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process a folder or zip of invoice scans.")
+    parser.add_argument("path", help="directory, zip file or single image")
+    parser.add_argument("--create", choices=["po", "invoice"],
+                        help="create a purchase order or invoice for each document")
+    parser.add_argument("--bulk-create", action="store_true",
+                        help=f"create documents {BULK_CREATE_SIZE} at a time in a single call")
+    parser.add_argument("--progress", help="JSONL progress file (default: <path>.progress.jsonl)")
+    parser.add_argument("--report", help="write the JSON report here")
+    for stage in STAGES:
+        parser.add_argument(f"--{stage}-concurrency", type=int, default=DEFAULT_CONCURRENCY[stage],
+                            dest=f"{stage}_concurrency", help=f"parallel {stage} operations")
+    options = parser.parse_args()
+
+    from compare import OdooIntegration
+    integration = OdooIntegration()
+    if not integration.connect_to_odoo():
+        return 1
+
+    runner = BatchRunner(
+        integration,
+        create_type=options.create,
+        concurrency={stage: getattr(options, f"{stage}_concurrency") for stage in STAGES},
+        progress_path=options.progress or f"{options.path.rstrip(os.sep)}.progress.jsonl",
+        bulk_create=options.bulk_create,
+    )
+    started = time.perf_counter()
+    runner.run(iter_documents(options.path))
+    report = runner.report()
+    report["summary"]["seconds"] = round(time.perf_counter() - started, 1)
+
+    if options.report:
+        with open(options.report, "w") as f:
+            json.dump(report, f, indent=2)
+    for result in report["documents"]:
+        detail = result.get("record_id") or result.get("error") or f"{result.get('products', 0)} products"
+        print(f"{result['status']:>6}  {result['document']}  {detail}")
+    summary = report["summary"]
+    print(f"{summary['done']}/{summary['total']} documents done, "
+          f"{summary['failed']} failed in {summary['seconds']}s")
+    return 0 if not summary["failed"] else 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
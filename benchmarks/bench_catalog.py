@@ -0,0 +1,66 @@
+"""Load, match and incremental-refresh timings of the product catalog index.
+
+    python -m benchmarks.bench_catalog --catalog-size 100000 --lines 40
+"""
+import argparse
+import random
+import time
+
+from benchmarks import stub_odoo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--catalog-size", type=int, default=100000)
+    parser.add_argument("--lines", type=int, default=40)
+    parser.add_argument("--changes", type=int, default=100, help="products edited before refresh")
+    options = parser.parse_args()
+
+    stub = stub_odoo.StubOdoo().seed(options.catalog_size)
+    server, url = stub_odoo.start(stub)
+    stub_odoo.configure_env(url)
+
+    import contextlib
+    import io
+    import compare
+    from catalog import ProductCatalog
+
+    integration = compare.OdooIntegration()
+    with contextlib.redirect_stdout(io.StringIO()):
+        integration.connect_to_odoo()
+    catalog = ProductCatalog(integration._execute, refresh_interval=0)
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        catalog.load()
+    print(f"load: {len(catalog)} products in {time.perf_counter() - started:.2f}s, "
+          f"{stub.total_calls()} rpcs")
+
+    rng = random.Random(1)
+    names = stub.product_names(options.lines)
+    queries = {
+        "exact name": names,
+        "partial": [" ".join(name.split()[:2]) for name in names],
+        "code": [f"SKU-{rng.randrange(options.catalog_size):06d}" for _ in names],
+        "misspelt": [name[:-3] + name[-2:] + "x" for name in names],
+    }
+    for label, batch in queries.items():
+        started = time.perf_counter()
+        found = sum(1 for name in batch if catalog.match(name))
+        per_line = (time.perf_counter() - started) / len(batch) * 1e6
+        print(f"match {label:>10}: {per_line:8.1f} us/line, {found}/{len(batch)} matched")
+
+    products = stub.table("product.product")
+    for product_id in rng.sample(sorted(products), options.changes):
+        stub.execute_kw("product.product", "write", [[product_id], {"list_price": 1.0}])
+    stub.reset_calls()
+    started = time.perf_counter()
+    applied = catalog.refresh()
+    print(f"refresh: {applied} changed rows in {(time.perf_counter() - started) * 1000:.1f}ms, "
+          f"{stub.total_calls()} rpcs")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Sync and query timings of the order history at a large number of orders.
+
+Seeds the stub Odoo with ``--orders`` purchase orders and vendor bills,
+times the first full sync into a fresh SQLite file, a delta sync after
+``--changes`` edits, and typical ``/api/history`` queries (first page,
+a page deep into the history, vendor, type and date, invoice number).
+
+    python -m benchmarks.bench_history --orders 200000
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks import stub_odoo
+
+
+def timed_query(history, runs, **filters):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        page = history.query(**filters)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), page
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--vendors", type=int, default=500)
+    parser.add_argument("--changes", type=int, default=100, help="orders edited before the delta sync")
+    parser.add_argument("--page-size", type=int, default=2000, help="records per sync search_read")
+    parser.add_argument("--runs", type=int, default=20, help="repeats per query")
+    options = parser.parse_args()
+
+    stub = stub_odoo.StubOdoo().seed(100, options.vendors).seed_orders(options.orders)
+    server, url = stub_odoo.start(stub)
+    stub_odoo.configure_env(url)
+
+    import compare
+    from history import OrderHistory
+
+    integration = compare.OdooIntegration()
+    with contextlib.redirect_stdout(io.StringIO()):
+        integration.connect_to_odoo()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        history = OrderHistory(integration._execute, os.path.join(tmp, "history.db"),
+                               page_size=options.page_size)
+        stub.reset_calls()
+        started = time.perf_counter()
+        counts = history.sync()
+        print(f"full sync: {sum(counts.values())} orders in {time.perf_counter() - started:.2f}s, "
+              f"{stub.total_calls()} rpcs")
+
+        rng = random.Random(1)
+        for model in ("purchase.order", "account.move"):
+            ids = list(stub.table(model))
+            stub._rpc_write(model, rng.sample(ids, options.changes // 2), {"state": "cancel"})
+        stub.reset_calls()
+        started = time.perf_counter()
+        counts = history.sync()
+        print(f"delta sync: {sum(counts.values())} orders in {(time.perf_counter() - started) * 1000:.1f} ms, "
+              f"{stub.total_calls()} rpcs")
+
+        vendor = rng.choice(list(stub.table("res.partner").values()))
+        cursor = None
+        for _ in range(100):
+            cursor = history.query(cursor=cursor, limit=50)["next_cursor"]
+        queries = [
+            ("first page", {}),
+            ("page 101", {"cursor": cursor}),
+            ("vendor prefix", {"vendor": vendor["name"][:12]}),
+            ("vendor id", {"vendor_id": vendor["id"]}),
+            ("type and dates", {"create_type": "invoice", "date_from": "2022-01-01", "date_to": "2022-03-31"}),
+            ("invoice number", {"invoice_number": f"INV-{options.orders // 2:07d}"}),
+        ]
+        print(f"{'query':>16} {'median ms':>10} {'rows':>5} {'total':>8}")
+        for name, filters in queries:
+            seconds, page = timed_query(history, options.runs, limit=50, **filters)
+            total = page["total"] if page["total"] is not None else "-"
+            print(f"{name:>16} {seconds * 1000:>10.2f} {len(page['orders']):>5} {total:>8}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Bare OpenAI calls vs the ``llm`` gateway against the fake OpenAI server.
+
+Three scenarios, each run once with bare ``openai.ChatCompletion.create``
+calls and once through ``llm.LLMGateway``:
+
+* ``burst``: more concurrent requests than the server's per-minute limit;
+* ``errors``: a share of requests fail with a 500;
+* ``tail``: a share of requests are slow (the gateway run hedges them).
+
+For each run this prints requests that succeeded and failed, what the
+server answered (200 / 429 / 500), p50/p95/p99 latency and wall time.
+``--async`` sends the gateway's requests through ``achat`` with asyncio,
+all at once, so latencies include time queued for a worker thread.
+
+    python -m benchmarks.bench_llm
+    python -m benchmarks.bench_llm --scenario tail --requests 400 --async
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+
+import llm
+from benchmarks import fake_openai
+
+SCENARIOS = {
+    # fake server settings, gateway settings
+    "burst": ({"latency": 0.05, "rpm": 150}, {"rpm": 150, "hedge_percentile": 0}),
+    "errors": ({"latency": 0.05, "error_rate": 0.1}, {"rpm": 0, "hedge_percentile": 0}),
+    "tail": ({"latency": 0.1, "tail": 0.05, "tail_latency": 2.0},
+             {"rpm": 0, "hedge_percentile": 95, "hedge_min_seconds": 0.2}),
+}
+
+REQUEST = {
+    "model": "gpt-4o",
+    "messages": [
+        {"role": "system", "content": "Extract data and return only valid JSON, no other text."},
+        {"role": "user", "content": "Parse this invoice: " + fake_openai.SAMPLE_TEXT},
+    ],
+    "max_tokens": 800,
+}
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+def timed(call):
+    started = time.perf_counter()
+    try:
+        call(**REQUEST)
+        return True, time.perf_counter() - started
+    except Exception:
+        return False, time.perf_counter() - started
+
+
+def run_threads(call, requests, threads):
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(lambda _: timed(call), range(requests)))
+
+
+def run_async(gateway, requests):
+    async def one():
+        started = time.perf_counter()
+        try:
+            await gateway.achat(**REQUEST)
+            return True, time.perf_counter() - started
+        except Exception:
+            return False, time.perf_counter() - started
+
+    async def main():
+        return await asyncio.gather(*(one() for _ in range(requests)))
+
+    return asyncio.run(main())
+
+
+def report(scenario, label, fake, results, seconds):
+    latencies = [s for ok, s in results if ok]
+    ok = len(latencies)
+    print(f"{scenario:>7} {label:>8} {ok:>5} {len(results) - ok:>6} "
+          f"{fake.statuses[200]:>5} {fake.statuses[429]:>5} {fake.statuses[500]:>5} "
+          f"{percentile(latencies, 50):>6.2f} {percentile(latencies, 95):>6.2f} "
+          f"{percentile(latencies, 99):>6.2f} {seconds:>7.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), action="append")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="send the gateway's requests with achat")
+    options = parser.parse_args()
+
+    print(f"{'case':>7} {'client':>8} {'ok':>5} {'failed':>6} {'200':>5} {'429':>5} {'500':>5} "
+          f"{'p50':>6} {'p95':>6} {'p99':>6} {'wall s':>7}")
+    for scenario in options.scenario or sorted(SCENARIOS):
+        server_settings, gateway_settings = SCENARIOS[scenario]
+        for label in ("bare", "gateway"):
+            fake = fake_openai.FakeOpenAI(**server_settings)
+            server, url = fake_openai.start(fake)
+            fake_openai.configure(url)
+            started = time.perf_counter()
+            if label == "bare":
+                results = run_threads(openai.ChatCompletion.create, options.requests, options.threads)
+            else:
+                # Room above the client threads for hedges
+                gateway = llm.LLMGateway(concurrency=2 * options.threads, backoff=0.1, **gateway_settings)
+                if options.use_async:
+                    results = run_async(gateway, options.requests)
+                else:
+                    results = run_threads(gateway.chat, options.requests, options.threads)
+            report(scenario, label, fake, results, time.perf_counter() - started)
+            server.shutdown()
+            server.server_close()
+        if gateway_settings.get("hedge_percentile"):
+            print(f"{'':>16} gateway hedges={gateway.counts['hedges']} wins={gateway.counts['hedge_wins']}")
+
+
+if __name__ == "__main__":
+    main()
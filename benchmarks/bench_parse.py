@@ -0,0 +1,127 @@
+"""Local parser accuracy and latency, optionally against the LLM parse.
+
+Every ``NAME.txt`` in the corpus is extracted text and ``NAME.json`` the
+expected parse. For each document this prints the local parser's
+confidence and source, whether it would be accepted at
+``LOCAL_PARSE_THRESHOLD``, header field accuracy (vendor, number, date,
+currency, total) and line-item recall and precision, then totals with
+accuracy over the accepted documents only, which is what decides the
+threshold. ``--live`` also runs the LLM parse for each document with the
+parse cache bypassed.
+
+    python -m benchmarks.bench_parse
+    python -m benchmarks.bench_parse --corpus ~/invoices-text --threshold 0.7 --live
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+import compare
+from cache import DiskCache
+from local_parser import LocalParser, load_templates, to_number
+from vendors import normalize_vendor
+
+CORPUS = os.path.join(os.path.dirname(__file__), "parse_corpus")
+FIELDS = ("vendor", "invoice_number", "date", "currency", "total")
+
+
+def load_corpus(path):
+    documents = []
+    for name in sorted(os.listdir(path)):
+        if not name.endswith(".txt"):
+            continue
+        base = name[:-4]
+        with open(os.path.join(path, name)) as f:
+            text = f.read()
+        with open(os.path.join(path, base + ".json")) as f:
+            documents.append((base, text, json.load(f)))
+    return documents
+
+
+def _same(field, got, expected):
+    if field == "vendor":
+        return normalize_vendor(got or "") == normalize_vendor(expected or "")
+    if field == "total":
+        return abs((to_number(got) or 0.0) - (expected or 0.0)) <= 0.01
+    return str(got or "").strip() == str(expected or "").strip()
+
+
+def _line(product):
+    return (normalize_vendor(product.get("name") or ""), to_number(product.get("quantity")),
+            to_number(product.get("price")))
+
+
+def score(parsed, expected):
+    """(fields right, line recall, line precision) of a parse against the expected JSON."""
+    parsed = parsed or {}
+    fields = sum(_same(f, parsed.get(f), expected.get(f)) for f in FIELDS)
+    got = [_line(p) for p in parsed.get("products") or []]
+    want = [_line(p) for p in expected.get("products") or []]
+    matched = sum(1 for line in want if line in got)
+    recall = matched / len(want) if want else 1.0
+    precision = matched / len(got) if got else (1.0 if not want else 0.0)
+    return fields, recall, precision
+
+
+def run_local(parser, documents, threshold, repeat):
+    print(f"{'document':>20} {'source':>22} {'conf':>5} {'used':>5} {'fields':>6} "
+          f"{'recall':>6} {'prec':>6} {'ms':>7}")
+    rows = []
+    for name, text, expected in documents:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            parsed, confidence, source = parser.parse(text)
+            timings.append(time.perf_counter() - started)
+        fields, recall, precision = score(parsed, expected)
+        used = confidence >= threshold
+        ms = statistics.median(timings) * 1000
+        rows.append((used, fields, recall, precision, ms))
+        print(f"{name:>20} {source:>22} {confidence:>5.2f} {'yes' if used else 'no':>5} "
+              f"{fields:>4}/{len(FIELDS)} {recall:>6.2f} {precision:>6.2f} {ms:>7.2f}")
+
+    accepted = [r for r in rows if r[0]]
+    print(f"\nlocal hit rate {len(accepted)}/{len(rows)} at threshold {threshold}, "
+          f"median {statistics.median(r[4] for r in rows):.2f} ms per document")
+    if accepted:
+        print(f"accepted: field accuracy {sum(r[1] for r in accepted) / (len(FIELDS) * len(accepted)):.1%}, "
+              f"line recall {statistics.mean(r[2] for r in accepted):.1%}, "
+              f"line precision {statistics.mean(r[3] for r in accepted):.1%}")
+
+
+def run_live(documents):
+    compare.LOCAL_PARSE_THRESHOLD = float("inf")
+    compare.parse_cache = DiskCache("parse", path="")
+    integration = compare.OdooIntegration()
+    print(f"\n{'document':>20} {'fields':>6} {'recall':>6} {'prec':>6} {'seconds':>8}")
+    timings = []
+    for name, text, expected in documents:
+        started = time.perf_counter()
+        parsed = integration.parse_extracted_text(text)
+        timings.append(time.perf_counter() - started)
+        fields, recall, precision = score(parsed, expected)
+        print(f"{name:>20} {fields:>4}/{len(FIELDS)} {recall:>6.2f} {precision:>6.2f} {timings[-1]:>8.2f}")
+    print(f"\nLLM median {statistics.median(timings):.2f} s per document")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=CORPUS, help="directory of NAME.txt / NAME.json pairs")
+    parser.add_argument("--templates", help="vendor templates JSON (default: the corpus's templates.json)")
+    parser.add_argument("--threshold", type=float, default=compare.LOCAL_PARSE_THRESHOLD)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--live", action="store_true", help="also parse every document with the LLM")
+    options = parser.parse_args()
+
+    templates = options.templates or os.path.join(options.corpus, "templates.json")
+    local = LocalParser(load_templates(templates) if os.path.exists(templates) else [])
+    documents = load_corpus(options.corpus)
+    run_local(local, documents, options.threshold, options.repeat)
+    if options.live:
+        run_live(documents)
+
+
+if __name__ == "__main__":
+    main()
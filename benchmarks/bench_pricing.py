@@ -0,0 +1,80 @@
+"""RPCs and wall time of supplier pricing during ``validate_data``.
+
+Validates a document from a supplier with agreed prices (quantity breaks,
+the supplier's currency) against the stub Odoo server, reading
+``product.supplierinfo`` once per document ("batched") or once per
+matched product ("per-line"), and reports how many lines got the agreed
+price and how many document prices were flagged.
+
+    python -m benchmarks.bench_pricing --lines 10 40 100
+"""
+import argparse
+import random
+import time
+
+from benchmarks import stub_odoo
+
+
+def parsed_document(stub, vendor, names, seed=9):
+    rng = random.Random(seed)
+    products = [
+        {"name": name, "quantity": rng.choice([1, 5, 20, 100]),
+         "price": None if rng.random() < 0.2 else round(rng.uniform(1, 300), 2)}
+        for name in names
+    ]
+    return {"vendor": vendor["name"], "currency": "USD", "products": products, "total": 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, nargs="+", default=[10, 40, 100])
+    parser.add_argument("--catalog-size", type=int, default=5000)
+    parser.add_argument("--share", type=float, default=0.5, help="share of the catalog with supplier prices")
+    parser.add_argument("--latency", type=float, default=0.002, help="seconds per stub RPC")
+    parser.add_argument("--repeat", type=int, default=3)
+    options = parser.parse_args()
+
+    stub = stub_odoo.StubOdoo(latency=options.latency).seed(options.catalog_size, vendors=5)
+    stub.seed_supplierinfo(options.share)
+    server, url = stub_odoo.start(stub)
+    stub_odoo.configure_env(url)
+
+    import contextlib
+    import io
+    import compare
+
+    integration = compare.OdooIntegration()
+    with contextlib.redirect_stdout(io.StringIO()):
+        integration.connect_to_odoo()
+    # A supplier whose purchase currency differs from the document's
+    vendor = next(p for p in stub.table("res.partner").values()
+                  if p["property_purchase_currency_id"][1] != "USD")
+
+    batched = integration.supplier_prices
+
+    def per_line(vendor_id, products):
+        return {p["id"]: integration.pricing.fetch(vendor_id, [p]).get(p["id"], []) for p in products}
+
+    print(f"catalog={options.catalog_size} latency={options.latency * 1000:.1f}ms/rpc "
+          f"vendor currency={vendor['property_purchase_currency_id'][1]}")
+    print(f"{'lines':>6} {'mode':>9} {'reads':>6} {'wall ms':>9} {'supplier':>9} {'flagged':>8}")
+    for lines in options.lines:
+        parsed = parsed_document(stub, vendor, stub.product_names(lines))
+        for mode, fetch in (("per-line", per_line), ("batched", batched)):
+            integration.supplier_prices = fetch
+            stub.reset_calls()
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                for _ in range(options.repeat):
+                    validated = integration.validate_data(parsed)
+            elapsed = (time.perf_counter() - started) / options.repeat
+            supplier = sum(1 for p in validated["products"] if p["supplier_price"] is not None)
+            pricing_rpcs = stub.calls[("product.supplierinfo", "search_read")] / options.repeat
+            print(f"{lines:>6} {mode:>9} {pricing_rpcs:>6.0f} {elapsed * 1000:>9.1f} "
+                  f"{supplier:>4}/{len(validated['products']):<4} {validated['price_flags']:>8}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
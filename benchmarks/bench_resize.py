@@ -0,0 +1,159 @@
+"""Peak RSS and latency of image preprocessing across a corpus of scans.
+
+Each (image, implementation) pair runs in a fresh child process so peak
+RSS is attributable to that single resize. Without ``--corpus`` a
+synthetic set of page scans from 2 to 48 megapixels is generated.
+
+    python -m benchmarks.bench_resize
+    python -m benchmarks.bench_resize --corpus ~/scans --repeat 5
+"""
+import argparse
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+SYNTHETIC = [
+    ("a4-2mp.jpg", (1240, 1754), "JPEG", 1),
+    ("phone-12mp.jpg", (3000, 4000), "JPEG", 1),
+    ("phone-12mp-rotated.jpg", (4000, 3000), "JPEG", 6),
+    ("phone-48mp.jpg", (6000, 8000), "JPEG", 1),
+    ("scan-24mp.png", (4000, 6000), "PNG", 1),
+    ("small-0.4mp.jpg", (520, 780), "JPEG", 1),
+]
+
+
+def legacy_resize(image_bytes, max_size=800):
+    """The whole-buffer decode, LANCZOS resize and re-encode used before."""
+    from PIL import Image
+    img = Image.open(io.BytesIO(image_bytes))
+    if img.mode in ('RGBA', 'LA', 'P'):
+        img = img.convert('RGB')
+    width, height = img.size
+    if width > height:
+        new_width = min(width, max_size)
+        new_height = int((height * new_width) / width)
+    else:
+        new_height = min(height, max_size)
+        new_width = int((width * new_height) / height)
+    img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=75, optimize=True)
+    return buffer.getvalue()
+
+
+def make_scan(path, size, fmt, orientation):
+    """A white page with rows of dark 'text' blocks, like a printed invoice."""
+    from PIL import Image, ImageDraw
+    rng = random.Random(size[0] * size[1])
+    img = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(img)
+    line_height = max(12, size[1] // 80)
+    for y in range(line_height * 4, size[1] - line_height * 4, line_height * 2):
+        x = size[0] // 12
+        while x < size[0] * 11 // 12:
+            word = rng.randint(line_height, line_height * 6)
+            draw.rectangle([x, y, x + word, y + line_height], fill=(20, 20, 20))
+            x += word + line_height
+    kwargs = {"quality": 90} if fmt == "JPEG" else {}
+    if orientation != 1:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        kwargs["exif"] = exif
+    img.save(path, fmt, **kwargs)
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KB (VmHWM on Linux)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def reset_peak_rss():
+    """Reset the high-water mark so imports don't mask the resize peak."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def child(mode, path):
+    """Resize one file and print latency and peak RSS as JSON."""
+    sys.path.insert(0, os.getcwd())
+    import extraction
+    reset_peak_rss()
+    baseline = peak_rss_kb()
+    started = time.perf_counter()
+    if mode == "legacy":
+        with open(path, "rb") as f:
+            output = legacy_resize(f.read())
+    else:
+        with open(path, "rb") as f:
+            output = extraction.resize_image(f)
+    elapsed = time.perf_counter() - started
+    peak = peak_rss_kb()
+    print(json.dumps({"ms": elapsed * 1000, "peak_mb": peak / 1024,
+                      "delta_mb": (peak - baseline) / 1024, "out_kb": len(output) / 1024}))
+
+
+def measure(mode, path, repeat):
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_resize", "--child", mode, path],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    runs.sort(key=lambda r: r["ms"])
+    result = runs[len(runs) // 2]
+    result["peak_mb"] = max(r["peak_mb"] for r in runs)
+    result["delta_mb"] = max(r["delta_mb"] for r in runs)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", help="directory of sample scans (default: synthetic)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.child:
+        return child(*options.child)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if options.corpus:
+            files = sorted(
+                os.path.join(options.corpus, name) for name in os.listdir(options.corpus)
+                if name.lower().endswith((".jpg", ".jpeg", ".png", ".tif", ".tiff"))
+            )
+        else:
+            files = []
+            for name, size, fmt, orientation in SYNTHETIC:
+                path = os.path.join(tmp, name)
+                make_scan(path, size, fmt, orientation)
+                files.append(path)
+
+        print(f"{'image':>26} {'KB':>7} {'mode':>8} {'ms':>8} {'peak MB':>8} {'+MB':>7} {'out KB':>7}")
+        for path in files:
+            size_kb = os.path.getsize(path) / 1024
+            for mode in ("legacy", "current"):
+                r = measure(mode, path, options.repeat)
+                print(f"{os.path.basename(path):>26} {size_kb:>7.0f} {mode:>8} {r['ms']:>8.1f} "
+                      f"{r['peak_mb']:>8.1f} {r['delta_mb']:>7.1f} {r['out_kb']:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Per-call latency of Odoo RPC transports against the stub server.
+
+Compares a fresh ``ServerProxy`` per call, one shared ``ServerProxy``
+(single-threaded only), and ``OdooClient`` over pooled XML-RPC and
+JSON-RPC, for a small and a large ``search_read``, then measures pooled
+throughput from several threads.
+
+    python -m benchmarks.bench_rpc --calls 500 --threads 8
+"""
+import argparse
+import statistics
+import time
+import xmlrpc.client
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import stub_odoo
+from odoo_client import OdooClient
+
+CALLS = {
+    "small": ("res.currency", "search_read", [[]], {"fields": ["name", "rate"]}),
+    "large": ("product.product", "search_read", [[]],
+              {"fields": ["name", "default_code", "list_price", "product_tmpl_id"], "limit": 200}),
+}
+
+
+def fresh_proxy(url):
+    def call(model, method, args, kwargs):
+        proxy = xmlrpc.client.ServerProxy(f"{url}/xmlrpc/2/object")
+        return proxy.execute_kw(stub_odoo.STUB_DB, stub_odoo.STUB_UID, stub_odoo.STUB_PASSWORD,
+                                model, method, args, kwargs)
+    return call
+
+
+def shared_proxy(url):
+    proxy = xmlrpc.client.ServerProxy(f"{url}/xmlrpc/2/object")
+
+    def call(model, method, args, kwargs):
+        return proxy.execute_kw(stub_odoo.STUB_DB, stub_odoo.STUB_UID, stub_odoo.STUB_PASSWORD,
+                                model, method, args, kwargs)
+    return call
+
+
+def pooled(url, transport):
+    client = OdooClient(url, stub_odoo.STUB_DB, stub_odoo.STUB_USER, stub_odoo.STUB_PASSWORD,
+                        transport=transport, pool_size=16)
+    client.authenticate()
+    return lambda model, method, args, kwargs: client.call(model, method, args, kwargs)
+
+
+def latency(call, spec, calls):
+    samples = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        call(*spec)
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def throughput(call, spec, calls, threads):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda _: call(*spec), range(calls)))
+    return calls / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--catalog-size", type=int, default=1000)
+    options = parser.parse_args()
+
+    server, url = stub_odoo.start(stub_odoo.StubOdoo().seed(options.catalog_size))
+    clients = {
+        "fresh proxy": fresh_proxy(url),
+        "shared proxy": shared_proxy(url),
+        "pooled xmlrpc": pooled(url, "xmlrpc"),
+        "pooled jsonrpc": pooled(url, "jsonrpc"),
+    }
+
+    print(f"{'client':>15} {'payload':>8} {'p50 us':>9} {'p95 us':>9}")
+    for name, call in clients.items():
+        for label, spec in CALLS.items():
+            p50, p95 = latency(call, spec, options.calls)
+            print(f"{name:>15} {label:>8} {p50:>9.0f} {p95:>9.0f}")
+
+    print(f"\nthroughput with {options.threads} threads (small payload)")
+    for name in ("fresh proxy", "pooled xmlrpc", "pooled jsonrpc"):
+        rate = throughput(clients[name], CALLS["small"], options.calls, options.threads)
+        print(f"{name:>15} {rate:>9.0f} calls/s")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Startup cost: import time of the app's modules and time to first request.
+
+Each measurement runs in a fresh interpreter, so nothing is already
+imported or cached:
+
+* import time of ``compare`` and ``app`` (median and best of ``--runs``);
+* time from launching ``python app.py`` until ``GET /healthz`` answers
+  (first request) and until ``GET /readyz`` does (Odoo connected). With
+  ``--odoo down`` the Odoo URL points at a closed port, which shows the
+  server still comes up and serves while it keeps reconnecting.
+
+``--top`` lists the modules that take longest to import (from
+``python -X importtime``). ``--save`` and ``--baseline`` work as in
+``benchmarks.loadtest``: a run slower than the baseline by more than
+``--tolerance`` on any measurement exits with status 1.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --odoo down --top 15
+    python -m benchmarks.bench_startup --save startup.json
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import requests
+
+from benchmarks import stub_odoo
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["compare", "app"]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def import_seconds(module, env):
+    code = f"import time; started = time.perf_counter(); import {module}; print(time.perf_counter() - started)"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def slowest_imports(module, env, count):
+    """``(cumulative seconds, name)`` of the slowest top-level imports of ``module``."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                            env=env, check=True, capture_output=True, text=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2]
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth <= 1:
+            rows.append((int(parts[1]) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def wait_for(url, deadline, status=200):
+    while time.perf_counter() < deadline:
+        try:
+            if requests.get(url, timeout=1).status_code == status:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.01)
+    return False
+
+
+def serve_seconds(env, timeout, check_ready):
+    """Seconds until ``/healthz`` and ``/readyz`` answer for a fresh ``python app.py``."""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "app.py"], cwd=ROOT, env=dict(env, PORT=str(port)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = started + timeout
+        first = time.perf_counter() - started if wait_for(f"{base_url}/healthz", deadline) else None
+        ready = None
+        if first is not None and check_ready and wait_for(f"{base_url}/readyz", deadline):
+            ready = time.perf_counter() - started
+        return first, ready
+    finally:
+        process.kill()
+        process.wait()
+
+
+def summarize(samples):
+    samples = [s for s in samples if s is not None]
+    if not samples:
+        return None
+    return {"median": statistics.median(samples), "best": min(samples), "runs": len(samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--odoo", choices=["stub", "down"], default="stub",
+                        help="down: point the app at a closed port")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for the server")
+    parser.add_argument("--top", type=int, default=0, help="list the N slowest imports of app")
+    parser.add_argument("--save", help="write results as JSON")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown (0.2 = 20%%)")
+    options = parser.parse_args()
+
+    env = dict(os.environ, LOG_LEVEL="WARNING", OPENAI_API_KEY=os.getenv("OPENAI_API_KEY") or "sk-unused")
+    if options.odoo == "stub":
+        _, odoo_url = stub_odoo.start(stub_odoo.StubOdoo().seed(2000, 50))
+    else:
+        odoo_url = f"http://127.0.0.1:{free_port()}"
+    env.update(ODOO_URL=odoo_url, ODOO_DB=stub_odoo.STUB_DB, ODOO_USERNAME=stub_odoo.STUB_USER,
+               ODOO_PASSWORD=stub_odoo.STUB_PASSWORD)
+
+    results = {}
+    for module in MODULES:
+        results[f"import {module}"] = summarize([import_seconds(module, env) for _ in range(options.runs)])
+    served = [serve_seconds(env, options.timeout, options.odoo == "stub") for _ in range(options.runs)]
+    results["first request"] = summarize([first for first, _ in served])
+    if options.odoo == "stub":
+        results["ready"] = summarize([ready for _, ready in served])
+
+    baseline = None
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)["results"]
+    print(f"Odoo {options.odoo}, {options.runs} runs")
+    print(f"{'measurement':>16} {'median ms':>10} {'best ms':>8}" + (f" {'vs base':>8}" if baseline else ""))
+    slower = []
+    for name, row in results.items():
+        if row is None:
+            print(f"{name:>16} {'no answer':>10}")
+            continue
+        line = f"{name:>16} {row['median'] * 1000:>10.1f} {row['best'] * 1000:>8.1f}"
+        base = (baseline or {}).get(name)
+        if base:
+            change = row["median"] / base["median"] - 1
+            line += f" {change:>+8.1%}"
+            if change > options.tolerance:
+                slower.append(name)
+        print(line)
+
+    if options.top:
+        print(f"\nslowest imports of app:")
+        for seconds, name in slowest_imports("app", env, options.top):
+            print(f"{seconds * 1000:>10.1f} ms  {name}")
+
+    if options.save:
+        with open(options.save, "w") as f:
+            json.dump({"options": vars(options), "results": results}, f, indent=2)
+    if slower:
+        print(f"slower by more than {options.tolerance:.0%}: {', '.join(slower)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Image tokens, bytes sent and text legibility: fixed resize vs adaptive tiles.
+
+For every page this prints what each strategy would send to the vision
+API: the number of images, base64 kilobytes, image tokens under the
+API's accounting, and the median text line height in pixels as the model
+sees it (after the API's own downscale), which is what decides whether a
+dense line-item table is readable. Nothing is sent unless ``--live`` is
+given, in which case each strategy also runs through ``extract_text``
+and reports real prompt tokens and latency.
+
+    python -m benchmarks.bench_tiling
+    python -m benchmarks.bench_tiling --corpus ~/scans --live
+"""
+import argparse
+import base64
+import io
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from PIL import Image, ImageDraw, ImageFont
+
+import extraction
+import tiling
+
+SYNTHETIC = [
+    # name, rows, font px
+    ("short-invoice", 8, 30),
+    ("dense-40-rows", 40, 26),
+    ("dense-70-rows", 70, 20),
+]
+
+
+def make_invoice(rows, font_px, size=(2480, 3508), seed=1):
+    """An A4 page at 300 dpi with a header, a line-item table and a total."""
+    rng = random.Random(seed * rows)
+    img = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default(size=font_px)
+    large = ImageFont.load_default(size=font_px * 2)
+    draw.text((150, 150), "ACME TRADING LLC", font=large, fill="black")
+    draw.text((150, 150 + font_px * 3), "PO Box 1234, Dubai", font=font, fill="black")
+    draw.text((1700, 160), f"INVOICE INV-{rng.randint(1000, 9999)}", font=font, fill="black")
+    draw.text((1700, 160 + font_px * 2), "Date: 2024-03-14", font=font, fill="black")
+    y = 650
+    for i in range(rows):
+        draw.text((150, y), f"{i + 1:>3}  SKU-{rng.randint(1000, 9999)}  Widget "
+                            f"{rng.choice('ABCDEFG')}-{rng.randint(10, 99)} stainless", font=font, fill="black")
+        draw.text((1550, y), f"{rng.randint(1, 50):>4}  {rng.uniform(1, 500):>9.2f}  "
+                             f"{rng.uniform(1, 5000):>10.2f}", font=font, fill="black")
+        y += int(font_px * 1.6)
+    draw.text((1550, y + 100), "TOTAL  12,345.67", font=large, fill="black")
+    return img
+
+
+def _api_scale(size, detail):
+    """Factor by which the API shrinks an image before the model sees it."""
+    width, height = size
+    if detail == "low":
+        return min(1.0, tiling.LOW_DETAIL_SIZE / max(width, height))
+    scale = min(1.0, tiling.HIGH_DETAIL_LONG / max(width, height))
+    return scale * min(1.0, tiling.HIGH_DETAIL_SHORT / (min(width, height) * scale))
+
+
+def fixed(img, max_size, detail):
+    sent = img.copy()
+    sent.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    sent.save(buffer, "JPEG", quality=extraction.JPEG_QUALITY)
+    return [(buffer.getvalue(), detail)], sent.width / img.width
+
+
+def adaptive(img):
+    tiles = extraction.adaptive_tiles(img)
+    plan = tiling.plan_tiles(img, extraction.ADAPTIVE_LINE_PX)
+    return tiles, plan[0][1]
+
+
+def describe(name, strategy, images, scale, line_height, seconds):
+    sizes = [Image.open(io.BytesIO(data)).size for data, _ in images]
+    tokens = sum(tiling.vision_tokens(size, detail) for size, (_, detail) in zip(sizes, images))
+    kb = sum(len(base64.b64encode(data)) for data, _ in images) / 1024
+    seen = min(_api_scale(size, detail) for size, (_, detail) in zip(sizes, images))
+    print(f"{name:>16} {strategy:>10} {len(images):>6} {kb:>8.1f} {tokens:>7} "
+          f"{line_height * scale * seen:>8.1f} {seconds * 1000:>8.1f}")
+
+
+def live(name, path):
+    for mode in ("fixed", "adaptive"):
+        extraction.EXTRACTION_MODE = mode
+        extraction.extraction_cache.clear()
+        report = {}
+        with open(path, "rb") as f:
+            extraction.extract_text(f, report)
+        print(f"{name:>16} {mode:>10} requests={report['requests']} tiles={report['tiles']} "
+              f"kb={report['bytes_sent'] / 1024:.1f} prompt_tokens={report['prompt_tokens']} "
+              f"completion_tokens={report['completion_tokens']} seconds={report['seconds']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", help="directory of page images (default: synthetic invoices)")
+    parser.add_argument("--live", action="store_true", help="also call the vision API for each page")
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if options.corpus:
+            pages = [
+                (name, os.path.join(options.corpus, name)) for name in sorted(os.listdir(options.corpus))
+                if name.lower().endswith((".jpg", ".jpeg", ".png"))
+            ]
+        else:
+            pages = []
+            for name, rows, font_px in SYNTHETIC:
+                path = os.path.join(tmp, f"{name}.png")
+                make_invoice(rows, font_px).save(path)
+                pages.append((name, path))
+        run(pages, options.live)
+
+
+def run(pages, live_calls):
+    print(f"{'page':>16} {'strategy':>10} {'images':>6} {'KB sent':>8} {'tokens':>7} "
+          f"{'line px':>8} {'prep ms':>8}")
+    for name, path in pages:
+        with open(path, "rb") as f:
+            img = extraction.open_image(f, extraction.ADAPTIVE_MAX_SIZE)
+        lines = tiling.text_lines(img)
+        line_height = statistics.median(l[3] - l[1] for l in lines) if lines else 0
+        for strategy, prepare in (
+            ("fixed-low", lambda: fixed(img, extraction.RESIZE_MAX_SIZE, "low")),
+            ("fixed-high", lambda: fixed(img, tiling.HIGH_DETAIL_LONG, "high")),
+            ("adaptive", lambda: adaptive(img)),
+        ):
+            started = time.perf_counter()
+            images, scale = prepare()
+            describe(name, strategy, images, scale, line_height, time.perf_counter() - started)
+
+    if live_calls:
+        print()
+        for name, path in pages:
+            live(name, path)
+
+
+if __name__ == "__main__":
+    main()
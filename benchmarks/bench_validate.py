@@ -0,0 +1,91 @@
+"""Count RPCs and wall time of ``OdooIntegration.validate_data``.
+
+Runs against the in-process stub Odoo server and compares the batched
+matcher with the previous one-search-plus-one-read-per-candidate loop.
+
+    python -m benchmarks.bench_validate --lines 10 40 100 --catalog-size 5000
+"""
+import argparse
+import time
+
+from benchmarks import stub_odoo
+
+
+def legacy_match(integration, product_names):
+    """The per-line search strategy ``validate_data`` used before batching."""
+    from compare import PRODUCT_FIELDS
+    matches = {}
+    for product_name in product_names:
+        for search_term in (
+            [["name", "ilike", product_name]],
+            [["name", "ilike", f"%{product_name}%"]],
+            [["default_code", "ilike", product_name]],
+        ):
+            product_ids = integration._execute("product.product", "search", [search_term], {"limit": 5})
+            if product_ids:
+                matches[product_name] = [
+                    integration._execute("product.product", "read", [product_id],
+                                         {"fields": PRODUCT_FIELDS})[0]
+                    for product_id in product_ids
+                ]
+                break
+    return matches
+
+
+def parsed_document(names):
+    return {
+        "vendor": "",
+        "currency": "USD",
+        "products": [{"name": name, "quantity": 2, "price": 10.0} for name in names],
+        "total": 20.0 * len(names),
+    }
+
+
+def run(integration, stub, parsed, repeat):
+    stub.reset_calls()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        integration.validate_data(parsed)
+    elapsed = (time.perf_counter() - started) / repeat
+    return stub.total_calls() / repeat, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, nargs="+", default=[10, 40, 100])
+    parser.add_argument("--catalog-size", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.002, help="seconds per stub RPC")
+    parser.add_argument("--repeat", type=int, default=3)
+    options = parser.parse_args()
+
+    stub = stub_odoo.StubOdoo(latency=options.latency).seed(options.catalog_size)
+    server, url = stub_odoo.start(stub)
+    stub_odoo.configure_env(url)
+
+    import contextlib
+    import io
+    import compare
+
+    integration = compare.OdooIntegration()
+    with contextlib.redirect_stdout(io.StringIO()):
+        integration.connect_to_odoo()
+
+    print(f"catalog={options.catalog_size} latency={options.latency * 1000:.1f}ms/rpc")
+    print(f"{'lines':>6} {'mode':>8} {'rpcs':>8} {'wall ms':>10}")
+    batched_match = integration.match_products
+    for lines in options.lines:
+        parsed = parsed_document(stub.product_names(lines))
+        for mode in ("legacy", "batched"):
+            if mode == "legacy":
+                integration.match_products = lambda names: legacy_match(integration, names)
+            else:
+                integration.match_products = batched_match
+            with contextlib.redirect_stdout(io.StringIO()):
+                rpcs, elapsed = run(integration, stub, parsed, options.repeat)
+            print(f"{lines:>6} {mode:>8} {rpcs:>8.0f} {elapsed * 1000:>10.1f}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""In-process fake of the OpenAI chat completions API used by the benchmarks.
+
+Serves ``POST /v1/chat/completions`` with canned replies: a
+``function_call`` when functions are given, invoice JSON when the system
+prompt asks for JSON, and extracted invoice text otherwise. Latency has a
+configurable slow tail, a fraction of requests can fail with 500s, and
+requests and tokens per minute are enforced like the real API, with 429
+replies carrying ``Retry-After``. Requests with ``stream`` get their reply
+as server-sent chunks spread over the latency. ``script`` sets the delay or
+error of the next requests, for tests. Every request is counted by status
+so benchmarks can report what the server saw as well as what clients got.
+"""
+import collections
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Characters per chunk of a streamed reply (about four tokens)
+STREAM_PIECE_CHARS = 16
+
+SAMPLE_INVOICE = {
+    "vendor": "Acme Trading LLC",
+    "invoice_number": "INV-1001",
+    "date": "2024-03-14",
+    "products": [
+        {"name": "Copy paper A4 80g", "quantity": 10, "price": 4.5, "description": ""},
+        {"name": "Toner cartridge 12A", "quantity": 2, "price": 61.0, "description": ""},
+    ],
+    "total": 167.0,
+    "currency": "USD",
+}
+
+SAMPLE_TEXT = """Acme Trading LLC
+Invoice Number: INV-1001
+Invoice Date: 2024-03-14
+
+| Description | Qty | Unit Price | Amount |
+|---|---|---|---|
+| Copy paper A4 80g | 10 | $4.50 | $45.00 |
+| Toner cartridge 12A | 2 | $61.00 | $122.00 |
+
+Total: $167.00"""
+
+
+def invoice_text(invoice):
+    """The markdown a vision model would read off ``invoice``."""
+    rows = "\n".join(
+        f"| {p['name']} | {p['quantity']} | ${p['price']:.2f} | ${p['quantity'] * p['price']:.2f} |"
+        for p in invoice["products"]
+    )
+    return (f"{invoice['vendor']}\nInvoice Number: {invoice['invoice_number']}\n"
+            f"Invoice Date: {invoice['date']}\n\n| Description | Qty | Unit Price | Amount |\n"
+            f"|---|---|---|---|\n{rows}\n\nTotal: ${invoice['total']:.2f}")
+
+
+class FakeOpenAI:
+    """Behaviour of the fake server; all times in seconds."""
+
+    def __init__(self, latency=0.2, jitter=0.05, tail=0.0, tail_latency=3.0,
+                 error_rate=0.0, rpm=0, tpm=0, seed=1, number_scans=False):
+        self.latency = latency
+        self.jitter = jitter
+        self.tail = tail
+        self.tail_latency = tail_latency
+        self.error_rate = error_rate
+        self.rpm = rpm
+        self.tpm = tpm
+        self.random = random.Random(seed)
+        self.invoice = SAMPLE_INVOICE
+        self.text = SAMPLE_TEXT
+        # Give every extracted text its own scan number, so no two scans
+        # share a text hash (and a cached parse)
+        self.number_scans = number_scans
+        self.scans = 0
+        # Like the real API, limits replenish continuously up to a minute's worth
+        self.requests_left = float(rpm)
+        self.tokens_left = float(tpm)
+        self.updated = time.monotonic()
+        self.script = collections.deque()
+        self.statuses = collections.Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def use_invoice(self, invoice):
+        """Answer every request about ``invoice`` instead of the sample."""
+        self.invoice = invoice
+        self.text = invoice_text(invoice)
+
+    def script_next(self, delay=None, status=None, retry_after=None):
+        """Answer the next unscripted request after ``delay`` and/or with error ``status``.
+
+        Scripted steps apply in order of arrival, ahead of the configured
+        latency, error rate and limits.
+        """
+        with self.lock:
+            self.script.append({"delay": delay, "status": status, "retry_after": retry_after})
+
+    def next_step(self):
+        with self.lock:
+            return self.script.popleft() if self.script else {}
+
+    def admit(self, tokens):
+        """None if the request is within the limits, else seconds until it would be."""
+        with self.lock:
+            now = time.monotonic()
+            elapsed, self.updated = now - self.updated, now
+            self.requests_left = min(self.rpm, self.requests_left + elapsed * self.rpm / 60)
+            self.tokens_left = min(self.tpm, self.tokens_left + elapsed * self.tpm / 60)
+            waits = []
+            if self.rpm and self.requests_left < 1:
+                waits.append((1 - self.requests_left) * 60 / self.rpm)
+            if self.tpm and self.tokens_left < tokens:
+                waits.append((tokens - self.tokens_left) * 60 / self.tpm)
+            if waits:
+                return max(waits)
+            self.requests_left -= 1
+            self.tokens_left -= tokens
+            return None
+
+    def delay(self):
+        with self.lock:
+            slow = self.random.random() < self.tail
+            return max(0.0, (self.tail_latency if slow else self.latency)
+                       + self.random.uniform(-self.jitter, self.jitter))
+
+    def fails(self):
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def record(self, status, change=0):
+        with self.lock:
+            if status:
+                self.statuses[status] += 1
+            self.in_flight += change
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def reply(self, body):
+        messages = body.get("messages", [])
+        prompt_tokens = len(json.dumps(messages)) // 4
+        message = {"role": "assistant", "content": self.text}
+        if self.number_scans:
+            with self.lock:
+                self.scans += 1
+                message["content"] = f"{self.text}\n\nScan {self.scans}"
+        if body.get("functions"):
+            name = (body.get("function_call") or {}).get("name") or body["functions"][0]["name"]
+            message = {"role": "assistant", "content": None,
+                       "function_call": {"name": name, "arguments": json.dumps(self.invoice)}}
+        elif any(m.get("role") == "system" and "JSON" in str(m.get("content")) for m in messages):
+            message["content"] = json.dumps(self.invoice)
+        completion_tokens = len(json.dumps(message)) // 4
+        return {
+            "id": f"chatcmpl-fake{self.random.randint(0, 10 ** 9)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status, message, kind, headers=None):
+        self.server.fake.record(status)
+        self._send(status, {"error": {"message": message, "type": kind, "code": kind}}, headers)
+
+    def do_POST(self):
+        fake = self.server.fake
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._error(404, f"Unknown path {self.path}", "invalid_request_error")
+
+        step = fake.next_step()
+        if step.get("status") == 429:
+            headers = {"Retry-After": str(step["retry_after"])} if step.get("retry_after") is not None else {}
+            return self._error(429, "Rate limit reached", "rate_limit_exceeded", headers)
+        tokens = len(json.dumps(body.get("messages", []))) // 4 + body.get("max_tokens", 256)
+        retry_after = None if step else fake.admit(tokens)
+        if retry_after is not None:
+            return self._error(429, "Rate limit reached", "rate_limit_exceeded",
+                               {"Retry-After": f"{retry_after:.1f}"})
+
+        fake.record(None, 1)
+        try:
+            delay = step["delay"] if step.get("delay") is not None else fake.delay()
+            # A stream's first piece comes after a third of the latency
+            time.sleep(delay / 3 if body.get("stream") else delay)
+            if step.get("status") or (not step and fake.fails()):
+                return self._error(step.get("status") or 500, "The server had an error processing your request",
+                                   "server_error")
+            fake.record(200)
+            if body.get("stream"):
+                self._stream(fake.reply(body), delay * 2 / 3)
+            else:
+                self._send(200, fake.reply(body))
+        finally:
+            fake.record(None, -1)
+
+    def _stream(self, reply, seconds):
+        """Send ``reply``'s content as server-sent chunks spread over ``seconds``."""
+        content = reply["choices"][0]["message"].get("content") or ""
+        pieces = [content[i:i + STREAM_PIECE_CHARS] for i in range(0, len(content), STREAM_PIECE_CHARS)]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        deltas = [{"content": piece} for piece in pieces] + [{}]
+        for number, delta in enumerate(deltas):
+            chunk = {
+                "id": reply["id"], "object": "chat.completion.chunk", "created": reply["created"],
+                "model": reply["model"],
+                "choices": [{"index": 0, "delta": delta, "finish_reason": None if delta else "stop"}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            if number < len(pieces):
+                time.sleep(seconds / max(1, len(pieces)))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def start(fake=None, host="127.0.0.1", port=0):
+    """Serve ``fake`` on a background thread; returns ``(server, url)``."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.fake = fake or FakeOpenAI()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def configure(url):
+    """Point the ``openai`` module (and child processes) at the fake server."""
+    import os
+    import openai
+    os.environ["OPENAI_API_BASE"] = url
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    openai.api_base = url
+    openai.api_key = "sk-fake"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI chat completions server.")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--tail", type=float, default=0.0, help="share of requests that are slow")
+    parser.add_argument("--tail-latency", type=float, default=3.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=0)
+    parser.add_argument("--tpm", type=int, default=0)
+    options = parser.parse_args()
+
+    fake = FakeOpenAI(options.latency, tail=options.tail, tail_latency=options.tail_latency,
+                      error_rate=options.error_rate, rpm=options.rpm, tpm=options.tpm)
+    server, url = start(fake, port=options.port)
+    print(f"Fake OpenAI listening on {url} (set OPENAI_API_BASE={url})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,270 @@
+"""Load test of the extract -> confirm -> create flow, fully offline.
+
+Starts the stub Odoo server (seeded catalog, injected RPC latency), the
+fake OpenAI server (which answers with an invoice built from real stub
+products and suppliers) and the Flask app on a threaded HTTP server, then
+runs ``--users`` concurrent users. Each user repeats what the browser
+does: ``POST /extract`` with a fresh scan, ``POST /confirm`` with the
+extracted text after reading it for ``--think`` seconds, ``PATCH`` the draft's lines with every validated product
+and ``POST /create``. For each route it prints p50/p95/p99 latency,
+requests per second and errors, plus Odoo RPCs and LLM calls per flow.
+
+``--save`` writes the results as JSON; ``--baseline`` compares against a
+saved run and exits with status 1 if any route's p95 regressed by more
+than ``--tolerance``, so it can gate a deploy.
+
+    python -m benchmarks.loadtest --users 8 --duration 30
+    python -m benchmarks.loadtest --catalog-size 20000 --odoo-latency 0.01 --save before.json
+    python -m benchmarks.loadtest --baseline before.json --tolerance 0.2
+    python -m benchmarks.loadtest --parse llm --think 2   # /confirm with speculative parsing
+"""
+import argparse
+import contextlib
+import html
+import io
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import requests
+from PIL import Image, ImageDraw
+
+from benchmarks import fake_openai, stub_odoo
+
+ROUTES = ["POST /extract", "POST /confirm", "PATCH /api/drafts/<id>/lines", "POST /create"]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+def make_invoice(stub, lines, seed=11):
+    """An invoice from a real stub supplier with ``lines`` real catalog products."""
+    rng = random.Random(seed)
+    vendor = rng.choice(list(stub.table("res.partner").values()))["name"]
+    products = [
+        {"name": name, "quantity": rng.randint(1, 20), "price": round(rng.uniform(1, 300), 2), "description": ""}
+        for name in stub.product_names(lines, seed)
+    ]
+    return {
+        "vendor": vendor,
+        "invoice_number": f"INV-{rng.randint(1000, 9999)}",
+        "date": "2024-03-14",
+        "products": products,
+        "total": round(sum(p["quantity"] * p["price"] for p in products), 2),
+        "currency": "USD",
+    }
+
+
+def make_scan(rng):
+    """A small JPEG that differs every time, so extraction never hits a cache."""
+    img = Image.new("RGB", (850, 1100), "white")
+    draw = ImageDraw.Draw(img)
+    for y in range(80, 1000, 40):
+        x = rng.randint(40, 120)
+        draw.rectangle([x, y, x + rng.randint(200, 700), y + 14], fill=(30, 30, 30))
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=80)
+    return buffer.getvalue()
+
+
+def start_app():
+    """Serve the Flask app (imported after the fakes are configured) on a thread."""
+    from werkzeug.serving import make_server
+    import app as webapp
+    if not webapp.odoo_integration.connect_to_odoo():
+        sys.exit("Could not connect to the stub Odoo server")
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, webapp.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+class User(threading.Thread):
+    def __init__(self, base_url, deadline, iterations, create_type, results, seed, think=0.0):
+        super().__init__(daemon=True)
+        self.think = think
+        self.base_url = base_url
+        self.deadline = deadline
+        self.iterations = iterations
+        self.create_type = create_type
+        self.results = results
+        self.rng = random.Random(seed)
+        self.session = requests.Session()
+
+    def timed(self, route, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, allow_redirects=False,
+                                            timeout=120, **kwargs)
+        except requests.RequestException:
+            response = None
+        self.results[route].append((time.perf_counter() - started, response is not None and response.ok))
+        return response
+
+    def flow(self):
+        scan = make_scan(self.rng)
+        response = self.timed("POST /extract", "POST", "/extract",
+                              files={"image": ("scan.jpg", scan, "image/jpeg")})
+        match = re.search(r'name="extracted_text" value="([^"]*)"', response.text if response else "")
+        if not match:
+            return self.fail("POST /extract")
+        # The user reads the extracted text before confirming it
+        time.sleep(self.think)
+
+        response = self.timed("POST /confirm", "POST", "/confirm",
+                              data={"extracted_text": html.unescape(match.group(1))})
+        location = response.headers.get("Location", "") if response is not None else ""
+        if "/live-order/" not in location:
+            return self.fail("POST /confirm")
+        draft_id = location.rstrip("/").rsplit("/", 1)[-1]
+
+        draft = self.session.get(f"{self.base_url}/api/drafts/{draft_id}", timeout=30).json()
+        # Fresh quantities make each flow a new document rather than a repeat
+        # the creation ledger would answer without calling Odoo
+        lines = [{"id": p["id"], "quantity": self.rng.randint(1, 50)} for p in draft["validated"]["products"]]
+        response = self.timed("PATCH /api/drafts/<id>/lines", "PATCH", f"/api/drafts/{draft_id}/lines",
+                              json={"lines": lines, "replace": True})
+        if response is None or not response.ok:
+            return
+
+        response = self.timed("POST /create", "POST", "/create",
+                              data={"draft_id": draft_id, "create_type": self.create_type})
+        if response is None or not response.headers.get("Location", "").endswith("/history"):
+            self.fail("POST /create")
+
+    def fail(self, route):
+        # Requests that answered but did not do their job (redirect back with a flash)
+        seconds, _ = self.results[route][-1]
+        self.results[route][-1] = (seconds, False)
+
+    def run(self):
+        done = 0
+        while time.perf_counter() < self.deadline and (not self.iterations or done < self.iterations):
+            self.flow()
+            done += 1
+
+
+def summarize(results, seconds):
+    summary = {}
+    for route in ROUTES:
+        samples = results.get(route, [])
+        latencies = [s for s, _ in samples]
+        summary[route] = {
+            "requests": len(samples),
+            "errors": sum(1 for _, ok in samples if not ok),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "rps": len(samples) / seconds if seconds else 0.0,
+        }
+    return summary
+
+
+def print_summary(summary, baseline=None):
+    print(f"{'route':>30} {'requests':>8} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'req/s':>7}" + (f" {'p95 vs base':>12}" if baseline else ""))
+    for route, row in summary.items():
+        line = (f"{route:>30} {row['requests']:>8} {row['errors']:>6} {row['p50'] * 1000:>8.1f} "
+                f"{row['p95'] * 1000:>8.1f} {row['p99'] * 1000:>8.1f} {row['rps']:>7.2f}")
+        if baseline and baseline.get(route, {}).get("p95"):
+            line += f" {row['p95'] / baseline[route]['p95'] - 1:>+12.1%}"
+        print(line)
+
+
+def regressions(summary, baseline, tolerance):
+    return [
+        route for route, row in summary.items()
+        if baseline.get(route, {}).get("p95") and row["p95"] > baseline[route]["p95"] * (1 + tolerance)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to run")
+    parser.add_argument("--iterations", type=int, default=0, help="flows per user (0: until --duration)")
+    parser.add_argument("--catalog-size", type=int, default=5000)
+    parser.add_argument("--vendors", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=15, help="line items per invoice")
+    parser.add_argument("--odoo-latency", type=float, default=0.005, help="seconds per stub RPC")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per fake OpenAI call")
+    parser.add_argument("--parse", choices=["auto", "llm"], default="auto",
+                        help="llm: always parse with the LLM instead of the local parser")
+    parser.add_argument("--think", type=float, default=0.0,
+                        help="seconds a user reads the extracted text before /confirm")
+    parser.add_argument("--create-type", choices=["po", "invoice"], default="po")
+    parser.add_argument("--save", help="write results as JSON")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 regression (0.2 = 20%%)")
+    options = parser.parse_args()
+
+    stub = stub_odoo.StubOdoo(latency=options.odoo_latency).seed(options.catalog_size, options.vendors)
+    _, odoo_url = stub_odoo.start(stub)
+    stub_odoo.configure_env(odoo_url)
+    fake = fake_openai.FakeOpenAI(latency=options.llm_latency, jitter=options.llm_latency / 10,
+                                  number_scans=True)
+    fake.use_invoice(make_invoice(stub, options.lines))
+    _, openai_url = fake_openai.start(fake)
+    fake_openai.configure(openai_url)
+    # Every scan is new anyway; keep the run from touching real cache and history files
+    os.environ.setdefault("CACHE_PATH", "")
+    os.environ.setdefault("HISTORY_PATH", "")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if options.parse == "llm":
+        os.environ["LOCAL_PARSE_THRESHOLD"] = "2"
+
+    server, base_url = start_app()
+    stub.reset_calls()
+    results = defaultdict(list)
+    started = time.perf_counter()
+    users = [
+        User(base_url, started + options.duration if not options.iterations else float("inf"),
+             options.iterations, options.create_type, results, seed, options.think)
+        for seed in range(options.users)
+    ]
+    # The app reports progress with print(); keep it out of the results
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+    seconds = time.perf_counter() - started
+    server.shutdown()
+
+    summary = summarize(results, seconds)
+    flows = summary["POST /extract"]["requests"]
+    completed = summary["POST /create"]["requests"] - summary["POST /create"]["errors"]
+    print(f"{options.users} users, {seconds:.1f}s, {completed}/{flows} flows completed "
+          f"({completed / seconds:.2f} flows/s), catalog {options.catalog_size}, "
+          f"{options.lines} lines, Odoo latency {options.odoo_latency * 1000:.0f} ms, "
+          f"LLM latency {options.llm_latency * 1000:.0f} ms")
+    if flows:
+        print(f"per flow: {stub.total_calls() / flows:.1f} Odoo RPCs, "
+              f"{sum(fake.statuses.values()) / flows:.1f} OpenAI calls")
+
+    baseline = None
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)["routes"]
+    print_summary(summary, baseline)
+
+    if options.save:
+        with open(options.save, "w") as f:
+            json.dump({"options": vars(options), "seconds": seconds, "routes": summary}, f, indent=2)
+    if baseline:
+        slower = regressions(summary, baseline, options.tolerance)
+        if slower:
+            print(f"p95 regressed by more than {options.tolerance:.0%}: {', '.join(slower)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
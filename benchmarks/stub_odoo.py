@@ -0,0 +1,462 @@
+"""In-process stub of the Odoo external API used by the benchmarks.
+
+Serves ``/xmlrpc/2/common``, ``/xmlrpc/2/object`` and ``/jsonrpc`` over
+HTTP/1.1 with keep-alive, keeps every model in memory, evaluates Odoo-style prefix
+domains and counts each ``execute_kw`` by model and method so benchmarks
+can report round trips as well as wall time.
+"""
+import datetime
+import json
+import random
+import re
+import socket
+import threading
+import time
+import xmlrpc.client
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_DB = "stub"
+STUB_USER = "admin"
+STUB_PASSWORD = "admin"
+STUB_UID = 2
+
+WORDS = [
+    "steel", "bolt", "washer", "cable", "copper", "pipe", "valve", "filter",
+    "bearing", "gasket", "hinge", "bracket", "sensor", "relay", "switch",
+    "motor", "pump", "hose", "clamp", "nozzle", "panel", "board", "screw",
+    "nut", "spring", "seal", "belt", "chain", "gear", "shaft", "lamp",
+    "fuse", "plug", "socket", "adapter", "mount", "frame", "cover", "tube",
+]
+
+SEED_WRITE_DATE = "2024-01-01 00:00:00"
+
+# Name prefix, lines field and line quantity field of created documents
+DOCUMENT_MODELS = {
+    "purchase.order": ("P", "order_line", "product_qty"),
+    "account.move": ("BILL/", "invoice_line_ids", "quantity"),
+}
+
+CURRENCIES = [("USD", 1.0), ("EUR", 0.92), ("GBP", 0.79), ("INR", 83.1), ("AED", 3.67)]
+
+
+def _now():
+    return datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _like(value, pattern, case_insensitive=True):
+    if value in (None, False):
+        return False
+    value = str(value)
+    pattern = str(pattern)
+    if "%" in pattern or "_" in pattern:
+        regex = "".join(
+            ".*" if ch == "%" else "." if ch == "_" else re.escape(ch)
+            for ch in pattern
+        )
+        flags = re.IGNORECASE if case_insensitive else 0
+        return re.search(regex, value, flags | re.DOTALL) is not None
+    if case_insensitive:
+        return pattern.lower() in value.lower()
+    return pattern in value
+
+
+def _scalar(value):
+    """Many2one values are stored as ``[id, display_name]``; compare on id."""
+    if isinstance(value, list) and len(value) == 2 and isinstance(value[0], int):
+        return value[0]
+    return value
+
+
+class StubOdoo:
+    """In-memory Odoo database with a tiny ORM and an RPC counter."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.models = {}
+        self.next_id = Counter()
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    # -- data -----------------------------------------------------------
+
+    def table(self, model):
+        return self.models.setdefault(model, {})
+
+    def insert(self, model, vals):
+        self.next_id[model] += 1
+        record_id = self.next_id[model]
+        record = {"id": record_id, "active": True, "write_date": _now()}
+        record.update(vals)
+        if "display_name" not in record:
+            record["display_name"] = record.get("name", f"{model},{record_id}")
+        self.table(model)[record_id] = record
+        return record_id
+
+    def seed(self, catalog_size=1000, vendors=50, seed=42):
+        """Populate currencies, suppliers and a product catalog."""
+        rng = random.Random(seed)
+        currency_ids = {}
+        for name, rate in CURRENCIES:
+            currency_ids[name] = self.insert("res.currency", {"name": name, "rate": rate})
+        for i in range(vendors):
+            currency = CURRENCIES[i % len(CURRENCIES)][0]
+            self.insert("res.partner", {
+                "name": f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} Supplies {i}",
+                "is_company": True,
+                "supplier_rank": 1,
+                "customer_rank": 0,
+                "property_purchase_currency_id": [currency_ids[currency], currency],
+            })
+        for i in range(catalog_size):
+            name = f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {i}"
+            tmpl_id = self.insert("product.template", {"name": name})
+            self.insert("product.product", {
+                "name": name,
+                "default_code": f"SKU-{i:06d}",
+                "list_price": round(rng.uniform(1, 500), 2),
+                "product_tmpl_id": [tmpl_id, name],
+                "sale_ok": True,
+                "purchase_ok": True,
+            })
+        # Seeded data predates anything the benchmarks write afterwards
+        for table in self.models.values():
+            for record in table.values():
+                record["write_date"] = SEED_WRITE_DATE
+        return self
+
+    def product_names(self, count, seed=7):
+        """Return ``count`` real product names to use as invoice lines."""
+        rng = random.Random(seed)
+        names = [record["name"] for record in self.table("product.product").values()]
+        return [rng.choice(names) for _ in range(count)]
+
+    # -- domains --------------------------------------------------------
+
+    def _match_leaf(self, record, leaf):
+        field, op, value = leaf
+        current = _scalar(record.get(field, False))
+        if op == "=":
+            return current == value
+        if op == "!=":
+            return current != value
+        if op in (">", ">=", "<", "<="):
+            if current in (None, False):
+                return False
+            return {
+                ">": current > value,
+                ">=": current >= value,
+                "<": current < value,
+                "<=": current <= value,
+            }[op]
+        if op == "in":
+            return current in value
+        if op == "not in":
+            return current not in value
+        if op == "ilike":
+            return _like(current, value)
+        if op == "like":
+            return _like(current, value, case_insensitive=False)
+        if op == "=ilike":
+            return str(current).lower() == str(value).lower()
+        if op == "not ilike":
+            return not _like(current, value)
+        raise ValueError(f"Unsupported operator {op!r}")
+
+    def _eval(self, record, domain, index):
+        term = domain[index]
+        if term == "&":
+            left, index = self._eval(record, domain, index + 1)
+            right, index = self._eval(record, domain, index)
+            return left and right, index
+        if term == "|":
+            left, index = self._eval(record, domain, index + 1)
+            right, index = self._eval(record, domain, index)
+            return left or right, index
+        if term == "!":
+            value, index = self._eval(record, domain, index + 1)
+            return not value, index
+        return self._match_leaf(record, term), index + 1
+
+    def matches(self, record, domain):
+        if not any(leaf[0] == "active" for leaf in domain if isinstance(leaf, (list, tuple))):
+            if not record.get("active", True):
+                return False
+        index = 0
+        while index < len(domain):
+            value, index = self._eval(record, domain, index)
+            if not value:
+                return False
+        return True
+
+    # -- ORM methods ----------------------------------------------------
+
+    def _order(self, records, order):
+        for part in reversed([p.strip() for p in (order or "id").split(",") if p.strip()]):
+            pieces = part.split()
+            field = pieces[0]
+            reverse = len(pieces) > 1 and pieces[1].lower() == "desc"
+
+            def sort_key(record, field=field):
+                value = _scalar(record.get(field))
+                missing = value is None or value is False
+                return (missing, "" if missing else value)
+
+            records.sort(key=sort_key, reverse=reverse)
+        return records
+
+    def _search(self, model, domain, offset=0, limit=None, order=None):
+        domain = [
+            [term[0], term[1], frozenset(term[2])]
+            if isinstance(term, (list, tuple)) and term[1] in ("in", "not in") else term
+            for term in domain
+        ]
+        records = [r for r in self.table(model).values() if self.matches(r, domain)]
+        records = self._order(records, order)
+        records = records[offset:]
+        if limit:
+            records = records[:limit]
+        return records
+
+    def _project(self, record, fields):
+        if not fields:
+            return dict(record)
+        row = {"id": record["id"]}
+        for field in fields:
+            row[field] = record.get(field, False)
+        return row
+
+    def execute_kw(self, model, method, args, kwargs=None):
+        kwargs = kwargs or {}
+        with self.lock:
+            self.calls[(model, method)] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            return getattr(self, f"_rpc_{method}")(model, *args, **kwargs)
+
+    def _rpc_search(self, model, domain, offset=0, limit=None, order=None, context=None):
+        return [r["id"] for r in self._search(model, domain, offset, limit, order)]
+
+    def _rpc_search_count(self, model, domain, context=None):
+        return len(self._search(model, domain))
+
+    def _rpc_search_read(self, model, domain=None, fields=None, offset=0, limit=None,
+                         order=None, context=None):
+        records = self._search(model, domain or [], offset, limit, order)
+        return [self._project(r, fields) for r in records]
+
+    def _rpc_read(self, model, ids, fields=None, context=None):
+        if isinstance(ids, int):
+            ids = [ids]
+        table = self.table(model)
+        return [self._project(table[i], fields) for i in ids if i in table]
+
+    def _rpc_create(self, model, vals, context=None):
+        if isinstance(vals, list):
+            return [self.insert(model, self._defaults(model, dict(v))) for v in vals]
+        return self.insert(model, self._defaults(model, dict(vals)))
+
+    def _defaults(self, model, vals):
+        """Fields Odoo computes when a purchase order or bill is created."""
+        if model not in DOCUMENT_MODELS:
+            return vals
+        prefix, lines_field, quantity_field = DOCUMENT_MODELS[model]
+        lines = [line[2] for line in vals.get(lines_field) or [] if len(line) == 3]
+        vals.setdefault("name", f"{prefix}{self.next_id[model] + 1:05d}")
+        vals.setdefault("amount_total", round(sum(
+            line.get(quantity_field, 0) * line.get("price_unit", 0) for line in lines), 2))
+        vals.setdefault("state", "draft")
+        vals.setdefault("date_order" if model == "purchase.order" else "date", _now())
+        partner = self.table("res.partner").get(_scalar(vals.get("partner_id")))
+        if partner:
+            vals["partner_id"] = [partner["id"], partner["name"]]
+            vals.setdefault("currency_id", partner.get("property_purchase_currency_id") or False)
+        return vals
+
+    def seed_supplierinfo(self, share=0.5, seed=5):
+        """Give every supplier agreed prices, with quantity breaks, for ``share`` of the catalog.
+
+        Half of the entries are on the product template rather than the
+        variant, and each supplier's prices are in its purchase currency.
+        """
+        rng = random.Random(seed)
+        currencies = {record["name"]: record for record in self.table("res.currency").values()}
+        products = list(self.table("product.product").values())
+        for partner in list(self.table("res.partner").values()):
+            currency = partner.get("property_purchase_currency_id") or False
+            rate = currencies[currency[1]]["rate"] if currency else 1.0
+            for product in rng.sample(products, int(len(products) * share)):
+                price = round(product["list_price"] * rng.uniform(0.5, 0.8) * rate, 2)
+                target = ({"product_id": [product["id"], product["name"]]} if rng.random() < 0.5 else
+                          {"product_id": False})
+                for min_qty, discount in [(0, 1.0), (10, 0.95), (50, 0.9)]:
+                    self.insert("product.supplierinfo", dict(
+                        target, partner_id=[partner["id"], partner["name"]], product_tmpl_id=product["product_tmpl_id"],
+                        min_qty=min_qty, price=round(price * discount, 2), currency_id=currency,
+                        sequence=1, date_start=False, date_end=False,
+                    ))
+        return self
+
+    def seed_orders(self, count, seed=3):
+        """Add ``count`` purchase orders and vendor bills from the seeded suppliers."""
+        rng = random.Random(seed)
+        partners = list(self.table("res.partner").values())
+        start = datetime.datetime(2020, 1, 1)
+        for i in range(count):
+            model = "purchase.order" if i % 2 else "account.move"
+            date = (start + datetime.timedelta(minutes=rng.randint(0, 5 * 365 * 24 * 60))).strftime(
+                "%Y-%m-%d %H:%M:%S")
+            vals = {"partner_id": rng.choice(partners)["id"], "amount_total": round(rng.uniform(10, 5000), 2),
+                    "state": rng.choice(["draft", "purchase", "done", "cancel"] if i % 2 else
+                                        ["draft", "posted", "cancel"])}
+            if model == "purchase.order":
+                vals.update(date_order=date, partner_ref=f"INV-{i:07d}")
+            else:
+                vals.update(move_type="in_invoice", date=date[:10], invoice_date=date[:10], ref=f"INV-{i:07d}")
+            record_id = self.insert(model, self._defaults(model, vals))
+            self.table(model)[record_id]["write_date"] = SEED_WRITE_DATE
+        return self
+
+    def _rpc_write(self, model, ids, vals, context=None):
+        table = self.table(model)
+        for record_id in ids:
+            table[record_id].update(vals)
+            table[record_id]["write_date"] = _now()
+        return True
+
+    # -- accounting -----------------------------------------------------
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def reset_calls(self):
+        with self.lock:
+            self.calls.clear()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Headers and body are separate writes; avoid Nagle/delayed-ACK stalls
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if self.path == "/jsonrpc":
+            return self._jsonrpc(body)
+        stub = self.server.stub
+        try:
+            params, method = xmlrpc.client.loads(body, use_builtin_types=True)
+            if self.path.endswith("/common"):
+                result = self._common(method, params)
+            elif self.path.endswith("/object"):
+                db, uid, password, model, orm_method = params[:5]
+                args = params[5] if len(params) > 5 else []
+                kwargs = params[6] if len(params) > 6 else {}
+                self._check(db, uid, password)
+                result = stub.execute_kw(model, orm_method, args, kwargs)
+            else:
+                raise xmlrpc.client.Fault(404, f"Unknown endpoint {self.path}")
+            payload = xmlrpc.client.dumps((result,), methodresponse=True, allow_none=True)
+        except xmlrpc.client.Fault as fault:
+            payload = xmlrpc.client.dumps(fault, methodresponse=True, allow_none=True)
+        except Exception as e:
+            payload = xmlrpc.client.dumps(
+                xmlrpc.client.Fault(1, f"{type(e).__name__}: {e}"),
+                methodresponse=True, allow_none=True,
+            )
+        data = payload.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _jsonrpc(self, body):
+        request = json.loads(body)
+        params = request.get("params", {})
+        response = {"jsonrpc": "2.0", "id": request.get("id")}
+        try:
+            args = params.get("args", [])
+            if params.get("service") == "common":
+                response["result"] = self._common(params.get("method"), args)
+            else:
+                db, uid, password, model, orm_method = args[:5]
+                self._check(db, uid, password)
+                response["result"] = self.server.stub.execute_kw(
+                    model, orm_method,
+                    args[5] if len(args) > 5 else [],
+                    args[6] if len(args) > 6 else {},
+                )
+        except xmlrpc.client.Fault as fault:
+            response["error"] = {"code": 200, "message": "Odoo Server Error",
+                                 "data": {"message": fault.faultString}}
+        except Exception as e:
+            response["error"] = {"code": 200, "message": "Odoo Server Error",
+                                 "data": {"message": f"{type(e).__name__}: {e}"}}
+        data = json.dumps(response).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _common(self, method, params):
+        if method == "version":
+            return {"server_version": "17.0-stub", "protocol_version": 1}
+        if method == "authenticate":
+            db, login, password = params[:3]
+            if db == STUB_DB and login == STUB_USER and password == STUB_PASSWORD:
+                return STUB_UID
+            return False
+        raise xmlrpc.client.Fault(2, f"Unknown common method {method}")
+
+    def _check(self, db, uid, password):
+        if db != STUB_DB or uid != STUB_UID or password != STUB_PASSWORD:
+            raise xmlrpc.client.Fault(3, "Access Denied")
+
+
+def start(stub=None, host="127.0.0.1", port=0):
+    """Serve ``stub`` on a background thread; returns ``(server, url)``."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.stub = stub or StubOdoo().seed()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def configure_env(url):
+    """Point ``compare`` at the stub; call before importing it."""
+    import os
+    os.environ["ODOO_URL"] = url
+    os.environ["ODOO_DB"] = STUB_DB
+    os.environ["ODOO_USERNAME"] = STUB_USER
+    os.environ["ODOO_PASSWORD"] = STUB_PASSWORD
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a stub Odoo server.")
+    parser.add_argument("--port", type=int, default=8069)
+    parser.add_argument("--catalog-size", type=int, default=1000)
+    parser.add_argument("--vendors", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per RPC")
+    options = parser.parse_args()
+
+    stub = StubOdoo(latency=options.latency).seed(options.catalog_size, options.vendors)
+    server, url = start(stub, port=options.port)
+    print(f"Stub Odoo listening on {url} (db={STUB_DB}, user={STUB_USER}, password={STUB_PASSWORD})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
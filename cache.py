@@ -0,0 +1,163 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import weakref
+
+# Shared on-disk cache settings; an empty CACHE_PATH disables caching
+CACHE_PATH = os.getenv("CACHE_PATH", "cache.db")
+CACHE_TTL = int(os.getenv("CACHE_TTL", str(30 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+_instances = weakref.WeakSet()
+
+
+def _reopen_after_fork():
+    # A SQLite connection must not be used across fork(); forked web
+    # workers open their own on first use
+    for cache in list(_instances):
+        cache.local = threading.local()
+
+
+os.register_at_fork(after_in_child=_reopen_after_fork)
+
+
+def cache_key(*parts):
+    """Hash ``parts`` (bytes or anything ``str()``-able) into a cache key."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = str(part).encode("utf-8")
+        digest.update(hashlib.sha256(part).digest())
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """Content-addressed JSON cache in SQLite with TTL and LRU eviction.
+
+    Entries live in one table shared by several namespaces. Each namespace
+    is bounded independently by entry count and stored bytes; when over
+    either bound the least recently read entries are dropped first.
+    """
+
+    def __init__(self, namespace, path=CACHE_PATH, ttl=CACHE_TTL,
+                 max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.namespace = namespace
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.local = threading.local()
+        _instances.add(self)
+        if self.enabled:
+            self._connect().execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " size INTEGER NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            self._connect().execute(
+                "CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, accessed_at)"
+            )
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def _connect(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def get(self, key):
+        """Return the cached value for ``key`` or None on a miss."""
+        if not self.enabled:
+            return None
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, created_at FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            now = time.time()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            conn.execute(
+                "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key),
+            )
+            self.hits += 1
+            return json.loads(row[0])
+        except Exception as e:
+            logging.warning(f"Cache read failed ({self.namespace}): {e}")
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        """Store a JSON-serializable ``value`` and evict past the bounds."""
+        if not self.enabled:
+            return
+        try:
+            data = json.dumps(value)
+            now = time.time()
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, size, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (self.namespace, key, data, len(data), now, now),
+            )
+            self._evict(conn, now)
+        except Exception as e:
+            logging.warning(f"Cache write failed ({self.namespace}): {e}")
+
+    def _evict(self, conn, now):
+        conn.execute(
+            "DELETE FROM cache WHERE namespace = ? AND created_at < ?",
+            (self.namespace, now - self.ttl),
+        )
+        count, total = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache WHERE namespace = ?",
+            (self.namespace,),
+        ).fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # Walk from least to most recently used until both bounds hold
+        victims = []
+        for key, size in conn.execute(
+            "SELECT key, size FROM cache WHERE namespace = ? ORDER BY accessed_at",
+            (self.namespace,),
+        ):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            victims.append((self.namespace, key))
+            count -= 1
+            total -= size
+        conn.executemany("DELETE FROM cache WHERE namespace = ? AND key = ?", victims)
+
+    def clear(self):
+        if self.enabled:
+            self._connect().execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def cache_stats():
+    """Hits and misses per namespace, summed over every cache in this process."""
+    totals = {}
+    for cache in list(_instances):
+        entry = totals.setdefault(cache.namespace, {"hits": 0, "misses": 0})
+        entry["hits"] += cache.hits
+        entry["misses"] += cache.misses
+    return totals
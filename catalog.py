@@ -0,0 +1,249 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+import time
+from collections import Counter
+
+CATALOG_FIELDS = ["name", "default_code", "list_price", "product_tmpl_id", "write_date", "active"]
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+# A partial last word is looked up by prefix when it starts at most this
+# many indexed words; a shorter one just verifies the other words' hits
+MAX_PREFIX_TOKENS = 32
+
+
+def normalize(text):
+    return " ".join(TOKEN_RE.findall((text or "").lower()))
+
+
+def trigrams(text):
+    padded = f"  {normalize(text)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ProductCatalog:
+    """In-process index of ``product.product`` for local line-item matching.
+
+    The catalog is loaded once in pages and then kept current with
+    ``write_date`` deltas, so refreshing a large catalog costs one small
+    ``search_read`` instead of a full reload. Lookups go exact code first,
+    then token postings (verified as a case-insensitive substring, like
+    Odoo's ``ilike``), then trigram similarity for misspelt names. Name
+    lookups intersect the postings of every whole word with those of the
+    words the last (possibly cut) word starts. Fuzzy lookups only score
+    products that share one of the query's rarest trigrams, which every
+    product similar enough must.
+    """
+
+    def __init__(self, execute, refresh_interval=300, page_size=5000, min_similarity=0.45):
+        self.execute = execute
+        self.refresh_interval = refresh_interval
+        self.page_size = page_size
+        self.min_similarity = min_similarity
+
+        self.products = {}
+        self.by_code = {}
+        self.by_token = {}
+        self.tokens = []
+        self.by_trigram = {}
+        self.trigram_sizes = {}
+        self.last_write_date = None
+        self.last_write_ids = set()
+        self.loaded_at = None
+        self.lock = threading.RLock()
+        self.refresh_lock = threading.Lock()
+
+    # -- loading --------------------------------------------------------
+
+    def _fetch(self, domain):
+        """Fetch all rows matching ``domain`` in pages ordered by id."""
+        rows = []
+        last_id = 0
+        while True:
+            page = self.execute(
+                "product.product", "search_read",
+                [domain + [["id", ">", last_id]]],
+                {"fields": CATALOG_FIELDS, "order": "id", "limit": self.page_size}
+            )
+            rows.extend(page)
+            if len(page) < self.page_size:
+                return rows
+            last_id = page[-1]["id"]
+
+    def load(self):
+        """Load the full active catalog and rebuild every index."""
+        rows = self._fetch([["active", "=", True]])
+        with self.lock:
+            self.products = {}
+            self.by_code = {}
+            self.by_token = {}
+            self.tokens = []
+            self.by_trigram = {}
+            self.trigram_sizes = {}
+            self.last_write_date = None
+            self.last_write_ids = set()
+            self._apply(rows)
+            self.tokens = sorted(self.by_token)
+            self.loaded_at = time.monotonic()
+        print(f"Product catalog loaded: {len(self.products)} products")
+        return len(self.products)
+
+    def refresh(self):
+        """Apply products created, changed or archived since the last sync."""
+        if self.last_write_date is None:
+            return self.load()
+        # Rows sharing the newest write_date may still be joined by later
+        # writes within the same second, so re-check that second minus the
+        # ids already applied from it
+        rows = self._fetch([
+            "|", ["write_date", ">", self.last_write_date],
+            "&", ["write_date", "=", self.last_write_date],
+            ["id", "not in", sorted(self.last_write_ids)],
+            ["active", "in", [True, False]],
+        ])
+        with self.lock:
+            self._apply(rows)
+            self.loaded_at = time.monotonic()
+        return len(rows)
+
+    def ensure_fresh(self):
+        """Load on first use and refresh once ``refresh_interval`` elapsed."""
+        if self.loaded_at is not None and time.monotonic() - self.loaded_at < self.refresh_interval:
+            return
+        if not self.refresh_lock.acquire(blocking=self.loaded_at is None):
+            return  # another thread is refreshing; serve the current index
+        try:
+            if self.loaded_at is None or time.monotonic() - self.loaded_at >= self.refresh_interval:
+                self.refresh()
+        finally:
+            self.refresh_lock.release()
+
+    def _apply(self, rows):
+        for row in rows:
+            self._remove(row["id"])
+            if row.get("active", True):
+                self._add(row)
+            write_date = row.get("write_date")
+            if not write_date:
+                continue
+            if self.last_write_date is None or write_date > self.last_write_date:
+                self.last_write_date = write_date
+                self.last_write_ids = {row["id"]}
+            elif write_date == self.last_write_date:
+                self.last_write_ids.add(row["id"])
+
+    def _add(self, row):
+        product_id = row["id"]
+        self.products[product_id] = row
+        code = (row.get("default_code") or "").lower()
+        if code:
+            self.by_code.setdefault(code, set()).add(product_id)
+        for token in set(TOKEN_RE.findall((row.get("name") or "").lower())):
+            if token not in self.by_token:
+                self.by_token[token] = set()
+                if self.loaded_at is not None:
+                    # A full load sorts all words at once instead
+                    bisect.insort(self.tokens, token)
+            self.by_token[token].add(product_id)
+        grams = trigrams(row.get("name"))
+        self.trigram_sizes[product_id] = len(grams)
+        for gram in grams:
+            self.by_trigram.setdefault(gram, set()).add(product_id)
+
+    def _remove(self, product_id):
+        row = self.products.pop(product_id, None)
+        if not row:
+            return
+        code = (row.get("default_code") or "").lower()
+        if code:
+            self.by_code.get(code, set()).discard(product_id)
+        for token in set(TOKEN_RE.findall((row.get("name") or "").lower())):
+            self.by_token.get(token, set()).discard(product_id)
+        self.trigram_sizes.pop(product_id, None)
+        for gram in trigrams(row.get("name")):
+            self.by_trigram.get(gram, set()).discard(product_id)
+
+    # -- matching -------------------------------------------------------
+
+    def _ordered(self, product_ids, limit):
+        """The first ``limit`` ids in Odoo's default ``default_code, name, id`` order."""
+        def key(product_id):
+            row = self.products[product_id]
+            code = row.get("default_code") or ""
+            return (not code, code, row.get("name") or "", product_id)
+        return heapq.nsmallest(limit, product_ids, key=key)
+
+    def _prefixed(self, prefix):
+        """Postings of the words starting with ``prefix``, or None when there are too many."""
+        start = bisect.bisect_left(self.tokens, prefix)
+        end = bisect.bisect_left(self.tokens, prefix + "\x7f", start,
+                                 min(len(self.tokens), start + MAX_PREFIX_TOKENS + 1))
+        if end - start > MAX_PREFIX_TOKENS:
+            return None
+        return [self.by_token[token] for token in self.tokens[start:end]]
+
+    def _name_candidates(self, tokens):
+        if not tokens:
+            return set()
+        # The last token may be cut short: it matches the words it starts
+        postings = [self.by_token.get(token, set()) for token in tokens[:-1]]
+        prefixed = self._prefixed(tokens[-1])
+        if prefixed is not None:
+            postings.append(prefixed[0] if len(prefixed) == 1 else set().union(*prefixed))
+        elif len(tokens) == 1:
+            # Too many words start with it; only the word itself
+            postings.append(self.by_token.get(tokens[0], set()))
+        postings.sort(key=len)
+        return set.intersection(*postings)
+
+    def _similar(self, needle, limit):
+        """Up to ``limit`` ids by trigram similarity to ``needle``, best first."""
+        query = trigrams(needle)
+        # Dice similarity 2c / (q + p) reaches min_similarity only with c
+        # shared trigrams of at least s * q / (2 - s) (when p == c), so a
+        # match shares at least one of the q - need + 1 rarest of them
+        need = max(1, math.ceil(self.min_similarity * len(query) / (2 - self.min_similarity) - 1e-9))
+        grams = sorted(query, key=lambda gram: len(self.by_trigram.get(gram, ())))
+        rare, common = grams[:len(grams) - need + 1], grams[len(grams) - need + 1:]
+        shared = Counter()
+        for gram in rare:
+            shared.update(self.by_trigram.get(gram, ()))
+        candidates = set(shared)
+        for gram in common:
+            shared.update(candidates.intersection(self.by_trigram.get(gram, ())))
+        scored = []
+        for product_id, common_count in shared.items():
+            if common_count < need:
+                continue
+            score = 2.0 * common_count / (len(query) + self.trigram_sizes[product_id])
+            if score >= self.min_similarity:
+                scored.append((-score, product_id))
+        return [product_id for _, product_id in heapq.nsmallest(limit, scored)]
+
+    def match(self, name, limit=5):
+        """Return up to ``limit`` product rows matching an extracted name."""
+        needle = (name or "").strip().lower()
+        if not needle:
+            return []
+        with self.lock:
+            ids = self.by_code.get(needle)
+            if ids:
+                return [self.products[i] for i in self._ordered(ids, limit)]
+
+            tokens = TOKEN_RE.findall(needle)
+            hits = [
+                i for i in self._name_candidates(tokens)
+                if needle in (self.products[i].get("name") or "").lower()
+            ]
+            if not hits and len(tokens) <= 1:
+                hits = [
+                    i for i, row in self.products.items()
+                    if needle in (row.get("default_code") or "").lower()
+                ]
+            if hits:
+                return [self.products[i] for i in self._ordered(hits, limit)]
+            return [self.products[i] for i in self._similar(needle, limit)]
+
+    def __len__(self):
+        return len(self.products)
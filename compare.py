@@ -1,14 +1,20 @@
-import xmlrpc.client
-import socket
 import os
+import threading
 import json
-import openai
-import datetime
-import requests
-from getpass import getpass
-from tabulate import tabulate
-import pkg_resources
+import re
+import time
 from dotenv import load_dotenv
+from cache import DiskCache, cache_key
+from catalog import ProductCatalog
+from currency_rates import RateService
+from history import OrderHistory
+from ledger import CreationLedger, creation_key
+import llm
+import metrics
+from local_parser import LocalParser
+from odoo_client import OdooClient, may_have_written
+from pricing import SupplierPricing
+from vendors import VendorResolver
 
 # Load environment variables
 load_dotenv()
@@ -20,36 +26,155 @@ ODOO_USERNAME = os.getenv("ODOO_USERNAME", "admin")
 ODOO_PASSWORD = os.getenv("ODOO_PASSWORD")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-# Set timeout for connections
-socket.setdefaulttimeout(15)
+# Seconds before the in-memory supplier index is reloaded
+VENDOR_INDEX_TTL = int(os.getenv("VENDOR_INDEX_TTL", "900"))
 
-# Check OpenAI version to use the appropriate API call
-try:
-    OPENAI_VERSION = pkg_resources.get_distribution("openai").version
-    IS_NEW_OPENAI = int(OPENAI_VERSION.split('.')[0]) >= 1
-except:
-    IS_NEW_OPENAI = False
+# Currency rates: Odoo table TTL, optional offline rate file (JSON or CSV)
+# and whether the public exchange-rate API may be queried in the background
+CURRENCY_RATE_TTL = int(os.getenv("CURRENCY_RATE_TTL", "3600"))
+EXCHANGE_RATES_FILE = os.getenv("EXCHANGE_RATES_FILE")
+EXCHANGE_RATES_API = os.getenv("EXCHANGE_RATES_API", "1").lower() not in ("0", "false", "no")
+
+# Odoo RPC client: "xmlrpc" or "jsonrpc", pooled connections and retries
+ODOO_TRANSPORT = os.getenv("ODOO_TRANSPORT", "xmlrpc")
+ODOO_POOL_SIZE = int(os.getenv("ODOO_POOL_SIZE", "8"))
+ODOO_TIMEOUT = float(os.getenv("ODOO_TIMEOUT", "15"))
+ODOO_RETRIES = int(os.getenv("ODOO_RETRIES", "3"))
+# Background connection: delay between attempts (doubling up to the max)
+# and how long a call that needs Odoo waits for the connection
+ODOO_RECONNECT_MIN = float(os.getenv("ODOO_RECONNECT_MIN", "1"))
+ODOO_RECONNECT_MAX = float(os.getenv("ODOO_RECONNECT_MAX", "60"))
+ODOO_CONNECT_WAIT = float(os.getenv("ODOO_CONNECT_WAIT", "5"))
+
+# Optional in-process product catalog used instead of live ilike searches
+PRODUCT_CATALOG_CACHE = os.getenv("PRODUCT_CATALOG_CACHE", "").lower() in ("1", "true", "yes")
+PRODUCT_CATALOG_REFRESH = int(os.getenv("PRODUCT_CATALOG_REFRESH", "300"))
+
+# Product matching: candidates kept per extracted line, line names per
+# batched search_read, and the fields read for every matched product
+MATCH_LIMIT = 5
+MATCH_CHUNK_SIZE = int(os.getenv("ODOO_MATCH_CHUNK_SIZE", "50"))
+PRODUCT_ORDER = "default_code, name, id"
+PRODUCT_FIELDS = ["name", "list_price", "default_code", "product_tmpl_id"]
+
+# Vendor prices from product.supplierinfo: document prices further than
+# this share from the agreed price are flagged; PURCHASE_PRICE_SOURCE=supplier
+# uses the agreed price instead of the document's wherever there is one
+PRICE_DEVIATION = float(os.getenv("PRICE_DEVIATION", "0.05"))
+PURCHASE_PRICE_SOURCE = os.getenv("PURCHASE_PRICE_SOURCE", "document")
+
+PARSE_MODEL = "gpt-4o"
+PARSE_SYSTEM_PROMPT = "Extract data and return only valid JSON, no other text."
+# Extracted text sent to the parser; multi-page documents need more than one page's worth
+PARSE_MAX_CHARS = int(os.getenv("PARSE_MAX_CHARS", "6000"))
+
+# Parsed invoice JSON keyed by a hash of the prompt sent for the text
+parse_cache = DiskCache("parse")
+# Local (template/generic) parses at or above this confidence skip the LLM;
+# set above 1 to always call the LLM
+LOCAL_PARSE_THRESHOLD = float(os.getenv("LOCAL_PARSE_THRESHOLD", "0.8"))
+
+
+CREATE_MODELS = {"po": "purchase.order", "invoice": "account.move"}
+# Field holding the vendor's document number, used to find documents
+# already created when a creation is retried
+REF_FIELDS = {"po": "partner_ref", "invoice": "ref"}
+
+# Creations in flight and done, keyed by vendor, invoice number and lines;
+# set CREATION_LEDGER_PATH to share the ledger between worker processes
+CREATION_LEDGER_PATH = os.getenv("CREATION_LEDGER_PATH") or None
+CREATION_LEDGER_TTL = int(os.getenv("CREATION_LEDGER_TTL", str(30 * 24 * 3600)))
+
+# Order history database (empty: in memory) and seconds between syncs of
+# documents created or changed in Odoo
+HISTORY_PATH = os.getenv("HISTORY_PATH", "history.db")
+HISTORY_SYNC_INTERVAL = int(os.getenv("HISTORY_SYNC_INTERVAL", "60"))
+
+
+def new_vendor_values(name):
+    """Values for a supplier created from a document's vendor name."""
+    return {
+        "name": name,
+        "is_company": True,
+        "supplier_rank": 1,
+        "customer_rank": 0
+    }
+
+
+def unparsed_invoice():
+    """Placeholder structure returned when parsing fails."""
+    return {
+        "vendor": "Unknown Vendor",
+        "invoice_number": "",
+        "date": "",
+        "products": [
+            {
+                "name": "Sample Product",
+                "quantity": 1,
+                "price": 0.0,
+                "description": "Extracted from document"
+            }
+        ],
+        "total": 0.0,
+        "currency": "USD"
+    }
+
+
+def parsed_ok(parsed):
+    """Whether a parse found something: not empty and not ``unparsed_invoice()``."""
+    return bool(parsed) and parsed != unparsed_invoice()
+
+
+def or_domain(leaves):
+    """Combine domain leaves with OR using Odoo's prefix notation."""
+    if not leaves:
+        return []
+    return ["|"] * (len(leaves) - 1) + list(leaves)
 
 class OdooIntegration:
     def __init__(self):
         self.uid = None
         self.models = None
-        self.currency_rates = {}
         self.base_currency = "USD"
+        self.vendors = VendorResolver(self._execute, ttl=VENDOR_INDEX_TTL)
+        self.pricing = SupplierPricing(self._execute, deviation=PRICE_DEVIATION,
+                                       prefer_supplier=PURCHASE_PRICE_SOURCE == "supplier")
+        self.rates = RateService(
+            self._execute,
+            ttl=CURRENCY_RATE_TTL,
+            offline_path=EXCHANGE_RATES_FILE,
+            fetch_external=EXCHANGE_RATES_API,
+        )
+        self._rpc_local = threading.local()
+        self.local_parser = LocalParser()
+        self.ledger = CreationLedger(CREATION_LEDGER_PATH, ttl=CREATION_LEDGER_TTL)
+        self.history = OrderHistory(self._execute, HISTORY_PATH or None, sync_interval=HISTORY_SYNC_INTERVAL)
+        self.catalog = None
+        if PRODUCT_CATALOG_CACHE:
+            self.catalog = ProductCatalog(self._execute, refresh_interval=PRODUCT_CATALOG_REFRESH)
+
+        self._connected = threading.Event()
+        self._connect_lock = threading.Lock()
+        self._connector = None
 
-        # OpenAI configuration
-        if OPENAI_API_KEY:
-            openai.api_key = OPENAI_API_KEY
-        else:
+        if not OPENAI_API_KEY:
             print("Warning: OPENAI_API_KEY not found in environment variables")
 
     def connect_to_odoo(self):
         """Connect to the Odoo server and authenticate."""
         try:
-            common = xmlrpc.client.ServerProxy(f"{ODOO_URL}/xmlrpc/2/common")
-            self.uid = common.authenticate(ODOO_DB, ODOO_USERNAME, ODOO_PASSWORD, {})
-            if self.uid:
-                self.models = xmlrpc.client.ServerProxy(f"{ODOO_URL}/xmlrpc/2/object")
+            client = OdooClient(
+                ODOO_URL, ODOO_DB, ODOO_USERNAME, ODOO_PASSWORD,
+                transport=ODOO_TRANSPORT,
+                pool_size=ODOO_POOL_SIZE,
+                timeout=ODOO_TIMEOUT,
+                retries=ODOO_RETRIES,
+            )
+            uid = client.authenticate()
+            if uid:
+                self.models = client
+                self.uid = uid
+                self._connected.set()
                 print("Connected to Odoo successfully.")
                 return True
             else:
@@ -59,68 +184,99 @@ class OdooIntegration:
             print(f"Error connecting to Odoo: {e}")
             return False
 
+    def connect_in_background(self):
+        """Start connecting to Odoo on a background thread and return at once.
+
+        The thread retries with a doubling delay until it is connected.
+        Calls that need Odoo wait for it (see ``wait_connected``), so the
+        app can start serving before Odoo answers.
+        """
+        with self._connect_lock:
+            if self.uid or (self._connector is not None and self._connector.is_alive()):
+                return
+            self._connector = threading.Thread(target=self._keep_connecting, name="odoo-connect", daemon=True)
+            self._connector.start()
+
+    def _keep_connecting(self):
+        delay = ODOO_RECONNECT_MIN
+        while not self.connect_to_odoo():
+            print(f"Retrying the Odoo connection in {delay:.0f}s")
+            time.sleep(delay)
+            delay = min(ODOO_RECONNECT_MAX, delay * 2)
+
+    def wait_connected(self, timeout=ODOO_CONNECT_WAIT):
+        """True once connected to Odoo, waiting up to ``timeout`` seconds.
+
+        Starts the background connection if nothing is connecting yet.
+        """
+        if self.uid:
+            return True
+        self.connect_in_background()
+        return self._connected.wait(timeout)
+
+    def warm_up(self):
+        """Connect and preload the vendor index, currency rates and product catalog.
+
+        Meant to run once in the server's master process before workers
+        fork, so every worker starts warm. Returns the seconds spent per
+        step; failures are logged and left to load on first use.
+        """
+        timings = {}
+        steps = [("vendors", self.vendors.load), ("rates", self.rates.preload)]
+        if self.catalog is not None:
+            steps.append(("catalog", self.catalog.load))
+        started = time.perf_counter()
+        if not self.uid and not self.connect_to_odoo():
+            return {"connect": round(time.perf_counter() - started, 3)}
+        timings["connect"] = round(time.perf_counter() - started, 3)
+        for name, load in steps:
+            started = time.perf_counter()
+            try:
+                load()
+            except Exception as e:
+                print(f"Warmup of {name} failed: {e}")
+            timings[name] = round(time.perf_counter() - started, 3)
+        print(f"Warmup done: {timings}")
+        return timings
+
+    def after_fork(self):
+        """Drop Odoo connections inherited from the parent process.
+
+        The session (uid) stays valid; each worker opens its own
+        keep-alive connections on first use. A worker forked before the
+        connection was made starts its own background connection.
+        """
+        self._connect_lock = threading.Lock()
+        self._connector = None
+        self._connected = threading.Event()
+        if self.uid:
+            self._connected.set()
+        if self.models is not None:
+            self.models.close()
+        if not self.uid:
+            self.connect_in_background()
+
+    def health(self):
+        """Connection and warm-state details for the readiness endpoint."""
+        return {
+            "odoo": dict(self.models.stats(), connected=bool(self.uid)) if self.models else {
+                "connected": False,
+                "connecting": self._connector is not None and self._connector.is_alive(),
+            },
+            "vendors": len(self.vendors.by_name) if self.vendors.loaded_at is not None else None,
+            "currencies": len(self.rates.table) if self.rates.table is not None else None,
+            "catalog": len(self.catalog) if self.catalog is not None and self.catalog.loaded_at is not None else None,
+            "creations": self.ledger.stats(),
+            "history": self.history.stats(),
+        }
+
     def get_exchange_rate(self, from_currency, to_currency):
         """Get exchange rate between currencies"""
-        if from_currency == to_currency:
-            return 1.0
-            
-        # Check cache first
-        cache_key = f"{from_currency}_to_{to_currency}"
-        if cache_key in self.currency_rates:
-            return self.currency_rates[cache_key]
-        
         try:
-            # Try to get from Odoo first
-            if self.models:
-                currency_from = self.models.execute_kw(
-                    ODOO_DB, self.uid, ODOO_PASSWORD,
-                    "res.currency", "search_read",
-                    [[["name", "=", from_currency]]],
-                    {"fields": ["rate"], "limit": 1}
-                )
-                
-                currency_to = self.models.execute_kw(
-                    ODOO_DB, self.uid, ODOO_PASSWORD,
-                    "res.currency", "search_read",
-                    [[["name", "=", to_currency]]],
-                    {"fields": ["rate"], "limit": 1}
-                )
-                
-                if currency_from and currency_to:
-                    rate = currency_to[0]["rate"] / currency_from[0]["rate"]
-                    self.currency_rates[cache_key] = rate
-                    return rate
-            
-            # Fallback to exchange rate API
-            try:
-                response = requests.get(f"https://api.exchangerate-api.com/v4/latest/{from_currency}", timeout=5)
-                if response.status_code == 200:
-                    data = response.json()
-                    if to_currency in data["rates"]:
-                        rate = data["rates"][to_currency]
-                        self.currency_rates[cache_key] = rate
-                        return rate
-            except:
-                pass
-            
-            # Default fallback rates for common currencies
-            fallback_rates = {
-                "USD_to_EUR": 0.85,
-                "EUR_to_USD": 1.18,
-                "USD_to_GBP": 0.73,
-                "GBP_to_USD": 1.37,
-                "USD_to_INR": 83.0,
-                "INR_to_USD": 0.012
-            }
-            
-            if cache_key in fallback_rates:
-                rate = fallback_rates[cache_key]
-                self.currency_rates[cache_key] = rate
-                return rate
-                
+            return self.rates.get_rate(from_currency, to_currency)
         except Exception as e:
             print(f"Error getting exchange rate: {e}")
-        
+
         # Return 1.0 as fallback
         return 1.0
 
@@ -128,27 +284,20 @@ class OdooIntegration:
         """Get vendor's preferred currency"""
         if not vendor_id or not self.models:
             return "USD"
-            
+
         try:
-            vendor_data = self.models.execute_kw(
-                ODOO_DB, self.uid, ODOO_PASSWORD,
+            # The many2one comes back as [id, "EUR"], so one read is enough
+            vendor_data = self._execute(
                 "res.partner", "read",
                 [vendor_id],
                 {"fields": ["property_purchase_currency_id"]}
             )
-            
+
             if vendor_data and vendor_data[0].get("property_purchase_currency_id"):
-                currency_id = vendor_data[0]["property_purchase_currency_id"][0]
-                currency_data = self.models.execute_kw(
-                    ODOO_DB, self.uid, ODOO_PASSWORD,
-                    "res.currency", "read",
-                    [currency_id],
-                    {"fields": ["name"]}
-                )
-                return currency_data[0]["name"]
+                return vendor_data[0]["property_purchase_currency_id"][1]
         except Exception as e:
             print(f"Error getting vendor currency: {e}")
-        
+
         return "USD"
 
     def convert_price(self, price, from_currency, to_currency):
@@ -159,10 +308,26 @@ class OdooIntegration:
         rate = self.get_exchange_rate(from_currency, to_currency)
         return round(price * rate, 2)
 
-    def parse_extracted_text(self, extracted_text):
-        """Parse the extracted text to identify company, vendor, and product details."""
+    def convert_prices(self, prices, from_currency, to_currency):
+        """Convert a list of prices with a single rate lookup."""
+        if from_currency == to_currency:
+            return list(prices)
+        rate = self.get_exchange_rate(from_currency, to_currency)
+        return [round(price * rate, 2) for price in prices]
+
+    def supplier_prices(self, vendor_id, products):
+        """The vendor's ``product.supplierinfo`` entries for ``products``, by product id."""
         try:
-            prompt = f"""
+            return self.pricing.fetch(vendor_id, products)
+        except Exception as e:
+            print(f"Error reading supplier prices: {e}")
+            return {}
+
+    def _parse_prompt(self, extracted_text):
+        # Browsers submit form text with CRLF line breaks; normalize so the
+        # text shown on the page and the text posted back share one key
+        extracted_text = extracted_text.replace("\r\n", "\n").strip()
+        return f"""
             Parse this invoice/PO text and return ONLY valid JSON:
             {{
                 "vendor": "company name",
@@ -180,185 +345,222 @@ class OdooIntegration:
                 "currency": "USD"
             }}
             
-            Text: {extracted_text[:1500]}
+            Text: {extracted_text[:PARSE_MAX_CHARS]}
             """
-            
-            # Use the old OpenAI API format (compatible with openai==0.28)
-            response = openai.ChatCompletion.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "Extract data and return only valid JSON, no other text."},
-                    {"role": "user", "content": prompt}
-                ],
+
+    def remember_parse(self, extracted_text, parsed_data):
+        """Cache ``parsed_data`` as the parse of ``extracted_text``.
+
+        Used when the structure came straight from the vision call
+        (PIPELINE_MODE=fused), so parsing that text again costs no LLM call.
+        """
+        prompt = self._parse_prompt(extracted_text)
+        parse_cache.set(cache_key(PARSE_MODEL, PARSE_SYSTEM_PROMPT, prompt), parsed_data)
+
+    def _parse_messages(self, extracted_text):
+        return [
+            {"role": "system", "content": PARSE_SYSTEM_PROMPT},
+            {"role": "user", "content": self._parse_prompt(extracted_text)}
+        ]
+
+    def _parse_without_llm(self, extracted_text, key, started):
+        """The cached or local parse of the text, or None when the LLM is needed."""
+        cached = parse_cache.get(key)
+        if cached is not None:
+            self.local_parser.record("cache", time.perf_counter() - started)
+            return cached
+
+        # Fixed-layout vendors and clean tables need no LLM call
+        local, confidence, source = self.local_parser.parse(extracted_text)
+        if confidence >= LOCAL_PARSE_THRESHOLD:
+            self.local_parser.record("local", time.perf_counter() - started)
+            print(f"Parsed locally with {source} (confidence {confidence})")
+            return local
+        return None
+
+    def _parse_reply(self, result_text, key, started):
+        """The invoice JSON in an LLM reply (cached under ``key``), or None."""
+        # Remove markdown code blocks if present
+        result_text = re.sub(r'```json\s*|\s*```', '', result_text.strip())
+
+        # Find JSON object
+        json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
+        if json_match:
+            parsed_data = json.loads(json_match.group())
+            parse_cache.set(key, parsed_data)
+            self.local_parser.record("llm", time.perf_counter() - started)
+            return parsed_data
+        print("No valid JSON found in response")
+        return None
+
+    @metrics.timed("parse")
+    def parse_extracted_text(self, extracted_text):
+        """Parse the extracted text to identify company, vendor, and product details."""
+        try:
+            started = time.perf_counter()
+            key = cache_key(PARSE_MODEL, PARSE_SYSTEM_PROMPT, self._parse_prompt(extracted_text))
+            parsed_data = self._parse_without_llm(extracted_text, key, started)
+            if parsed_data is not None:
+                return parsed_data
+
+            response = llm.chat(
+                model=PARSE_MODEL,
+                messages=self._parse_messages(extracted_text),
                 max_tokens=800
             )
-            
-            result_text = response["choices"][0]["message"]["content"].strip()
-            
-            # Clean and extract JSON
-            import re
-            # Remove markdown code blocks if present
-            result_text = re.sub(r'```json\s*|\s*```', '', result_text)
-            
-            # Find JSON object
-            json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
-            if json_match:
-                json_str = json_match.group()
-                parsed_data = json.loads(json_str)
-                return parsed_data
-            else:
-                print("No valid JSON found in response")
-                return None
-                
+            return self._parse_reply(response["choices"][0]["message"]["content"], key, started)
+
         except Exception as e:
             print(f"Error parsing extracted text: {e}")
-            # Return a default structure if parsing fails
-            return {
-                "vendor": "Unknown Vendor",
-                "invoice_number": "",
-                "date": "",
-                "products": [
-                    {
-                        "name": "Sample Product",
-                        "quantity": 1,
-                        "price": 0.0,
-                        "description": "Extracted from document"
-                    }
-                ],
-                "total": 0.0,
-                "currency": "USD"
-            }
+            return unparsed_invoice()
+
+    def iter_parse(self, extracted_text):
+        """``parse_extracted_text``, streaming the LLM's reply as it is written.
+
+        Yields ``("token", text)`` for each piece of the reply (none when
+        the parse comes from the cache or the local parser) and then
+        ``("parsed", parsed_data)``.
+        """
+        try:
+            started = time.perf_counter()
+            key = cache_key(PARSE_MODEL, PARSE_SYSTEM_PROMPT, self._parse_prompt(extracted_text))
+            parsed_data = self._parse_without_llm(extracted_text, key, started)
+            if parsed_data is not None:
+                yield "parsed", parsed_data
+                return
+
+            pieces = []
+            for piece in llm.stream(model=PARSE_MODEL, messages=self._parse_messages(extracted_text),
+                                    max_tokens=800):
+                pieces.append(piece)
+                yield "token", piece
+            parsed_data = self._parse_reply("".join(pieces), key, started)
+        except Exception as e:
+            print(f"Error parsing extracted text: {e}")
+            parsed_data = unparsed_invoice()
+        yield "parsed", parsed_data
+
+    def _execute(self, model, method, args, kwargs=None):
+        """Run a single ORM call on the Odoo server."""
+        if not self.uid and not self.wait_connected():
+            raise ConnectionError("Not connected to Odoo")
+        self._rpc_local.count = self.rpc_count() + 1
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = self.models.execute_kw(
+                ODOO_DB, self.uid, ODOO_PASSWORD,
+                model, method, args, kwargs or {}
+            )
+            failed = False
+            return result
+        finally:
+            metrics.odoo_rpc(model, method, time.perf_counter() - started, failed)
+
+    @metrics.timed("match")
+    def match_products(self, product_names):
+        """Match extracted line names to products with batched lookups.
+
+        Every name is searched by ``name`` and ``default_code`` in one
+        OR-combined ``search_read`` per chunk of names, capped at
+        ``MATCH_LIMIT`` hits per name. The hits are mapped back to each name
+        locally (name matches first, then code matches, at most
+        ``MATCH_LIMIT`` per name, in Odoo's product order); when the cap was
+        reached, the names left with fewer are searched again together, and
+        on their own if no name filled up. The full product rows are then
+        fetched with a single ``read``. When the
+        product catalog cache is enabled, names are matched against the
+        local index instead and no RPC is made once it is loaded.
+
+        Returns a dict mapping each name to its list of product rows.
+        """
+        names = list(dict.fromkeys(name for name in product_names if name))
+        if not names:
+            return {}
+
+        if self.catalog is not None:
+            try:
+                self.catalog.ensure_fresh()
+                return {name: self.catalog.match(name, MATCH_LIMIT) for name in names}
+            except Exception as e:
+                print(f"Product catalog unavailable, searching Odoo directly: {e}")
 
+        selected = {}
+        for start in range(0, len(names), MATCH_CHUNK_SIZE):
+            pending = names[start:start + MATCH_CHUNK_SIZE]
+            while pending:
+                leaves = []
+                for name in pending:
+                    leaves.append(["name", "ilike", name])
+                    leaves.append(["default_code", "ilike", name])
+                # A short or generic name ("Kit") matches much of the catalog,
+                # so the shared page is capped at MATCH_LIMIT hits per name
+                limit = len(pending) * MATCH_LIMIT
+                hits = self._execute(
+                    "product.product", "search_read",
+                    [or_domain(leaves)],
+                    {"fields": ["name", "default_code"], "order": PRODUCT_ORDER, "limit": limit}
+                )
+                for name in pending:
+                    selected[name] = self._select_hits(name, hits)
+                if len(hits) < limit:
+                    break
+                # The cap was reached: names with fewer than MATCH_LIMIT hits
+                # may have been crowded out, so search again for just those
+                short = [name for name in pending if len(selected[name]) < MATCH_LIMIT]
+                if len(short) == len(pending):
+                    for name in short:
+                        selected[name] = self._search_name(name)
+                    break
+                pending = short
+
+        candidate_ids = list(dict.fromkeys(pid for ids in selected.values() for pid in ids))
+        if not candidate_ids:
+            return {name: [] for name in names}
+
+        rows = self._execute(
+            "product.product", "read",
+            [candidate_ids],
+            {"fields": PRODUCT_FIELDS}
+        )
+        rows_by_id = {row["id"]: row for row in rows}
+        return {
+            name: [rows_by_id[pid] for pid in ids if pid in rows_by_id]
+            for name, ids in selected.items()
+        }
+
+    def _select_hits(self, name, hits):
+        """Ids of ``hits`` for ``name``: name matches, else code matches."""
+        needle = name.lower()
+        ids = [hit["id"] for hit in hits if needle in (hit.get("name") or "").lower()]
+        if not ids:
+            ids = [hit["id"] for hit in hits if needle in (hit.get("default_code") or "").lower()]
+        return list(dict.fromkeys(ids))[:MATCH_LIMIT]
+
+    def _search_name(self, name):
+        """Ids of up to ``MATCH_LIMIT`` products for one name, as before batching."""
+        for field in ("name", "default_code"):
+            ids = self._execute(
+                "product.product", "search",
+                [[[field, "ilike", name]]],
+                {"order": PRODUCT_ORDER, "limit": MATCH_LIMIT}
+            )
+            if ids:
+                return ids
+        return []
+
+    @metrics.timed("validate")
     def validate_data(self, parsed_data):
         """Validate the parsed data against the Odoo database."""
         if not parsed_data:
             return None
             
         try:
-            # Validate vendor
-            vendor_name = parsed_data.get("vendor", "").strip()
-            vendor_id = None
-            vendor_currency = "USD"
-            
-            if vendor_name and vendor_name != "Unknown Vendor":
-                vendor_ids = self.models.execute_kw(
-                    ODOO_DB, self.uid, ODOO_PASSWORD,
-                    "res.partner", "search",
-                    [[["name", "ilike", vendor_name], ["supplier_rank", ">", 0]]]
-                )
-                if vendor_ids:
-                    vendor_id = vendor_ids[0]
-                    vendor_currency = self.get_vendor_currency(vendor_id)
-                    print(f"Found vendor: {vendor_name} (Currency: {vendor_currency})")
-                else:
-                    print(f"Vendor '{vendor_name}' not found. Will create new vendor.")
-
-            # Get document currency
-            document_currency = parsed_data.get("currency", "USD")
-            
-            # Get products from database
-            products = parsed_data.get("products", [])
-            validated_products = []
-            
-            # First, try to match products from the extracted text
-            for product in products:
-                product_name = product.get("name", "").strip()
-                if not product_name or product_name == "Sample Product":
-                    continue
-                    
-                # Try multiple search strategies
-                search_terms = [
-                    [["name", "ilike", product_name]],
-                    [["name", "ilike", f"%{product_name}%"]],
-                    [["default_code", "ilike", product_name]]
-                ]
-                
-                found = False
-                for search_term in search_terms:
-                    if found:
-                        break
-                        
-                    product_ids = self.models.execute_kw(
-                        ODOO_DB, self.uid, ODOO_PASSWORD,
-                        "product.product", "search",
-                        [search_term],
-                        {"limit": 5}
-                    )
-                    
-                    if product_ids:
-                        for product_id in product_ids:
-                            product_data = self.models.execute_kw(
-                                ODOO_DB, self.uid, ODOO_PASSWORD,
-                                "product.product", "read",
-                                [product_id],
-                                {"fields": ["name", "list_price", "default_code"]}
-                            )[0]
-                            
-                            # Convert price from document currency to vendor currency
-                            original_price = float(product.get("price", product_data.get("list_price", 0)))
-                            converted_price = self.convert_price(original_price, document_currency, vendor_currency)
-                            
-                            validated_products.append({
-                                "id": product_id,
-                                "name": product_data["name"],
-                                "code": product_data.get("default_code", ""),
-                                "quantity": float(product.get("quantity", 1)),
-                                "price": converted_price,
-                                "original_price": original_price,
-                                "original_currency": document_currency
-                            })
-                            found = True
-                        
-                        print(f"Found {len(product_ids)} products matching: {product_name}")
-                        break
-
-            # If no products found from text, get sample products from database
-            if not validated_products:
-                print("No products matched from extracted text. Getting sample products from database...")
-                sample_product_ids = self.models.execute_kw(
-                    ODOO_DB, self.uid, ODOO_PASSWORD,
-                    "product.product", "search",
-                    [[["sale_ok", "=", True], ["active", "=", True]]],
-                    {"limit": 10}
-                )
-                
-                for product_id in sample_product_ids:
-                    product_data = self.models.execute_kw(
-                        ODOO_DB, self.uid, ODOO_PASSWORD,
-                        "product.product", "read",
-                        [product_id],
-                        {"fields": ["name", "list_price", "default_code"]}
-                    )[0]
-                    
-                    # Convert price from base currency to vendor currency
-                    original_price = float(product_data.get("list_price", 0.0))
-                    converted_price = self.convert_price(original_price, self.base_currency, vendor_currency)
-                    
-                    validated_products.append({
-                        "id": product_id,
-                        "name": product_data["name"],
-                        "code": product_data.get("default_code", ""),
-                        "quantity": 1.0,
-                        "price": converted_price,
-                        "original_price": original_price,
-                        "original_currency": self.base_currency
-                    })
-
-            print(f"Total validated products: {len(validated_products)}")
-
-            # Return validated data
-            return {
-                "vendor_id": vendor_id,
-                "vendor_name": vendor_name or "New Vendor",
-                "vendor_currency": vendor_currency,
-                "products": validated_products,
-                "invoice_number": parsed_data.get("invoice_number", ""),
-                "date": parsed_data.get("date", ""),
-                "total": self.convert_price(parsed_data.get("total", 0), document_currency, vendor_currency),
-                "currency": vendor_currency,
-                "original_currency": document_currency,
-                "exchange_rate": self.get_exchange_rate(document_currency, vendor_currency)
-            }
+            validated = None
+            for event, data in self.iter_validation(parsed_data):
+                if event == "validated":
+                    validated = data
+            return validated
             
         except Exception as e:
             print(f"Error validating data: {e}")
@@ -366,116 +568,427 @@ class OdooIntegration:
             traceback.print_exc()
             return None
 
+    def _validated_product(self, product_data, quantity, priced):
+        return dict({
+            "id": product_data["id"],
+            "name": product_data["name"],
+            "code": product_data.get("default_code", ""),
+            "quantity": quantity,
+        }, **priced)
+
+    def iter_validation(self, parsed_data, chunk_size=None):
+        """Validate parsed data step by step, for streaming to the browser.
+
+        Yields ``("vendor", header)`` once the vendor and currencies are
+        known, then ``("line", {"index", "name", "products"})`` for every
+        named line as its matches arrive, searching ``chunk_size`` lines
+        at a time (all in one go by default), and finally
+        ``("validated", validated_data)``, which is what ``validate_data``
+        returns. Each chunk's matches are priced from the vendor's supplier
+        prices with one more call (see ``SupplierPricing``).
+        """
+        # Validate vendor
+        vendor_name = parsed_data.get("vendor", "").strip()
+        vendor_id = None
+        vendor_currency = "USD"
+
+        if vendor_name and vendor_name != "Unknown Vendor":
+            vendor = self.vendors.resolve(vendor_name)
+            if vendor:
+                vendor_id = vendor["id"]
+                vendor_currency = vendor["currency"] or "USD"
+                print(f"Found vendor: {vendor_name} (Currency: {vendor_currency})")
+            else:
+                print(f"Vendor '{vendor_name}' not found. Will create new vendor.")
+
+        # Get document currency
+        document_currency = parsed_data.get("currency", "USD")
+        header = {
+            "vendor_id": vendor_id,
+            "vendor_name": vendor_name or "New Vendor",
+            "vendor_currency": vendor_currency,
+            "invoice_number": parsed_data.get("invoice_number", ""),
+            "date": parsed_data.get("date", ""),
+            "currency": vendor_currency,
+            "original_currency": document_currency,
+            "exchange_rate": self.get_exchange_rate(document_currency, vendor_currency)
+        }
+        yield "vendor", header
+
+        # Resolve the lines in a few batched calls, then map back in memory
+        lines = []
+        for index, product in enumerate(parsed_data.get("products", [])):
+            product_name = (product.get("name") or "").strip()
+            if product_name and product_name != "Sample Product":
+                lines.append((index, product_name, product))
+
+        validated_products = []
+        size = chunk_size or max(1, len(lines))
+        for start in range(0, len(lines), size):
+            chunk = lines[start:start + size]
+            matches = self.match_products([name for _, name, _ in chunk])
+            candidates = [
+                (index, product_data, {
+                    "product": product_data,
+                    "quantity": float(product.get("quantity", 1)),
+                    "price": None if product.get("price") is None else float(product["price"]),
+                    "currency": document_currency,
+                })
+                for index, product_name, product in chunk
+                for product_data in matches.get(product_name) or []
+            ]
+            # One supplierinfo read for every candidate of the chunk, then all
+            # prices converted to the vendor currency together
+            entries = self.supplier_prices(vendor_id, [product_data for _, product_data, _ in candidates])
+            priced = self.pricing.price_lines([line for _, _, line in candidates], entries,
+                                              vendor_currency, self.convert_prices)
+            by_line = {}
+            for (index, product_data, line), prices in zip(candidates, priced):
+                by_line.setdefault(index, []).append(
+                    self._validated_product(product_data, line["quantity"], prices))
+            for index, product_name, product in chunk:
+                line_products = by_line.get(index, [])
+                if line_products:
+                    print(f"Found {len(line_products)} products matching: {product_name}")
+                validated_products.extend(line_products)
+                yield "line", {"index": index, "name": product_name, "products": line_products}
+
+        # If no products found from text, get sample products from database
+        if not validated_products:
+            print("No products matched from extracted text. Getting sample products from database...")
+            sample_products = self._execute(
+                "product.product", "search_read",
+                [[["sale_ok", "=", True], ["active", "=", True]]],
+                {"fields": PRODUCT_FIELDS, "limit": 10}
+            )
+
+            # Convert prices from base currency to vendor currency
+            list_prices = [float(product_data.get("list_price", 0.0)) for product_data in sample_products]
+            converted = self.convert_prices(list_prices, self.base_currency, vendor_currency)
+            for product_data, original_price, price in zip(sample_products, list_prices, converted):
+                validated_products.append(self._validated_product(product_data, 1.0, {
+                    "price": price,
+                    "original_price": original_price,
+                    "original_currency": self.base_currency,
+                    "price_source": "list_price",
+                    "supplier_price": None,
+                    "price_deviation": None,
+                    "price_flag": False,
+                }))
+
+        print(f"Total validated products: {len(validated_products)}")
+
+        yield "validated", dict(
+            header,
+            products=validated_products,
+            price_flags=sum(1 for product in validated_products if product["price_flag"]),
+            total=self.convert_price(parsed_data.get("total", 0), document_currency, vendor_currency),
+        )
+
+    def document_values(self, validated_data, create_type, vendor_id):
+        """Build the ``create`` values for a Purchase Order or vendor bill.
+
+        The invoice number goes into the vendor reference field, which is
+        what ``find_existing`` searches on.
+        """
+        ref = (validated_data.get("invoice_number") or "").strip()
+        if create_type == "po":
+            order_lines = [(0, 0, {
+                "product_id": product["id"],
+                "product_qty": product["quantity"],
+                "price_unit": product.get("price", 0.0),
+                "name": product.get("name", "Product")
+            }) for product in validated_data["products"]]
+            values = {
+                "partner_id": vendor_id,
+                "order_line": order_lines,
+                "state": "draft"
+            }
+            if ref:
+                values["partner_ref"] = ref
+            return values
+        if create_type == "invoice":
+            invoice_lines = [(0, 0, {
+                "product_id": product["id"],
+                "quantity": product["quantity"],
+                "price_unit": product.get("price", 0.0),
+                "name": product.get("name", "Product")
+            }) for product in validated_data["products"]]
+            values = {
+                "move_type": "in_invoice",
+                "partner_id": vendor_id,
+                "invoice_line_ids": invoice_lines,
+                "state": "draft"
+            }
+            if ref:
+                values["ref"] = ref
+            return values
+        raise ValueError(f"Unknown create type: {create_type}")
+
+    def rpc_count(self):
+        """Number of Odoo calls made so far by the current thread."""
+        return getattr(self._rpc_local, "count", 0)
+
+    def last_create_rpcs(self):
+        """Odoo calls spent per document by this thread's last creation."""
+        return getattr(self._rpc_local, "last_create_rpcs", None)
+
+    def last_create_status(self):
+        """How this thread's last ``create_po_or_invoice`` ended.
+
+        ``status`` is ``created``, ``existing`` (found in the ledger or in
+        Odoo, nothing new written), ``in_flight`` (another request is
+        creating the same document) or ``failed``; ``written`` tells
+        whether a failed ``create`` may still have reached Odoo.
+        """
+        return getattr(self._rpc_local, "last_create", None)
+
+    def find_existing(self, create_type, documents):
+        """Odoo records matching ``(vendor_id, reference)`` pairs.
+
+        One ``search_read`` on the vendor reference field covers all
+        pairs; cancelled documents are ignored. Returns a dict mapping each
+        pair found to its record ID.
+        """
+        refs = sorted({ref for _, ref in documents if ref})
+        if not refs:
+            return {}
+        field = REF_FIELDS[create_type]
+        domain = [(field, "in", refs), ("state", "!=", "cancel")]
+        if create_type == "invoice":
+            domain.append(("move_type", "=", "in_invoice"))
+        rows = self._execute(
+            CREATE_MODELS[create_type], "search_read", [domain],
+            {"fields": ["partner_id", field], "order": "id"}
+        )
+        found = {}
+        for row in rows:
+            partner = row["partner_id"]
+            partner = partner[0] if isinstance(partner, (list, tuple)) else partner
+            found.setdefault((partner, row[field]), row["id"])
+        wanted = set(documents)
+        return {pair: record_id for pair, record_id in found.items() if pair in wanted}
+
+    def _record_history(self, create_type, record_id, validated_data, vendor_id):
+        # The history is for browsing; never fail a creation over it
+        try:
+            self.history.record(create_type, record_id, validated_data, vendor_id)
+        except Exception as e:
+            print(f"Could not add {create_type} {record_id} to the order history: {e}")
+
+    def _resolve_vendor(self, validated_data):
+        """The document's vendor ID, creating the vendor if it is new."""
+        vendor_id = validated_data.get("vendor_id")
+        if vendor_id:
+            return vendor_id
+        vendor_name = validated_data.get("vendor_name", "New Vendor")
+        vendor = self.vendors.find(vendor_name)
+        if vendor:
+            # Created by an earlier document, or in Odoo, since this one was validated
+            return vendor["id"]
+        print("Creating new vendor...")
+        vendor_id = self._execute(
+            "res.partner", "create",
+            [new_vendor_values(vendor_name)]
+        )
+        self.vendors.remember(vendor_id, vendor_name)
+        print(f"Created new vendor with ID: {vendor_id}")
+        return vendor_id
+
+    @metrics.timed("create")
     def create_po_or_invoice(self, validated_data, create_type="po"):
-        """Create a Purchase Order or Invoice in Odoo."""
+        """Create a Purchase Order or Invoice in Odoo, at most once.
+
+        Order lines are built straight from the validated products, so a
+        document costs one ``create`` call, plus a live vendor search and
+        one more ``create`` when the vendor is not in the supplier index. The document is claimed in the creation
+        ledger first: a document already created returns its ID without
+        calling Odoo, and one whose earlier ``create`` got no answer is
+        looked up by vendor reference before creating it again.
+        """
+        model = CREATE_MODELS.get(create_type)
+        ref = (validated_data.get("invoice_number") or "").strip()
+        self._rpc_local.last_create = {"status": "failed", "written": False}
+        key = None
+        sent = False
         try:
             print(f"Starting to create {create_type}...")
-            
+            rpcs_before = self.rpc_count()
+
             if not validated_data.get("products"):
                 print("No products to create order with")
                 return False
-                
-            # Create or get vendor
-            vendor_id = validated_data.get("vendor_id")
-            if not vendor_id:
-                print("Creating new vendor...")
-                # Create a new vendor
-                vendor_data = {
-                    "name": validated_data.get("vendor_name", "New Vendor"),
-                    "is_company": True,
-                    "supplier_rank": 1,
-                    "customer_rank": 0
-                }
-                vendor_id = self.models.execute_kw(
-                    ODOO_DB, self.uid, ODOO_PASSWORD,
-                    "res.partner", "create",
-                    [vendor_data]
-                )
-                print(f"Created new vendor with ID: {vendor_id}")
-
-            if create_type == "po":
-                print("Creating Purchase Order...")
-                # Create a Purchase Order
-                order_lines = []
-                for product in validated_data["products"]:
-                    # Get product template ID for purchase order
-                    product_template_id = self.models.execute_kw(
-                        ODOO_DB, self.uid, ODOO_PASSWORD,
-                        "product.product", "read",
-                        [product["id"]],
-                        {"fields": ["product_tmpl_id"]}
-                    )[0]["product_tmpl_id"][0]
-                    
-                    order_lines.append((0, 0, {
-                        "product_id": product["id"],
-                        "product_qty": product["quantity"],
-                        "price_unit": product.get("price", 0.0),
-                        "name": product.get("name", "Product")
-                    }))
-                
-                po_data = {
-                    "partner_id": vendor_id,
-                    "order_line": order_lines,
-                    "state": "draft"
-                }
-                
-                print(f"Creating PO with data: {po_data}")
-                
-                po_id = self.models.execute_kw(
-                    ODOO_DB, self.uid, ODOO_PASSWORD,
-                    "purchase.order", "create",
-                    [po_data]
-                )
-                print(f"Purchase Order created with ID: {po_id}")
-                return po_id
-                
-            elif create_type == "invoice":
-                print("Creating Invoice...")
-                # Create an Invoice
-                invoice_lines = []
-                for product in validated_data["products"]:
-                    invoice_lines.append((0, 0, {
-                        "product_id": product["id"],
-                        "quantity": product["quantity"],
-                        "price_unit": product.get("price", 0.0),
-                        "name": product.get("name", "Product")
-                    }))
-                
-                invoice_data = {
-                    "move_type": "in_invoice",
-                    "partner_id": vendor_id,
-                    "invoice_line_ids": invoice_lines,
-                    "state": "draft"
-                }
-                
-                print(f"Creating invoice with data: {invoice_data}")
-                
-                invoice_id = self.models.execute_kw(
-                    ODOO_DB, self.uid, ODOO_PASSWORD,
-                    "account.move", "create",
-                    [invoice_data]
-                )
-                print(f"Invoice created with ID: {invoice_id}")
-                return invoice_id
-                
+
+            key = creation_key(validated_data, create_type)
+            claimed, previous = self.ledger.claim(key, model, ref)
+            if not claimed:
+                if previous["state"] == "done":
+                    print(f"{model} {previous['record_id']} was already created for this document")
+                    self._rpc_local.last_create = {"status": "existing", "written": False}
+                    return previous["record_id"]
+                print(f"This {create_type} is already being created by another request")
+                self._rpc_local.last_create = {"status": "in_flight", "written": False}
+                key = None
+                return False
+
+            vendor_id = self._resolve_vendor(validated_data)
+
+            if previous and ref:
+                # An earlier attempt may have created it without hearing back
+                existing = self.find_existing(create_type, [(vendor_id, ref)]).get((vendor_id, ref))
+                if existing:
+                    self.ledger.finish(key, existing, model, ref)
+                    self._record_history(create_type, existing, validated_data, vendor_id)
+                    print(f"Found {model} {existing} from an earlier attempt; not creating it again")
+                    self._rpc_local.last_create = {"status": "existing", "written": False}
+                    return existing
+            elif previous:
+                print(f"Warning: an earlier attempt for this {create_type} got no answer and it "
+                      "has no invoice number to look it up by; creating it again")
+
+            values = self.document_values(validated_data, create_type, vendor_id)
+            print(f"Creating {model} with {len(validated_data['products'])} lines...")
+            sent = True
+            record_id = self._execute(model, "create", [values])
+            self.ledger.finish(key, record_id, model, ref)
+            self._record_history(create_type, record_id, validated_data, vendor_id)
+
+            rpcs = self.rpc_count() - rpcs_before
+            self._rpc_local.last_create_rpcs = rpcs
+            self._rpc_local.last_create = {"status": "created", "written": True}
+            print(f"{model} created with ID: {record_id} ({rpcs} RPCs)")
+            return record_id
+
         except Exception as e:
+            written = sent and may_have_written(e)
+            if key:
+                self.ledger.fail(key, written, model, ref)
+            self._rpc_local.last_create = {"status": "failed", "written": written, "error": str(e)}
             print(f"Error creating {create_type}: {e}")
             import traceback
             traceback.print_exc()
             return False
 
+    @metrics.timed("create_many")
+    def create_many(self, documents, create_type="po"):
+        """Create many Purchase Orders or Invoices with a handful of calls.
+
+        Vendors missing an ID are looked up in the supplier index, the ones
+        still unknown are created in one ``create`` and all
+        documents are then created in a single ``create`` with a list of
+        values. Documents already in the creation ledger are not created
+        again, and those whose earlier ``create`` got no answer are looked
+        up in Odoo with one ``search_read`` for the whole batch. Returns
+        the record IDs in the order of ``documents``, with False for
+        documents another request is still creating.
+        """
+        documents = [doc for doc in documents if doc.get("products")]
+        if not documents:
+            return []
+        rpcs_before = self.rpc_count()
+        model = CREATE_MODELS[create_type]
+
+        record_ids = [None] * len(documents)
+        claims = {}
+        for index, doc in enumerate(documents):
+            key = creation_key(doc, create_type)
+            if key in claims:
+                # The same document twice in one batch
+                continue
+            claimed, previous = self.ledger.claim(key, model, (doc.get("invoice_number") or "").strip())
+            if claimed:
+                claims[key] = (index, previous)
+            else:
+                record_ids[index] = previous.get("record_id") or False
+        try:
+            todo = [index for index, _ in claims.values()]
+
+            vendor_ids = {}
+            missing = []
+            for name in dict.fromkeys(
+                documents[i].get("vendor_name", "New Vendor") for i in todo if not documents[i].get("vendor_id")
+            ):
+                vendor = self.vendors.find(name)
+                if vendor:
+                    vendor_ids[name] = vendor["id"]
+                else:
+                    missing.append(name)
+            if missing:
+                created = self._execute(
+                    "res.partner", "create",
+                    [[new_vendor_values(name) for name in missing]]
+                )
+                for name, vendor_id in zip(missing, created):
+                    vendor_ids[name] = vendor_id
+                    self.vendors.remember(vendor_id, name)
+
+            def vendor_of(doc):
+                return doc.get("vendor_id") or vendor_ids[doc.get("vendor_name", "New Vendor")]
+
+            def ref_of(doc):
+                return (doc.get("invoice_number") or "").strip()
+
+            retried = [(vendor_of(documents[i]), ref_of(documents[i]))
+                       for i, previous in claims.values() if previous]
+            existing = self.find_existing(create_type, retried) if retried else {}
+            for key, (index, previous) in list(claims.items()):
+                record_id = previous and existing.get((vendor_of(documents[index]), ref_of(documents[index])))
+                if record_id:
+                    self.ledger.finish(key, record_id, model, ref_of(documents[index]))
+                    self._record_history(create_type, record_id, documents[index], vendor_of(documents[index]))
+                    record_ids[index] = record_id
+                    del claims[key]
+
+            if claims:
+                values = [self.document_values(documents[i], create_type, vendor_of(documents[i]))
+                          for i, _ in claims.values()]
+                try:
+                    created = self._execute(model, "create", [values])
+                except Exception as e:
+                    written = may_have_written(e)
+                    for key, (index, _) in claims.items():
+                        self.ledger.fail(key, written, model, ref_of(documents[index]))
+                    claims = {}
+                    raise
+                for (key, (index, _)), record_id in zip(claims.items(), created):
+                    self.ledger.finish(key, record_id, model, ref_of(documents[index]))
+                    self._record_history(create_type, record_id, documents[index], vendor_of(documents[index]))
+                    record_ids[index] = record_id
+                claims = {}
+        finally:
+            # Failed before the create call: nothing was written
+            for key in claims:
+                self.ledger.fail(key)
+
+        # Duplicates inside the batch share the first copy's record
+        first = {}
+        for index, doc in enumerate(documents):
+            key = creation_key(doc, create_type)
+            if record_ids[index] is None:
+                record_ids[index] = first.get(key, False)
+            first.setdefault(key, record_ids[index])
+
+        rpcs = self.rpc_count() - rpcs_before
+        self._rpc_local.last_create_rpcs = rpcs / len(documents)
+        print(f"{sum(1 for r in record_ids if r)}/{len(documents)} {model} records in place "
+              f"with {rpcs} RPCs ({rpcs / len(documents):.2f} per document)")
+        return record_ids
+
 def main():
-    extracted_text = input("Enter the extracted text: ")
     odoo_integration = OdooIntegration()
-
-    if not odoo_integration.connect_to_odoo():
-        return
+    # Log in while the text is typed in and parsed
+    odoo_integration.connect_in_background()
+    extracted_text = input("Enter the extracted text: ")
 
     parsed_data = odoo_integration.parse_extracted_text(extracted_text)
     if not parsed_data:
         print("Failed to parse extracted text.")
         return
 
+    if not odoo_integration.wait_connected(timeout=ODOO_TIMEOUT * (ODOO_RETRIES + 1)):
+        print("Could not connect to Odoo.")
+        return
+
     validated_data = odoo_integration.validate_data(parsed_data)
     if not validated_data:
         print("Failed to validate data.")
@@ -0,0 +1,183 @@
+import csv
+import json
+import logging
+import threading
+import time
+
+from cache import DiskCache
+
+EXTERNAL_RATES_URL = "https://api.exchangerate-api.com/v4/latest/{currency}"
+
+# Default fallback rates for common currencies
+FALLBACK_RATES = {
+    "USD_to_EUR": 0.85,
+    "EUR_to_USD": 1.18,
+    "USD_to_GBP": 0.73,
+    "GBP_to_USD": 1.37,
+    "USD_to_INR": 83.0,
+    "INR_to_USD": 0.012
+}
+
+
+def load_rate_file(path):
+    """Read an offline rate table: ``{currency: units per base currency}``.
+
+    JSON files hold ``{"base": "USD", "rates": {"EUR": 0.92, ...}}`` (or just
+    the ``rates`` mapping); CSV files hold ``currency,rate`` rows.
+    """
+    if path.lower().endswith(".csv"):
+        with open(path, newline="") as f:
+            return {
+                row[0].strip().upper(): float(row[1])
+                for row in csv.reader(f)
+                if len(row) >= 2 and row[0].strip() and not row[0].lower().startswith("currency")
+            }
+    with open(path) as f:
+        data = json.load(f)
+    rates = data.get("rates", data)
+    if data.get("base"):
+        rates.setdefault(data["base"], 1.0)
+    return {name.upper(): float(rate) for name, rate in rates.items()}
+
+
+class RateService:
+    """Exchange rates for request handling without blocking on the network.
+
+    Rates are looked up, in order, in the Odoo ``res.currency`` table
+    (preloaded in one ``search_read`` and shared between worker processes
+    through the on-disk cache for ``ttl`` seconds), an optional offline
+    rate file, rates previously fetched from the public exchange-rate API,
+    and a small built-in fallback table. The public API is only ever
+    called from a background thread; a miss schedules a fetch for next time.
+    After a failed Odoo preload, lookups skip Odoo for ``retry_after``
+    seconds instead of blocking on it again.
+    """
+
+    def __init__(self, execute=None, ttl=3600, offline_path=None, fetch_external=True, retry_after=60):
+        self.execute = execute
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self.fetch_external = fetch_external
+        self.shared = DiskCache("rates", ttl=ttl)
+        self.offline = {}
+        if offline_path:
+            try:
+                self.offline = load_rate_file(offline_path)
+            except Exception as e:
+                logging.error(f"Could not load offline rate file {offline_path}: {e}")
+        self.table = None
+        self.loaded_at = None
+        self.failed_at = None
+        self.external = {}
+        self.fetching = set()
+        self.lock = threading.Lock()
+
+    # -- Odoo table -----------------------------------------------------
+
+    def preload(self):
+        """Load every active ``res.currency`` rate in one call."""
+        currencies = self.execute(
+            "res.currency", "search_read",
+            [[["active", "=", True]]],
+            {"fields": ["name", "rate"]}
+        )
+        table = {c["name"]: c["rate"] for c in currencies if c.get("rate")}
+        self.shared.set("odoo", table)
+        with self.lock:
+            self.table = table
+            self.loaded_at = time.monotonic()
+            self.failed_at = None
+        return table
+
+    def _refresh_in_background(self):
+        with self.lock:
+            if "odoo" in self.fetching:
+                return
+            self.fetching.add("odoo")
+
+        def refresh():
+            try:
+                self.preload()
+            except Exception as e:
+                logging.warning(f"Currency rate refresh failed: {e}")
+            finally:
+                with self.lock:
+                    self.fetching.discard("odoo")
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def odoo_rates(self):
+        """The Odoo rate table, loading it on first use and refreshing when stale."""
+        if self.table is not None and time.monotonic() - self.loaded_at < self.ttl:
+            return self.table
+        shared = self.shared.get("odoo")
+        if shared:
+            # Another worker loaded it recently
+            with self.lock:
+                self.table = shared
+                self.loaded_at = time.monotonic()
+            return shared
+        if self.execute is None:
+            return self.table or {}
+        if self.table is not None:
+            # Serve the stale table while a fresh one loads
+            self._refresh_in_background()
+            return self.table
+        if self.failed_at is not None and time.monotonic() - self.failed_at < self.retry_after:
+            return {}
+        try:
+            return self.preload()
+        except Exception as e:
+            logging.warning(f"Could not preload currency rates from Odoo: {e}")
+            with self.lock:
+                self.failed_at = time.monotonic()
+            return {}
+
+    # -- external API ---------------------------------------------------
+
+    def _fetch_external(self, currency):
+        try:
+            import requests
+            response = requests.get(EXTERNAL_RATES_URL.format(currency=currency), timeout=5)
+            if response.status_code == 200:
+                rates = response.json()["rates"]
+                self.shared.set(f"external:{currency}", rates)
+                with self.lock:
+                    self.external[currency] = rates
+        except Exception as e:
+            logging.warning(f"Exchange rate API request for {currency} failed: {e}")
+        finally:
+            with self.lock:
+                self.fetching.discard(currency)
+
+    def external_rates(self, currency):
+        """Cached API rates for ``currency``; schedules a fetch on a miss."""
+        rates = self.external.get(currency) or self.shared.get(f"external:{currency}")
+        if rates:
+            return rates
+        if self.fetch_external:
+            with self.lock:
+                if currency in self.fetching:
+                    return {}
+                self.fetching.add(currency)
+            threading.Thread(target=self._fetch_external, args=(currency,), daemon=True).start()
+        return {}
+
+    # -- lookups --------------------------------------------------------
+
+    def get_rate(self, from_currency, to_currency):
+        """Units of ``to_currency`` per unit of ``from_currency``."""
+        if from_currency == to_currency:
+            return 1.0
+        for table in (self.odoo_rates(), self.offline):
+            if table.get(from_currency) and table.get(to_currency):
+                return table[to_currency] / table[from_currency]
+        external = self.external_rates(from_currency)
+        if to_currency in external:
+            return external[to_currency]
+        return FALLBACK_RATES.get(f"{from_currency}_to_{to_currency}", 1.0)
+
+    def convert_many(self, amounts, from_currency, to_currency):
+        """Convert a list of amounts with a single rate lookup."""
+        rate = self.get_rate(from_currency, to_currency)
+        return [round(amount * rate, 2) for amount in amounts]
@@ -0,0 +1,183 @@
+import json
+import math
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import weakref
+
+_stores = weakref.WeakSet()
+
+
+def _reopen_after_fork():
+    for store in list(_stores):
+        store.local = threading.local()
+
+
+os.register_at_fork(after_in_child=_reopen_after_fork)
+
+
+def _line_change(change):
+    """``(product_id, quantity)`` of one line change, or ValueError if malformed."""
+    if not isinstance(change, dict):
+        raise ValueError("Each line must be an object with 'id' and 'quantity'.")
+    product_id = change.get("id")
+    if isinstance(product_id, bool) or not isinstance(product_id, int):
+        raise ValueError(f"Line id must be a product id, got {product_id!r}.")
+    quantity = change.get("quantity")
+    try:
+        if isinstance(quantity, bool):
+            raise ValueError
+        quantity = float(quantity)
+    except (TypeError, ValueError):
+        raise ValueError(f"Quantity of line {product_id} must be a number, got {quantity!r}.")
+    if not math.isfinite(quantity) or quantity < 0:
+        raise ValueError(f"Quantity of line {product_id} must be zero or more, got {quantity!r}.")
+    return product_id, quantity
+
+
+class DraftStore:
+    """Server-side store for validated orders awaiting creation.
+
+    A draft holds the ``validated`` data from ``/confirm`` and the order
+    ``lines`` picked in the live order builder, under a short random ID,
+    so pages pass the ID around instead of the whole order as JSON. Drafts
+    live in process memory, or in SQLite when ``path`` is set so several
+    worker processes see the same drafts. Drafts expire after ``ttl``
+    seconds without an update.
+    """
+
+    def __init__(self, path=None, ttl=24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self.drafts = {}
+        self.lock = threading.RLock()
+        self.local = threading.local()
+        _stores.add(self)
+        if path:
+            self._connect().execute(
+                "CREATE TABLE IF NOT EXISTS drafts ("
+                " id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
+        return conn
+
+    # -- storage --------------------------------------------------------
+
+    def _load(self, draft_id):
+        if not self.path:
+            draft = self.drafts.get(draft_id)
+            return json.loads(json.dumps(draft)) if draft else None
+        row = self._connect().execute(
+            "SELECT data FROM drafts WHERE id = ?", (draft_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _save(self, draft_id, draft):
+        draft["updated_at"] = time.time()
+        if not self.path:
+            self.drafts[draft_id] = draft
+            return
+        self._connect().execute(
+            "INSERT OR REPLACE INTO drafts (id, data, updated_at) VALUES (?, ?, ?)",
+            (draft_id, json.dumps(draft), draft["updated_at"]),
+        )
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        if not self.path:
+            for draft_id in [d for d, draft in self.drafts.items() if draft["updated_at"] < cutoff]:
+                del self.drafts[draft_id]
+            return
+        self._connect().execute("DELETE FROM drafts WHERE updated_at < ?", (cutoff,))
+
+    # -- API ------------------------------------------------------------
+
+    def create(self, validated_data, lines=None, **fields):
+        """Store a validated order and return its draft ID.
+
+        ``validated_data`` may be None for an order still being validated;
+        extra ``fields`` (such as its ``text``) are stored with the draft.
+        """
+        draft_id = secrets.token_urlsafe(8)
+        with self.lock:
+            self._expire()
+            self._save(draft_id, dict(
+                fields,
+                validated=validated_data,
+                lines=lines or [],
+                created_at=time.time(),
+            ))
+        return draft_id
+
+    def get(self, draft_id):
+        with self.lock:
+            draft = self._load(draft_id)
+        if draft and draft["updated_at"] < time.time() - self.ttl:
+            return None
+        return draft
+
+    def update(self, draft_id, **fields):
+        """Replace top-level fields of a draft; returns the draft or None."""
+        with self.lock:
+            draft = self._load(draft_id)
+            if not draft:
+                return None
+            draft.update(fields)
+            self._save(draft_id, draft)
+            return draft
+
+    def update_lines(self, draft_id, changes, replace=False):
+        """Apply line-level changes from the live order builder.
+
+        Each change is ``{"id": product_id, "quantity": qty}``; a quantity
+        of zero removes the line. Name, code and price come from the
+        validated products, not from the client. With ``replace`` the
+        changes become the complete set of lines. Raises ValueError, before
+        changing anything, when a change is malformed.
+        """
+        changes = [_line_change(change) for change in changes]
+        with self.lock:
+            draft = self._load(draft_id)
+            if not draft:
+                return None
+            products = {p["id"]: p for p in (draft["validated"] or {}).get("products", [])}
+            lines = {} if replace else {line["id"]: line for line in draft["lines"]}
+            for product_id, quantity in changes:
+                product = products.get(product_id)
+                if not product:
+                    continue
+                if quantity == 0:
+                    lines.pop(product["id"], None)
+                    continue
+                lines[product["id"]] = {
+                    "id": product["id"],
+                    "name": product.get("name"),
+                    "code": product.get("code") or "",
+                    "price": product.get("price", 0.0),
+                    "quantity": quantity,
+                }
+            draft["lines"] = list(lines.values())
+            self._save(draft_id, draft)
+            return draft
+
+    def order(self, draft_id):
+        """The validated order with the chosen lines as its products."""
+        draft = self.get(draft_id)
+        if not draft or draft["validated"] is None:
+            return None
+        return dict(draft["validated"], products=draft["lines"])
+
+    def delete(self, draft_id):
+        with self.lock:
+            if not self.path:
+                self.drafts.pop(draft_id, None)
+            else:
+                self._connect().execute("DELETE FROM drafts WHERE id = ?", (draft_id,))
@@ -0,0 +1,618 @@
+import base64
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import os
+import multiprocessing
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from PIL import Image
+
+import llm
+import metrics
+import tiling
+from cache import DiskCache, cache_key
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # PDF uploads are rejected with a clear error instead
+    pdfium = None
+
+VISION_MODEL = "gpt-4o"
+VISION_MAX_TOKENS = 800
+VISION_DETAIL = "low"
+RESIZE_MAX_SIZE = 800
+JPEG_QUALITY = 75
+# Decoded pixel budget per image (after JPEG draft decoding), and the
+# largest small JPEG that is sent without re-encoding
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(40_000_000)))
+PASSTHROUGH_MAX_BYTES = int(os.getenv("PASSTHROUGH_MAX_BYTES", str(200 * 1024)))
+# Multi-page documents: pages are rasterized in worker processes and read
+# by concurrent vision calls, at most VISION_CONCURRENCY at once per process
+RASTER_WORKERS = int(os.getenv("RASTER_WORKERS", str(min(4, os.cpu_count() or 1))))
+VISION_CONCURRENCY = int(os.getenv("VISION_CONCURRENCY", "4"))
+MAX_DOCUMENT_PAGES = int(os.getenv("MAX_DOCUMENT_PAGES", "20"))
+PDF_MAGIC = b"%PDF"
+TIFF_MAGIC = (b"II*\x00", b"MM\x00*")
+PAGE_SEPARATOR = "\n\n--- Page {page} of {pages} ---\n"
+# "adaptive" sends only the text regions of a page, each at the smallest
+# resolution where a text line stays legible (see tiling.py), either as
+# tiles of one request or as parallel requests per tile
+EXTRACTION_MODE = os.getenv("EXTRACTION_MODE", "fixed")
+ADAPTIVE_MAX_SIZE = int(os.getenv("ADAPTIVE_MAX_SIZE", "4096"))
+ADAPTIVE_LINE_PX = int(os.getenv("ADAPTIVE_LINE_PX", "14"))
+TILE_REQUESTS = os.getenv("TILE_REQUESTS", "single")
+# "fused" reads the structured invoice in the vision call itself (function
+# calling), so no second parsing call is needed; the text shown to the
+# user is rendered from that structure
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "two-step")
+FUSED_MAX_TOKENS = int(os.getenv("FUSED_MAX_TOKENS", "3000"))
+EXIF_ORIENTATION = 0x0112
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+EXTRACTION_PROMPT = (
+    "Extract all text from this image. Focus on: company names, invoice/PO numbers, "
+    "dates, product names, quantities, prices, and totals. Provide clear, structured text."
+)
+TILES_PROMPT = " The document is split into {tiles} images, given in reading order from top to bottom."
+FUSED_PROMPT = (
+    "Read this invoice or purchase order and record it with the record_document function. "
+    "Include every line item, in order, with the quantity and unit price as printed."
+)
+DOCUMENT_FUNCTION = {
+    "name": "record_document",
+    "description": "Record the header and line items of an invoice or purchase order.",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "vendor": {"type": "string", "description": "Supplier company name"},
+            "invoice_number": {"type": "string", "description": "Invoice or PO number, if found"},
+            "date": {"type": "string", "description": "Document date, if found"},
+            "products": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "name": {"type": "string"},
+                        "quantity": {"type": "number"},
+                        "price": {"type": "number", "description": "Unit price"},
+                        "description": {"type": "string"},
+                    },
+                    "required": ["name", "quantity", "price"],
+                },
+            },
+            "total": {"type": "number"},
+            "currency": {"type": "string", "description": "ISO 4217 code, e.g. USD"},
+        },
+        "required": ["vendor", "products"],
+    },
+}
+
+# Extracted text keyed by the original upload plus every setting that
+# changes what the vision call would return
+extraction_cache = DiskCache("extraction")
+
+vision_slots = threading.BoundedSemaphore(VISION_CONCURRENCY)
+_report_lock = threading.Lock()
+_raster_pool = None
+_raster_pool_lock = threading.Lock()
+
+
+def _read_all(source):
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    source.seek(0)
+    data = source.read()
+    source.seek(0)
+    return data
+
+
+def file_digest(source):
+    """SHA-256 of bytes or a seekable binary file, read in chunks."""
+    if isinstance(source, (bytes, bytearray)):
+        return hashlib.sha256(source).hexdigest()
+    digest = hashlib.sha256()
+    source.seek(0)
+    for chunk in iter(lambda: source.read(1024 * 1024), b""):
+        digest.update(chunk)
+    source.seek(0)
+    return digest.hexdigest()
+
+
+def _size_of(source):
+    if isinstance(source, (bytes, bytearray)):
+        return len(source)
+    position = source.tell()
+    source.seek(0, os.SEEK_END)
+    size = source.tell()
+    source.seek(position)
+    return size
+
+
+def shrink_image(img, max_size=RESIZE_MAX_SIZE, orientation=1):
+    """Shrink a decoded image to fit ``max_size`` and turn it upright."""
+    # Convert to RGB if necessary
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    # Resize image, maintaining aspect ratio
+    img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS, reducing_gap=2.0)
+    if orientation in ORIENTATION_TRANSPOSE:
+        img = img.transpose(ORIENTATION_TRANSPOSE[orientation])
+    return img
+
+
+def encode_jpeg(img, quality=JPEG_QUALITY):
+    # Save to bytes
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def _draft(img, max_size):
+    """Decode JPEGs at a reduced scale and enforce the pixel budget."""
+    if img.format == "JPEG":
+        img.draft("RGB", (max_size, max_size))
+    if img.width * img.height > MAX_IMAGE_PIXELS:
+        raise ImageTooLarge(
+            f"Image is {img.width}x{img.height} pixels; the limit is {MAX_IMAGE_PIXELS} pixels."
+        )
+
+
+@metrics.timed("resize")
+def resize_image(source, max_size=RESIZE_MAX_SIZE):
+    """Resize image to reduce token usage
+
+    ``source`` is bytes or a seekable binary file; files are decoded
+    straight from the stream. JPEGs are decoded at a reduced DCT scale
+    (draft mode) close to the target size, so a 50 MP phone photo never
+    exists in memory at full resolution. Small, upright JPEGs are passed
+    through without re-encoding, EXIF orientation is applied, and images
+    above ``MAX_IMAGE_PIXELS`` after draft decoding are rejected.
+    """
+    stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    try:
+        stream.seek(0)
+        # Open image; only the header is read here
+        img = Image.open(stream)
+        orientation = img.getexif().get(EXIF_ORIENTATION, 1)
+
+        # Fast path: already small enough to send as-is
+        if (img.format == "JPEG" and max(img.size) <= max_size and orientation == 1
+                and img.mode in ("RGB", "L") and _size_of(source) <= PASSTHROUGH_MAX_BYTES):
+            return _read_all(source)
+
+        _draft(img, max_size)
+        return encode_jpeg(shrink_image(img, max_size, orientation))
+    except ImageTooLarge:
+        raise
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(str(e))
+    except Exception as e:
+        logging.error(f"Error resizing image: {e}")
+        return _read_all(source)
+
+
+def open_image(source, max_size=ADAPTIVE_MAX_SIZE):
+    """Decode an upload upright and no larger than ``max_size`` on its long side."""
+    stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    stream.seek(0)
+    try:
+        img = Image.open(stream)
+        orientation = img.getexif().get(EXIF_ORIENTATION, 1)
+        _draft(img, max_size)
+        return shrink_image(img, max_size, orientation)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(str(e))
+
+
+class ImageTooLarge(ValueError):
+    """Raised when an upload decodes to more pixels than allowed."""
+
+
+class UnsupportedDocument(ValueError):
+    """Raised for documents that cannot be rasterized here."""
+
+
+def document_kind(source):
+    """``"pdf"``, ``"tiff"`` or ``"image"``, from the first bytes of the upload."""
+    if isinstance(source, (bytes, bytearray)):
+        head = bytes(source[:4])
+    else:
+        source.seek(0)
+        head = source.read(4)
+        source.seek(0)
+    if head.startswith(PDF_MAGIC):
+        return "pdf"
+    if head in TIFF_MAGIC:
+        return "tiff"
+    return "image"
+
+
+def page_count(path, kind):
+    if kind == "pdf":
+        if pdfium is None:
+            raise UnsupportedDocument("PDF uploads need the pypdfium2 package (pip install pypdfium2).")
+        pdf = pdfium.PdfDocument(path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    with Image.open(path) as img:
+        return getattr(img, "n_frames", 1)
+
+
+def render_page(path, kind, index, max_size=RESIZE_MAX_SIZE, quality=JPEG_QUALITY):
+    """Rasterize one page of a PDF or TIFF to a resized JPEG.
+
+    Runs in a worker process; only the path, page index and the
+    resulting JPEG cross the process boundary.
+    """
+    if kind == "pdf":
+        pdf = pdfium.PdfDocument(path)
+        try:
+            page = pdf[index]
+            # Render at twice the target size so the downscale stays sharp
+            scale = min(2 * max_size, ADAPTIVE_MAX_SIZE) / max(page.get_size())
+            img = page.render(scale=scale).to_pil()
+            page.close()
+        finally:
+            pdf.close()
+        return encode_jpeg(shrink_image(img, max_size), quality)
+    with Image.open(path) as img:
+        img.seek(index)
+        if img.width * img.height > MAX_IMAGE_PIXELS:
+            raise ImageTooLarge(
+                f"Page {index + 1} is {img.width}x{img.height} pixels; "
+                f"the limit is {MAX_IMAGE_PIXELS} pixels."
+            )
+        orientation = img.getexif().get(EXIF_ORIENTATION, 1)
+        img.load()
+        return encode_jpeg(shrink_image(img, max_size, orientation), quality)
+
+
+def raster_pool():
+    """Process pool for page rasterization, started on first use.
+
+    Workers are spawned rather than forked so they never inherit locks
+    held by the web server's threads.
+    """
+    global _raster_pool
+    with _raster_pool_lock:
+        if _raster_pool is None:
+            _raster_pool = ProcessPoolExecutor(
+                max_workers=RASTER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _raster_pool
+
+
+def new_report():
+    """Per-document extraction metrics, filled in by ``extract_text``."""
+    return {
+        "mode": EXTRACTION_MODE, "pipeline": PIPELINE_MODE, "pages": 1, "tiles": 0, "requests": 0, "bytes_sent": 0,
+        "image_tokens": 0, "prompt_tokens": 0, "completion_tokens": 0,
+        "seconds": 0.0, "cached": False,
+    }
+
+
+def _record_usage(report, images, payload_bytes, response):
+    if report is None:
+        return
+    usage = response.get("usage") or {}
+    image_tokens = 0
+    for image_bytes, detail in images:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            image_tokens += tiling.vision_tokens(img.size, detail)
+    with _report_lock:
+        report["requests"] += 1
+        report["tiles"] += len(images)
+        report["bytes_sent"] += payload_bytes
+        report["image_tokens"] += image_tokens
+        report["prompt_tokens"] += usage.get("prompt_tokens", 0)
+        report["completion_tokens"] += usage.get("completion_tokens", 0)
+
+
+def adaptive_tiles(img):
+    """Text regions of an upright page image as ``[(jpeg_bytes, detail)]``, top to bottom.
+
+    Each tile stacks the crops planned by ``tiling.plan_tiles`` on a white
+    canvas, so blank space between text blocks is never sent.
+    """
+    tiles = []
+    for boxes, scale, detail in tiling.plan_tiles(img, ADAPTIVE_LINE_PX):
+        crops = []
+        for box in boxes:
+            crop = img.crop(box)
+            if scale < 1:
+                size = (max(1, round(crop.width * scale)), max(1, round(crop.height * scale)))
+                crop = crop.resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+            crops.append(crop)
+        canvas = Image.new(img.mode, (max(c.width for c in crops), sum(c.height for c in crops)), "white")
+        top = 0
+        for crop in crops:
+            canvas.paste(crop, (0, top))
+            top += crop.height
+        tiles.append((encode_jpeg(canvas), detail))
+    return tiles
+
+
+def read_limited(images, report=None):
+    """A vision call that waits for one of the VISION_CONCURRENCY slots."""
+    with vision_slots:
+        return read_images_text(images, report)
+
+
+def read_adaptive(img, report=None):
+    """Read a page from its text regions only, per EXTRACTION_MODE=adaptive."""
+    tiles = adaptive_tiles(img)
+    if TILE_REQUESTS != "parallel" or len(tiles) == 1:
+        return read_limited(tiles, report)
+    with ThreadPoolExecutor(max_workers=min(len(tiles), VISION_CONCURRENCY)) as readers:
+        texts = readers.map(lambda tile: read_limited([tile], report), tiles)
+        return "\n".join(text or "" for text in texts)
+
+
+def read_page_text(page_bytes, report=None):
+    """Vision call(s) for one rendered page, limited to VISION_CONCURRENCY at once."""
+    if EXTRACTION_MODE == "adaptive":
+        return read_adaptive(open_image(page_bytes), report)
+    return read_limited([(page_bytes, VISION_DETAIL)], report)
+
+
+@contextlib.contextmanager
+def rendered_pages(source, report=None):
+    """Start rasterizing every page of a PDF or TIFF upload.
+
+    The upload is written to a temporary file that worker processes
+    render page by page; yields ``{future: page_index}`` for the renders.
+    """
+    kind = document_kind(source)
+    with tempfile.NamedTemporaryFile(suffix=f".{kind}") as tmp:
+        if isinstance(source, (bytes, bytearray)):
+            tmp.write(source)
+        else:
+            source.seek(0)
+            shutil.copyfileobj(source, tmp)
+            source.seek(0)
+        tmp.flush()
+
+        pages = page_count(tmp.name, kind)
+        if pages > MAX_DOCUMENT_PAGES:
+            raise UnsupportedDocument(
+                f"Document has {pages} pages; the limit is {MAX_DOCUMENT_PAGES}."
+            )
+        logging.debug(f"Rasterizing {pages} {kind} pages.")
+        if report is not None:
+            report["pages"] = pages
+
+        # Adaptive mode tiles each page itself, so it needs it sharper
+        if EXTRACTION_MODE == "adaptive":
+            size, quality = ADAPTIVE_MAX_SIZE, 90
+        else:
+            size, quality = RESIZE_MAX_SIZE, JPEG_QUALITY
+        yield {
+            raster_pool().submit(render_page, tmp.name, kind, index, size, quality): index
+            for index in range(pages)
+        }
+
+
+def read_document_text(source, report=None):
+    """Read every page of a PDF or multi-page TIFF and merge the text.
+
+    Each page's vision call starts as soon as that page is rendered, so
+    the result arrives about as fast as the slowest single page rather
+    than the sum of all pages.
+    """
+    with rendered_pages(source, report) as renders:
+        pages = len(renders)
+        texts = [None] * pages
+        with ThreadPoolExecutor(max_workers=min(pages, VISION_CONCURRENCY) or 1) as readers:
+            reads = {}
+            for render in as_completed(renders):
+                reads[readers.submit(read_page_text, render.result(), report)] = renders[render]
+            for read in as_completed(reads):
+                texts[reads[read]] = read.result()
+
+    if pages == 1:
+        return texts[0]
+    return "".join(
+        PAGE_SEPARATOR.format(page=index + 1, pages=pages) + (text or "")
+        for index, text in enumerate(texts)
+    ).lstrip()
+
+
+def document_images(source, report=None):
+    """Every image of an upload as ``[(jpeg_bytes, detail)]``, for a single request."""
+    kind = document_kind(source)
+    if kind == "image":
+        pages = [source]
+    else:
+        with rendered_pages(source, report) as renders:
+            pages = [None] * len(renders)
+            for render in as_completed(renders):
+                pages[renders[render]] = render.result()
+    images = []
+    for page in pages:
+        if EXTRACTION_MODE == "adaptive":
+            images += adaptive_tiles(open_image(page))
+        elif kind == "image":
+            images.append((resize_image(page), VISION_DETAIL))
+        else:
+            images.append((page, VISION_DETAIL))
+    return images
+
+
+def document_text(parsed):
+    """Readable text of a structured document, shown in place of a transcription."""
+    lines = [
+        f"Vendor: {parsed.get('vendor') or ''}",
+        f"Invoice/PO number: {parsed.get('invoice_number') or ''}",
+        f"Date: {parsed.get('date') or ''}",
+        f"Currency: {parsed.get('currency') or ''}",
+        "",
+        "Items:",
+    ]
+    for product in parsed.get("products") or []:
+        line = f"- {product.get('name')}: {product.get('quantity')} x {product.get('price')}"
+        if product.get("description"):
+            line += f" ({product['description']})"
+        lines.append(line)
+    lines += ["", f"Total: {parsed.get('total') if parsed.get('total') is not None else ''}"]
+    return "\n".join(lines)
+
+
+def spool_upload(stream):
+    """Copy an upload into a temporary file that outlives the request.
+
+    Small uploads stay in memory; larger ones spill to disk.
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    shutil.copyfileobj(stream, spooled)
+    spooled.seek(0)
+    return spooled
+
+
+def extraction_key(source):
+    """Cache key for an upload under the current prompt, model and resize settings."""
+    settings = [EXTRACTION_PROMPT, VISION_MODEL, VISION_MAX_TOKENS, VISION_DETAIL,
+                RESIZE_MAX_SIZE, JPEG_QUALITY]
+    if EXTRACTION_MODE == "adaptive":
+        settings += [EXTRACTION_MODE, TILES_PROMPT, ADAPTIVE_MAX_SIZE, ADAPTIVE_LINE_PX, TILE_REQUESTS]
+    if PIPELINE_MODE == "fused":
+        settings += [PIPELINE_MODE, FUSED_PROMPT, json.dumps(DOCUMENT_FUNCTION, sort_keys=True),
+                     FUSED_MAX_TOKENS]
+    return cache_key(file_digest(source), *settings)
+
+
+def read_image_text(resized_image_bytes, report=None):
+    """Run the vision call on an already resized JPEG and return its text."""
+    return read_images_text([(resized_image_bytes, VISION_DETAIL)], report)
+
+
+def _vision_call(images, prompt, report=None, max_tokens=VISION_MAX_TOKENS, **options):
+    """Send ``prompt`` with ``[(jpeg_bytes, detail)]`` and return the reply message.
+
+    Usage (requests, image and prompt tokens, base64 bytes sent) is added
+    to ``report`` when one is given.
+    """
+    if len(images) > 1:
+        prompt += TILES_PROMPT.format(tiles=len(images))
+    content = [{"type": "text", "text": prompt}]
+    for image_bytes, detail in images:
+        base64_image = base64.b64encode(image_bytes).decode("utf-8")
+        content.append({
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:image/jpeg;base64,{base64_image}",
+                "detail": detail
+            },
+        })
+    payload_bytes = sum(len(part["image_url"]["url"]) for part in content[1:])
+
+    logging.debug(f"Sending {len(images)} image(s) to OpenAI API for text extraction.")
+
+    response = llm.chat(
+        model=VISION_MODEL,
+        messages=[{"role": "user", "content": content}],
+        max_tokens=max_tokens,
+        **options
+    )
+    _record_usage(report, images, payload_bytes, response)
+    return response.choices[0].message
+
+
+def read_images_text(images, report=None):
+    """One vision call over ``[(jpeg_bytes, detail)]``; returns the text read."""
+    extracted_text = _vision_call(images, EXTRACTION_PROMPT, report)["content"]
+    logging.debug(f"Extracted Text: {extracted_text}")
+    return extracted_text
+
+
+def read_document(images, report=None):
+    """One vision call that returns the invoice as parsed JSON, or None.
+
+    The model must answer through ``DOCUMENT_FUNCTION``, whose arguments
+    follow the same shape ``parse_extracted_text`` produces.
+    """
+    message = _vision_call(
+        images, FUSED_PROMPT, report, max_tokens=FUSED_MAX_TOKENS,
+        functions=[DOCUMENT_FUNCTION], function_call={"name": DOCUMENT_FUNCTION["name"]},
+    )
+    arguments = (message.get("function_call") or {}).get("arguments") or ""
+    try:
+        parsed = json.loads(arguments)
+    except ValueError as e:
+        logging.warning(f"Could not read structured document from the vision call: {e}")
+        return None
+    logging.debug(f"Structured document: {parsed}")
+    return parsed
+
+
+def extract_text(source, report=None):
+    """Resize an uploaded image and run the vision call that reads its text.
+
+    ``source`` is the upload as bytes or a seekable binary file. PDFs and
+    TIFFs are read page by page with ``read_document_text``. Pass a dict
+    as ``report`` to get the document's tokens, bytes sent and latency.
+
+    Results are cached by a hash of the original bytes and the prompt,
+    model and resize settings, so re-uploads skip both the resize and the
+    vision call.
+    """
+    return extract_document(source, report)[0]
+
+
+@metrics.timed("extract")
+def extract_document(source, report=None):
+    """Like ``extract_text``, returning ``(text, parsed)``.
+
+    ``parsed`` is the structured invoice when PIPELINE_MODE=fused (the
+    text is then rendered from it for display) and None otherwise, or
+    when the model did not return usable JSON.
+    """
+    started = time.perf_counter()
+    report = new_report() if report is None else report
+    report.update(new_report())
+    fused = PIPELINE_MODE == "fused"
+    key = extraction_key(source)
+    cached = extraction_cache.get(key)
+    if cached is not None:
+        logging.debug("Extraction cache hit.")
+        report.update(cached=True, seconds=round(time.perf_counter() - started, 3))
+        return (cached["text"], cached["parsed"]) if fused else (cached, None)
+
+    parsed = None
+    kind = document_kind(source)
+    if fused:
+        images = document_images(source, report)
+        parsed = read_document(images, report)
+        if parsed is None:
+            extracted_text = read_images_text(images, report)
+        else:
+            extracted_text = document_text(parsed)
+        extraction_cache.set(key, {"text": extracted_text, "parsed": parsed})
+    else:
+        if kind != "image":
+            extracted_text = read_document_text(source, report)
+        elif EXTRACTION_MODE == "adaptive":
+            extracted_text = read_adaptive(open_image(source), report)
+        else:
+            extracted_text = read_image_text(resize_image(source), report)
+        extraction_cache.set(key, extracted_text)
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    logging.info(f"Extraction report: {report}")
+    return extracted_text, parsed
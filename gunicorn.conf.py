@@ -0,0 +1,37 @@
+"""Gunicorn settings: ``gunicorn -c gunicorn.conf.py wsgi:app``.
+
+Workers are preforked from a master that has already imported the app and
+warmed its Odoo state (see ``wsgi.py``); each worker serves requests on a
+pool of threads, since requests mostly wait on Odoo and OpenAI.
+"""
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+# One worker by default: async extraction jobs and batch runs are only known
+# to the worker that accepted them, so their status polls must reach it
+workers = int(os.getenv("WEB_WORKERS", "1"))
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "16"))
+
+# Drafts and the creation ledger must be shared once there are several
+# workers; the config is read before the app is imported, so this applies
+if workers > 1:
+    os.environ.setdefault("DRAFT_STORE_PATH", "drafts.db")
+    os.environ.setdefault("CREATION_LEDGER_PATH", "ledger.db")
+# Synchronous extraction of a long PDF can take minutes
+timeout = int(os.getenv("WEB_TIMEOUT", "300"))
+graceful_timeout = 30
+keepalive = 5
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+preload_app = True
+accesslog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+
+
+def post_fork(server, worker):
+    # Keep-alive sockets inherited from the master would be shared by every
+    # worker; drop them so each opens its own
+    from app import odoo_integration
+    odoo_integration.after_fork()
@@ -0,0 +1,300 @@
+import os
+import sqlite3
+import threading
+import time
+import weakref
+
+_histories = weakref.WeakSet()
+
+
+def _reopen_after_fork():
+    for history in list(_histories):
+        history.local = threading.local()
+        history.sync_lock = threading.Lock()
+        if not history.path:
+            # The child starts with an empty database, so sync it again
+            history.memory = None
+            history.synced_at = None
+
+
+os.register_at_fork(after_in_child=_reopen_after_fork)
+
+# Per document type: Odoo model, domain, reference and date fields
+HISTORY_MODELS = {
+    "po": ("purchase.order", [], "partner_ref", ["date_order"]),
+    "invoice": ("account.move", [["move_type", "=", "in_invoice"]], "ref", ["invoice_date", "date"]),
+}
+HISTORY_COLUMNS = ["id", "type", "record_id", "name", "vendor_id", "vendor_name", "invoice_number",
+                   "date", "total", "currency", "state", "write_date"]
+MAX_PAGE_SIZE = 200
+# Above this many records in the newest write_date second (a bulk import),
+# sync pages by id within that second instead of excluding the ids read
+SAME_SECOND_IDS = 500
+
+
+def _many2one(value):
+    """``(id, name)`` of a many2one read from Odoo (``[id, name]`` or False)."""
+    if isinstance(value, (list, tuple)) and value:
+        return value[0], value[1] if len(value) > 1 else ""
+    return (value or None), ""
+
+
+class OrderHistory:
+    """Purchase orders and vendor bills, indexed for the history page.
+
+    Documents are recorded when this app creates them and kept in sync
+    with everything else in Odoo through ``write_date`` deltas, like the
+    product catalog: each ``sync`` reads only records written since the
+    last one, in pages. Rows live in SQLite with indexes on vendor, date,
+    type and invoice number, and ``query`` pages through them with a
+    ``(date, id)`` cursor, so a page costs the same at any depth.
+    Without ``path`` the database is in memory, one per process.
+    """
+
+    def __init__(self, execute, path=None, sync_interval=60, page_size=2000):
+        self.execute = execute
+        self.path = path
+        self.sync_interval = sync_interval
+        self.page_size = page_size
+        self.synced_at = None
+        self.lock = threading.RLock()
+        self.sync_lock = threading.Lock()
+        self.local = threading.local()
+        self.memory = None
+        _histories.add(self)
+        with self.lock:
+            self._connect()
+
+    def _create_schema(self, conn):
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS orders ("
+            " id INTEGER PRIMARY KEY, type TEXT NOT NULL, record_id INTEGER, name TEXT,"
+            " vendor_id INTEGER, vendor_name TEXT, vendor_key TEXT, invoice_number TEXT,"
+            " date TEXT NOT NULL DEFAULT '', total REAL, currency TEXT, state TEXT,"
+            " write_date TEXT, UNIQUE (type, record_id));"
+            "CREATE INDEX IF NOT EXISTS orders_date ON orders (date);"
+            "CREATE INDEX IF NOT EXISTS orders_type_date ON orders (type, date);"
+            "CREATE INDEX IF NOT EXISTS orders_vendor_id_date ON orders (vendor_id, date);"
+            "CREATE INDEX IF NOT EXISTS orders_vendor_key ON orders (vendor_key);"
+            "CREATE INDEX IF NOT EXISTS orders_invoice_number ON orders (invoice_number);"
+            "CREATE TABLE IF NOT EXISTS sync_state ("
+            " type TEXT PRIMARY KEY, write_date TEXT, ids TEXT NOT NULL DEFAULT '');"
+        )
+
+    def _connect(self):
+        if not self.path:
+            # One shared connection, used under self.lock
+            if self.memory is None:
+                # A fresh in-memory database (first use, or a forked worker) is empty
+                self.memory = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+                self._create_schema(self.memory)
+            return self.memory
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._create_schema(conn)
+            self.local.conn = conn
+        return conn
+
+    # -- writing --------------------------------------------------------
+
+    def _upsert(self, conn, rows):
+        conn.executemany(
+            "INSERT INTO orders (type, record_id, name, vendor_id, vendor_name, vendor_key, invoice_number,"
+            " date, total, currency, state, write_date)"
+            " VALUES (:type, :record_id, :name, :vendor_id, :vendor_name, :vendor_key, :invoice_number,"
+            " :date, :total, :currency, :state, :write_date)"
+            " ON CONFLICT (type, record_id) DO UPDATE SET name = excluded.name,"
+            " vendor_id = excluded.vendor_id, vendor_name = excluded.vendor_name,"
+            " vendor_key = excluded.vendor_key, invoice_number = excluded.invoice_number,"
+            " date = excluded.date, total = excluded.total, currency = excluded.currency,"
+            " state = excluded.state, write_date = excluded.write_date",
+            [dict(row, vendor_key=(row["vendor_name"] or "").lower()) for row in rows],
+        )
+
+    def record(self, create_type, record_id, validated_data, vendor_id=None, state="draft"):
+        """Add a document this app just created (``record_id`` None for a simulation).
+
+        The next sync replaces the row with what Odoo holds.
+        """
+        products = validated_data.get("products", [])
+        row = {
+            "type": create_type,
+            "record_id": record_id,
+            "name": None,
+            "vendor_id": vendor_id or validated_data.get("vendor_id"),
+            "vendor_name": validated_data.get("vendor_name") or "New Vendor",
+            "invoice_number": (validated_data.get("invoice_number") or "").strip() or None,
+            "date": time.strftime("%Y-%m-%d"),
+            "total": round(sum(p.get("price", 0) * p.get("quantity", 1) for p in products), 2),
+            "currency": validated_data.get("currency"),
+            "state": state,
+            "write_date": None,
+        }
+        with self.lock:
+            self._upsert(self._connect(), [row])
+
+    # -- syncing from Odoo ----------------------------------------------
+
+    def _from_odoo(self, create_type, record):
+        _, _, ref_field, date_fields = HISTORY_MODELS[create_type]
+        vendor_id, vendor_name = _many2one(record.get("partner_id"))
+        _, currency = _many2one(record.get("currency_id"))
+        date = next((record[f] for f in date_fields if record.get(f)), "")
+        return {
+            "type": create_type,
+            "record_id": record["id"],
+            "name": record.get("name") or None,
+            "vendor_id": vendor_id,
+            "vendor_name": vendor_name,
+            "invoice_number": record.get(ref_field) or None,
+            "date": str(date)[:10],
+            "total": record.get("amount_total") or 0.0,
+            "currency": currency or None,
+            "state": record.get("state") or None,
+            "write_date": record.get("write_date") or None,
+        }
+
+    def _sync_type(self, create_type):
+        model, domain, ref_field, date_fields = HISTORY_MODELS[create_type]
+        fields = ["name", "partner_id", ref_field, "amount_total", "currency_id", "state",
+                  "write_date"] + date_fields
+        with self.lock:
+            state = self._connect().execute(
+                "SELECT write_date, ids FROM sync_state WHERE type = ?", (create_type,)
+            ).fetchone()
+        last_write_date, last_ids = (state[0], {int(i) for i in state[1].split(",") if i}) if state else (None, set())
+
+        synced = 0
+        while True:
+            # Pages go in write_date order, so the position after each page
+            # is also where the next sync starts. Records sharing the newest
+            # write_date may still be joined by later writes in the same
+            # second, so that second is re-checked minus the ids already read.
+            if len(last_ids) > SAME_SECOND_IDS:
+                same_second = ["id", ">", max(last_ids)]
+            else:
+                same_second = ["id", "not in", sorted(last_ids)]
+            delta = [] if last_write_date is None else [
+                "|", ["write_date", ">", last_write_date],
+                "&", ["write_date", "=", last_write_date], same_second,
+            ]
+            page = self.execute(
+                model, "search_read", [domain + delta],
+                {"fields": fields, "order": "write_date, id", "limit": self.page_size}
+            )
+            for record in page:
+                write_date = record.get("write_date")
+                if write_date == last_write_date:
+                    last_ids.add(record["id"])
+                elif write_date:
+                    last_write_date, last_ids = write_date, {record["id"]}
+            if len(last_ids) > SAME_SECOND_IDS:
+                # Past the threshold only the highest ids matter
+                last_ids = set(sorted(last_ids)[-SAME_SECOND_IDS - 1:])
+            with self.lock:
+                conn = self._connect()
+                conn.execute("BEGIN")
+                try:
+                    self._upsert(conn, [self._from_odoo(create_type, record) for record in page])
+                    conn.execute(
+                        "INSERT OR REPLACE INTO sync_state (type, write_date, ids) VALUES (?, ?, ?)",
+                        (create_type, last_write_date, ",".join(str(i) for i in sorted(last_ids))),
+                    )
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            synced += len(page)
+            if len(page) < self.page_size:
+                return synced
+
+    def sync(self):
+        """Read documents created or changed in Odoo since the last sync.
+
+        Returns the number of records read per type.
+        """
+        with self.sync_lock:
+            counts = {create_type: self._sync_type(create_type) for create_type in HISTORY_MODELS}
+            self.synced_at = time.time()
+        return counts
+
+    def sync_in_background(self):
+        """Start a sync on a thread when the last one is older than ``sync_interval``."""
+        if self.synced_at is not None and time.time() - self.synced_at < self.sync_interval:
+            return
+        if self.sync_lock.locked():
+            return
+        threading.Thread(target=self._sync_quietly, name="history-sync", daemon=True).start()
+
+    def _sync_quietly(self):
+        try:
+            counts = self.sync()
+            if any(counts.values()):
+                print(f"Order history synced: {counts}")
+        except Exception as e:
+            print(f"Order history sync failed: {e}")
+
+    # -- reading --------------------------------------------------------
+
+    def query(self, create_type=None, vendor=None, vendor_id=None, invoice_number=None, state=None,
+              date_from=None, date_to=None, cursor=None, limit=50):
+        """One page of documents, newest first, matching every filter given.
+
+        ``vendor`` matches the start of the vendor name (any case) and
+        dates are ``YYYY-MM-DD`` (inclusive). Returns ``orders``,
+        ``next_cursor`` (None on the last page) and, for the first page
+        only, ``total``.
+        """
+        where = []
+        params = []
+        if create_type:
+            where.append("type = ?")
+            params.append(create_type)
+        if vendor_id:
+            where.append("vendor_id = ?")
+            params.append(int(vendor_id))
+        if vendor:
+            # A range on vendor_key, so the prefix match uses its index
+            prefix = vendor.strip().lower()
+            where.append("vendor_key >= ? AND vendor_key < ?")
+            params += [prefix, prefix + "\U0010ffff"]
+        if invoice_number:
+            where.append("invoice_number = ?")
+            params.append(invoice_number.strip())
+        if state:
+            where.append("state = ?")
+            params.append(state)
+        if date_from:
+            where.append("date >= ?")
+            params.append(date_from)
+        if date_to:
+            where.append("date <= ?")
+            params.append(date_to)
+        filters = " AND ".join(where) or "1"
+
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        page_where, page_params = filters, list(params)
+        if cursor:
+            date, _, row_id = cursor.rpartition("|")
+            page_where += " AND (date, id) < (?, ?)"
+            page_params += [date, int(row_id)]
+        with self.lock:
+            conn = self._connect()
+            rows = conn.execute(
+                f"SELECT {', '.join(HISTORY_COLUMNS)} FROM orders WHERE {page_where}"
+                " ORDER BY date DESC, id DESC LIMIT ?",
+                page_params + [limit + 1],
+            ).fetchall()
+            total = None if cursor else conn.execute(
+                f"SELECT COUNT(*) FROM orders WHERE {filters}", params
+            ).fetchone()[0]
+        orders = [dict(zip(HISTORY_COLUMNS, row)) for row in rows[:limit]]
+        next_cursor = f"{orders[-1]['date']}|{orders[-1]['id']}" if len(rows) > limit else None
+        return {"orders": orders, "next_cursor": next_cursor, "total": total}
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self._connect().execute("SELECT type, COUNT(*) FROM orders GROUP BY type"))
+        return {"orders": counts, "synced_at": self.synced_at}
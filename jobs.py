@@ -0,0 +1,82 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFull(Exception):
+    """Raised when a job queue already holds its maximum number of jobs."""
+
+
+class JobQueue:
+    """Bounded background worker pool with pollable job status.
+
+    At most ``max_workers`` jobs run at once and at most ``max_pending``
+    are accepted (running plus waiting); further submissions raise
+    ``QueueFull`` so callers can shed load instead of piling up work.
+    Finished jobs are kept for ``ttl`` seconds so clients can poll them.
+    """
+
+    def __init__(self, name, max_workers=4, max_pending=32, ttl=3600):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self.jobs = {}
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue ``fn(*args, **kwargs)`` and return the new job ID."""
+        with self.lock:
+            self._expire()
+            if self.pending >= self.max_pending:
+                raise QueueFull(f"{self.name} queue is full ({self.max_pending} jobs)")
+            self.pending += 1
+            job_id = uuid.uuid4().hex
+            self.jobs[job_id] = {
+                "id": job_id,
+                "status": "queued",
+                "result": None,
+                "error": None,
+                "created_at": time.time(),
+                "finished_at": None,
+            }
+        self.executor.submit(self._run, job_id, fn, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, fn, args, kwargs):
+        job = self.jobs[job_id]
+        job["status"] = "running"
+        try:
+            job["result"] = fn(*args, **kwargs)
+            job["status"] = "done"
+        except Exception as e:
+            logging.error(f"{self.name} job {job_id} failed: {e}")
+            job["error"] = str(e)
+            job["status"] = "failed"
+        finally:
+            job["finished_at"] = time.time()
+            with self.lock:
+                self.pending -= 1
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [j for j, job in self.jobs.items()
+                       if job["finished_at"] and job["finished_at"] < cutoff]:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        """Return a snapshot of the job, or None if unknown or expired."""
+        job = self.jobs.get(job_id)
+        return dict(job) if job else None
+
+    def stats(self):
+        with self.lock:
+            return {
+                "workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+            }
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+
+_ledgers = weakref.WeakSet()
+
+
+def _reopen_after_fork():
+    for ledger in list(_ledgers):
+        ledger.local = threading.local()
+
+
+os.register_at_fork(after_in_child=_reopen_after_fork)
+
+
+def creation_key(validated_data, create_type):
+    """Idempotency key of a document: vendor, invoice number and lines.
+
+    Line order does not matter; name and description edits do not either,
+    only which products, how many and at what price.
+    """
+    vendor = validated_data.get("vendor_id") or (validated_data.get("vendor_name") or "").strip().lower()
+    lines = sorted(
+        (product.get("id"), float(product.get("quantity") or 0), round(float(product.get("price") or 0.0), 4))
+        for product in validated_data.get("products", [])
+    )
+    payload = json.dumps([create_type, vendor, (validated_data.get("invoice_number") or "").strip(), lines])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class CreationLedger:
+    """Local record of documents being created or already created in Odoo.
+
+    Each entry is keyed by ``creation_key`` and is in one of three states:
+
+    * ``pending``: a request is creating the document right now;
+    * ``unknown``: the ``create`` call was sent but no answer came back,
+      so the document may or may not exist in Odoo;
+    * ``done``: created, with its ``record_id``.
+
+    ``claim`` hands a key to exactly one caller at a time, so a double
+    click or a retry while the first request is still running cannot
+    create a second document. Pending entries older than ``pending_ttl``
+    seconds are treated like ``unknown`` (the worker holding them died).
+    Entries live in process memory, or in SQLite when ``path`` is set so
+    all worker processes share them; they are forgotten after ``ttl``.
+    """
+
+    def __init__(self, path=None, ttl=30 * 24 * 3600, pending_ttl=300):
+        self.path = path
+        self.ttl = ttl
+        self.pending_ttl = pending_ttl
+        self.entries = {}
+        self.lock = threading.RLock()
+        self.local = threading.local()
+        _ledgers.add(self)
+        if path:
+            self._connect().execute(
+                "CREATE TABLE IF NOT EXISTS creations ("
+                " key TEXT PRIMARY KEY, state TEXT NOT NULL, record_id INTEGER,"
+                " model TEXT, ref TEXT, updated_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
+        return conn
+
+    # -- storage --------------------------------------------------------
+
+    def _load(self, key):
+        if not self.path:
+            entry = self.entries.get(key)
+            return dict(entry) if entry else None
+        row = self._connect().execute(
+            "SELECT state, record_id, model, ref, updated_at FROM creations WHERE key = ?", (key,)
+        ).fetchone()
+        if not row:
+            return None
+        return dict(zip(("state", "record_id", "model", "ref", "updated_at"), row))
+
+    def _save(self, key, entry):
+        entry["updated_at"] = time.time()
+        if not self.path:
+            self.entries[key] = entry
+            return
+        self._connect().execute(
+            "INSERT OR REPLACE INTO creations (key, state, record_id, model, ref, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (key, entry["state"], entry.get("record_id"), entry.get("model"), entry.get("ref"),
+             entry["updated_at"]),
+        )
+
+    def _delete(self, key):
+        if not self.path:
+            self.entries.pop(key, None)
+        else:
+            self._connect().execute("DELETE FROM creations WHERE key = ?", (key,))
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        if not self.path:
+            for key in [k for k, entry in self.entries.items() if entry["updated_at"] < cutoff]:
+                del self.entries[key]
+            return
+        self._connect().execute("DELETE FROM creations WHERE updated_at < ?", (cutoff,))
+
+    # -- API ------------------------------------------------------------
+
+    def claim(self, key, model=None, ref=None):
+        """Try to take ``key`` for creation.
+
+        Returns ``(claimed, previous)``. When ``claimed`` is true the
+        caller must create the document and then call ``finish`` or
+        ``fail``; ``previous`` is the entry it took over (``unknown`` or a
+        stale ``pending``), which means Odoo has to be checked first. When
+        it is false, ``previous`` is a ``done`` entry or a ``pending`` one
+        still held by another request.
+        """
+        with self.lock:
+            conn = self._connect() if self.path else None
+            if conn:
+                # Other worker processes claim through the same file
+                conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._expire()
+                entry = self._load(key)
+                busy = entry and entry["state"] == "pending" and entry["updated_at"] > time.time() - self.pending_ttl
+                if entry and (entry["state"] == "done" or busy):
+                    return False, entry
+                self._save(key, {"state": "pending", "model": model, "ref": ref})
+                return True, entry
+            finally:
+                if conn:
+                    conn.execute("COMMIT")
+
+    def finish(self, key, record_id, model=None, ref=None):
+        with self.lock:
+            self._save(key, {"state": "done", "record_id": record_id, "model": model, "ref": ref})
+
+    def fail(self, key, written=False, model=None, ref=None):
+        """Release ``key`` after a failed attempt.
+
+        With ``written`` (the ``create`` may have reached Odoo) the entry
+        stays as ``unknown`` so the next attempt checks Odoo first.
+        """
+        with self.lock:
+            if written:
+                self._save(key, {"state": "unknown", "model": model, "ref": ref})
+            else:
+                self._delete(key)
+
+    def get(self, key):
+        with self.lock:
+            return self._load(key)
+
+    def stats(self):
+        with self.lock:
+            if not self.path:
+                states = [entry["state"] for entry in self.entries.values()]
+                counts = {state: states.count(state) for state in set(states)}
+            else:
+                counts = dict(self._connect().execute("SELECT state, COUNT(*) FROM creations GROUP BY state"))
+        return {state: counts.get(state, 0) for state in ("pending", "unknown", "done")}
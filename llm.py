@@ -0,0 +1,411 @@
+"""Shared gateway for OpenAI chat completions.
+
+Every chat completion in the app goes through ``chat`` (``achat`` from
+asyncio code, ``stream`` for replies shown as they are written), which
+adds what bare ``openai.ChatCompletion.create`` calls lack:
+
+* token buckets for requests per minute and tokens per minute, so bursts
+  queue here instead of coming back as 429s; tokens are reserved from an
+  estimate of the prompt plus ``max_tokens`` and settled against the
+  reported usage, so unused reservations go back to the bucket;
+* a cap on calls in flight and a per-request timeout;
+* retries on rate limits, timeouts, connection errors and 5xx replies
+  with exponential backoff and full jitter (or the server's Retry-After,
+  which also pauses every other caller);
+* hedging: a call still running after the recent p95 latency for its
+  model gets a duplicate request, and whichever answers first wins.
+  Hedges are only sent when the buckets have room for them right away.
+
+The ``openai`` package is imported on the first call, not with this
+module: it takes longer to import than the rest of the app together.
+"""
+import asyncio
+import base64
+import collections
+import functools
+import importlib.metadata
+import io
+import logging
+import math
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from PIL import Image
+
+import metrics
+import tiling
+
+LLM_RPM = int(os.getenv("LLM_RPM", "500"))
+LLM_TPM = int(os.getenv("LLM_TPM", "300000"))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "16"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "4"))
+LLM_BACKOFF = float(os.getenv("LLM_BACKOFF", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+# Hedge calls slower than this percentile of recent latencies (0 disables)
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SECONDS = float(os.getenv("LLM_HEDGE_MIN_SECONDS", "2"))
+
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+DEFAULT_MAX_TOKENS = 256
+CHARS_PER_TOKEN = 4
+
+# Names in ``openai.error``
+RETRYABLE = (
+    "RateLimitError",
+    "Timeout",
+    "APIConnectionError",
+    "ServiceUnavailableError",
+    "TryAgain",
+    "APIError",
+)
+
+
+def openai_major_version():
+    """Major version of the installed openai package, read without importing it."""
+    try:
+        return int(importlib.metadata.version("openai").split(".")[0])
+    except (importlib.metadata.PackageNotFoundError, ValueError):
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def _openai():
+    major = openai_major_version()
+    if major is not None and major >= 1:
+        raise RuntimeError(f"openai {importlib.metadata.version('openai')} is installed; "
+                           "this app uses the 0.x API (pip install 'openai==0.28')")
+    import openai
+    if not openai.api_key:
+        # The package reads the variable at import time, which may predate load_dotenv()
+        openai.api_key = os.getenv("OPENAI_API_KEY")
+    return openai
+
+
+class TokenBucket:
+    """``per_minute`` units refilled continuously, bursting up to a minute's worth.
+
+    A limit of 0 or less means unlimited.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, amount, block=True):
+        """Take ``amount`` units, waiting for them unless ``block`` is false.
+
+        Returns the seconds spent waiting, or None when not blocking and the
+        units are not available.
+        """
+        if self.capacity <= 0:
+            return 0.0
+        amount = min(amount, self.capacity)
+        started = time.monotonic()
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait_for = self.paused_until - now
+                if wait_for <= 0:
+                    if self.level >= amount:
+                        self.level -= amount
+                        return now - started
+                    wait_for = (amount - self.level) / self.rate
+            if not block:
+                return None
+            time.sleep(min(wait_for, 1.0))
+
+    def give(self, amount):
+        """Return units reserved but not used."""
+        if self.capacity <= 0:
+            return
+        with self.lock:
+            self._refill(time.monotonic())
+            self.level = min(self.capacity, self.level + amount)
+
+    def pause(self, seconds):
+        """Hold every caller back for ``seconds`` (after a rate-limit reply)."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def _image_tokens(part):
+    image = part.get("image_url") or {}
+    detail = image.get("detail", "auto")
+    if detail == "low":
+        return tiling.BASE_TOKENS
+    try:
+        data = image["url"].split(",", 1)[1]
+        size = Image.open(io.BytesIO(base64.b64decode(data))).size
+    except Exception:
+        size = (tiling.HIGH_DETAIL_LONG, tiling.HIGH_DETAIL_LONG)
+    return tiling.vision_tokens(size, "high")
+
+
+def estimate_tokens(kwargs):
+    """Prompt tokens (text by length, images by the API's accounting) plus ``max_tokens``."""
+    tokens = 0
+    for message in kwargs.get("messages", []):
+        content = message.get("content") or ""
+        if isinstance(content, str):
+            tokens += len(content) // CHARS_PER_TOKEN + 4
+            continue
+        for part in content:
+            if part.get("type") == "image_url":
+                tokens += _image_tokens(part)
+            else:
+                tokens += len(part.get("text") or "") // CHARS_PER_TOKEN
+    if kwargs.get("functions"):
+        tokens += len(str(kwargs["functions"])) // CHARS_PER_TOKEN
+    return tokens + kwargs.get("max_tokens", DEFAULT_MAX_TOKENS)
+
+
+def _retry_after(error):
+    headers = getattr(error, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def _retryable(error):
+    errors = _openai().error
+    if getattr(error, "code", None) == "insufficient_quota":
+        return False
+    if type(error) is errors.APIError:
+        # Plain APIError covers every other HTTP error; only 5xx are worth retrying
+        status = getattr(error, "http_status", None)
+        return status is None or status >= 500
+    return isinstance(error, tuple(getattr(errors, name) for name in RETRYABLE))
+
+
+class LLMGateway:
+    """Rate-limited, retrying, hedging front for ``openai.ChatCompletion.create``."""
+
+    def __init__(self, rpm=LLM_RPM, tpm=LLM_TPM, concurrency=LLM_CONCURRENCY, timeout=LLM_TIMEOUT,
+                 retries=LLM_RETRIES, backoff=LLM_BACKOFF, backoff_max=LLM_BACKOFF_MAX,
+                 hedge_percentile=LLM_HEDGE_PERCENTILE, hedge_min_seconds=LLM_HEDGE_MIN_SECONDS,
+                 create=None):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = concurrency
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_seconds = hedge_min_seconds
+        self.create = create
+        self.latencies = collections.defaultdict(lambda: collections.deque(maxlen=LATENCY_WINDOW))
+        self.counts = collections.Counter()
+        self.lock = threading.Lock()
+        self._pool = None
+
+    def _count(self, **increments):
+        with self.lock:
+            self.counts.update(increments)
+
+    @property
+    def pool(self):
+        with self.lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=2 * self.concurrency, thread_name_prefix="llm")
+            return self._pool
+
+    def hedge_delay(self, model):
+        """Seconds after which a call to ``model`` is hedged, or None."""
+        if self.hedge_percentile <= 0:
+            return None
+        with self.lock:
+            samples = sorted(self.latencies[model])
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        index = min(len(samples) - 1, math.ceil(len(samples) * self.hedge_percentile / 100) - 1)
+        return max(self.hedge_min_seconds, samples[index])
+
+    def _reserve(self, estimate, block=True):
+        waited = self.requests.take(1, block)
+        if waited is None:
+            return False
+        more = self.tokens.take(estimate, block)
+        if more is None:
+            self.requests.give(1)
+            return False
+        if waited + more > 0.01:
+            self._count(throttled_seconds=waited + more)
+        return True
+
+    def _call(self, kwargs, acquired=False):
+        if not acquired:
+            self.slots.acquire()
+        model = kwargs.get("model")
+        started = time.monotonic()
+        try:
+            response = (self.create or _openai().ChatCompletion.create)(**kwargs)
+        except Exception as e:
+            metrics.llm_request(model, time.monotonic() - started, type(e).__name__)
+            raise
+        finally:
+            self.slots.release()
+        elapsed = time.monotonic() - started
+        metrics.llm_request(model, elapsed, "ok")
+        with self.lock:
+            self.latencies[model].append(elapsed)
+        return response
+
+    def _hedged(self, kwargs, estimate):
+        delay = self.hedge_delay(kwargs.get("model"))
+        if delay is None:
+            return self._call(kwargs)
+        primary = self.pool.submit(self._call, kwargs)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._reserve(estimate, block=False):
+            return primary.result()
+        if not self.slots.acquire(blocking=False):
+            self.requests.give(1)
+            self.tokens.give(estimate)
+            return primary.result()
+        hedge = self.pool.submit(self._call, kwargs, True)
+        self._count(hedges=1)
+        pending, error = {primary, hedge}, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = error or future.exception()
+                else:
+                    if future is hedge:
+                        self._count(hedge_wins=1)
+                    return future.result()
+        raise error
+
+    def _settle(self, model, estimate, response):
+        usage = response.get("usage") or {}
+        used = usage.get("total_tokens")
+        prompt, completion = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+        self._count(prompt_tokens=prompt, completion_tokens=completion)
+        metrics.llm_tokens(model, prompt, completion)
+        if used is not None and used < estimate:
+            self.tokens.give(estimate - used)
+
+    def _backoff(self, attempt, error):
+        delay = random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if isinstance(error, _openai().error.RateLimitError):
+            # The account is over its limit: hold back every caller, not just this one
+            self.requests.pause(delay)
+        return delay
+
+    @metrics.timed("llm")
+    def chat(self, **kwargs):
+        """``openai.ChatCompletion.create(**kwargs)`` under the gateway's limits."""
+        kwargs.setdefault("request_timeout", self.timeout)
+        estimate = estimate_tokens(kwargs)
+        for attempt in range(self.retries + 1):
+            self._reserve(estimate)
+            self._count(requests=1)
+            try:
+                response = self._hedged(kwargs, estimate)
+            except Exception as e:
+                if attempt == self.retries or not _retryable(e):
+                    self._count(errors=1)
+                    raise
+                delay = self._backoff(attempt, e)
+                self._count(retries=1, rate_limited=isinstance(e, _openai().error.RateLimitError))
+                logging.warning(f"OpenAI call failed ({type(e).__name__}: {e}); retry {attempt + 1} "
+                                f"in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            self._settle(kwargs.get("model"), estimate, response)
+            return response
+
+    def stream(self, **kwargs):
+        """Yield the text of a streamed chat completion piece by piece.
+
+        Same limits as ``chat``. A failed request is retried only while
+        nothing has been yielded yet, and streams are never hedged. The
+        API reports no usage for streams, so tokens are settled against
+        the length of the reply.
+        """
+        kwargs = dict(kwargs, stream=True)
+        kwargs.setdefault("request_timeout", self.timeout)
+        model = kwargs.get("model")
+        estimate = estimate_tokens(kwargs)
+        for attempt in range(self.retries + 1):
+            self._reserve(estimate)
+            self._count(requests=1, streams=1)
+            self.slots.acquire()
+            started = time.monotonic()
+            received = 0
+            try:
+                for chunk in (self.create or _openai().ChatCompletion.create)(**kwargs):
+                    piece = (chunk["choices"][0].get("delta") or {}).get("content")
+                    if piece:
+                        received += len(piece)
+                        yield piece
+            except Exception as e:
+                metrics.llm_request(model, time.monotonic() - started, type(e).__name__)
+                if received or attempt == self.retries or not _retryable(e):
+                    self._count(errors=1)
+                    raise
+                delay = self._backoff(attempt, e)
+                self._count(retries=1, rate_limited=isinstance(e, _openai().error.RateLimitError))
+                logging.warning(f"OpenAI stream failed ({type(e).__name__}: {e}); retry {attempt + 1} "
+                                f"in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            finally:
+                self.slots.release()
+            metrics.llm_request(model, time.monotonic() - started, "ok")
+            completion = received // CHARS_PER_TOKEN
+            prompt = estimate - kwargs.get("max_tokens", DEFAULT_MAX_TOKENS)
+            self._count(prompt_tokens=prompt, completion_tokens=completion)
+            metrics.llm_tokens(model, prompt, completion)
+            self.tokens.give(max(0, estimate - prompt - completion))
+            return
+
+    async def achat(self, **kwargs):
+        """``chat`` for asyncio code; runs in a worker thread and shares the same limits."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.chat, **kwargs))
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counts)
+        stats["throttled_seconds"] = round(stats.get("throttled_seconds", 0.0), 3)
+        return stats
+
+
+gateway = LLMGateway()
+
+
+def chat(**kwargs):
+    return gateway.chat(**kwargs)
+
+
+def stream(**kwargs):
+    return gateway.stream(**kwargs)
+
+
+async def achat(**kwargs):
+    return await gateway.achat(**kwargs)
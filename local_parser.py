@@ -0,0 +1,386 @@
+"""Rule-based invoice parsing that runs before the LLM.
+
+Two parsers produce the same JSON shape as ``parse_extracted_text``:
+
+* vendor templates, loaded from the JSON file in ``PARSER_TEMPLATES``,
+  pick fields with regexes and find the line-item table between a start
+  and an end anchor;
+* a generic parser reads labelled header fields ("Invoice No:", "Total:")
+  and line items from markdown tables, column rows
+  ("Widget  2  3.50  7.00") and "name: 2 x 3.50" lines.
+
+Every result gets a confidence in [0, 1] that rewards found fields and,
+mostly, arithmetic that adds up: quantity x price matching the line
+amount and the lines summing to the subtotal or total. A template file
+looks like::
+
+    [{"name": "acme", "match": ["ACME TRADING"], "vendor": "Acme Trading LLC",
+      "currency": "AED",
+      "fields": {"invoice_number": "Inv(?:oice)? No[.:]?\\s*(\\S+)", "total": "Grand Total\\s*(\\S+)"},
+      "lines": {"start": "^Description", "end": "^Sub ?total",
+                "pattern": "^(?P<name>.+?)\\s{2,}(?P<quantity>\\S+)\\s+(?P<price>\\S+)\\s+(?P<amount>\\S+)$"}}]
+"""
+import json
+import logging
+import os
+import re
+import threading
+from collections import Counter
+
+from vendors import LEGAL_SUFFIXES
+
+PARSER_TEMPLATES = os.getenv("PARSER_TEMPLATES")
+
+NUMBER = r"-?\d{1,3}(?:[,.]\d{3})+(?:[.,]\d+)?|-?\d+(?:[.,]\d+)?"
+CURRENCY_SYMBOLS = {"$": "USD", "€": "EUR", "£": "GBP", "₹": "INR"}
+CURRENCY_CODES = {
+    "USD", "EUR", "GBP", "INR", "AED", "SAR", "QAR", "OMR", "KWD", "BHD", "CAD",
+    "AUD", "CHF", "JPY", "CNY", "SGD", "HKD", "ZAR", "EGP", "PKR",
+}
+FIELD_PATTERNS = {
+    "vendor": r"^\s*(?:vendor|supplier|seller|from|company)\s*(?:name)?\s*[:\-]\s*(.+)$",
+    # The number must contain a digit, so "Invoice Date" or "PO Box" never match
+    "invoice_number": (
+        r"\b(?:invoice|inv|bill|purchase order|po|order)\s*(?:/\s*po\s*)?"
+        r"(?:no\.?|number|num|#)?\s*[:\-#]?\s*([A-Za-z0-9][\w\-/]*\d[\w\-/]*)"
+    ),
+    "date": (
+        r"\b(?:invoice\s+|order\s+|po\s+)?date\s*[:\-]?\s*"
+        r"(\d{4}-\d{2}-\d{2}|\d{1,2}[/.\-]\d{1,2}[/.\-]\d{2,4}|\d{1,2}\s+[A-Za-z]{3,9}\.?\s+\d{4}"
+        r"|[A-Za-z]{3,9}\.?\s+\d{1,2},?\s+\d{4})"
+    ),
+    "subtotal": r"\bsub\s*-?\s*total\b[^\d\-\n]*(" + NUMBER + r")",
+    "total": (
+        r"^(?!.*\bsub\s*-?\s*total\b).*?\b(?:grand\s+total|total\s+amount|amount\s+due|total\s+due"
+        r"|balance\s+due|total)\b[^\d\-\n]*(" + NUMBER + r")"
+    ),
+}
+# Rows that look like line items but are totals, taxes or headers
+NOT_AN_ITEM = re.compile(
+    r"\b(sub\s*-?\s*total|total|tax|vat|gst|discount|shipping|freight|balance|amount due|"
+    r"qty|quantity|unit price)\b",
+    re.IGNORECASE,
+)
+# Names end on a non-space and each optional token owns its trailing
+# space: adjacent whitespace quantifiers backtrack badly on padded columns
+COLUMN_ROW = re.compile(
+    r"^\s*(?:\d{1,3}[.)]?\s+)?(?P<name>.*?[A-Za-z]\S*?)\s+(?P<quantity>" + NUMBER + r")"
+    r"(?:\s*[a-zA-Z]{1,5}\.?)?\s+(?:[x@]\s*)?(?:[$€£₹]\s*|[A-Z]{3}\s+)?(?P<price>" + NUMBER + r")"
+    r"(?:\s+(?:[$€£₹]\s*|[A-Z]{3}\s+)?(?P<amount>" + NUMBER + r"))?\s*$"
+)
+TIMES_ROW = re.compile(
+    r"^\s*(?:[-*•]\s*)?(?P<name>.*?[A-Za-z][^:\s]*?)\s*[:\-]\s*(?P<quantity>" + NUMBER + r")\s*[x×]\s*"
+    r"(?:[$€£₹]\s*|[A-Z]{3}\s+)?(?P<price>" + NUMBER + r")(?:\s*\((?P<description>.*)\))?\s*$"
+)
+TABLE_HEADER = re.compile(r"\b(qty|quantity)\b", re.IGNORECASE)
+TABLE_END = re.compile(r"^\W*(sub\s*-?\s*total|grand\s+total|total|amount\s+due)\b", re.IGNORECASE)
+# Checked in this order, so "Item Code" is a code column and "Total Price"
+# after "Unit Price" is the amount
+TABLE_COLUMNS = {
+    "code": ("code", "sku", "part", "ref"),
+    "name": ("description", "item", "product", "particulars", "details", "name"),
+    "quantity": ("qty", "quantity", "units", "pcs"),
+    "price": ("unit price", "price", "rate", "unit cost", "cost"),
+    "amount": ("amount", "line total", "total", "value", "net"),
+}
+
+WEIGHTS = {
+    "vendor": 0.2, "invoice_number": 0.1, "date": 0.05, "currency": 0.05,
+    "products": 0.2, "lines_add_up": 0.2, "total_adds_up": 0.2,
+}
+
+
+def to_number(text):
+    """Parse "1,234.50", "1.234,50" or "1 234" into a float; None if not a number."""
+    if text is None:
+        return None
+    text = re.sub(r"[^\d,.\-]", "", str(text))
+    if not re.search(r"\d", text):
+        return None
+    if "," in text and "." in text:
+        # Whichever separator comes last is the decimal point
+        if text.rfind(",") > text.rfind("."):
+            text = text.replace(".", "").replace(",", ".")
+        else:
+            text = text.replace(",", "")
+    elif "," in text:
+        whole, _, fraction = text.rpartition(",")
+        text = f"{whole.replace(',', '')}.{fraction}" if len(fraction) != 3 else text.replace(",", "")
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _close(a, b, tolerance=0.011):
+    return a is not None and b is not None and abs(a - b) <= max(0.02, abs(b) * tolerance)
+
+
+def load_templates(path):
+    """Vendor templates from a JSON file; an unreadable file means no templates."""
+    if not path:
+        return []
+    try:
+        with open(path) as f:
+            templates = json.load(f)
+    except Exception as e:
+        logging.error(f"Could not load parser templates from {path}: {e}")
+        return []
+    for template in templates:
+        template["_match"] = [re.compile(m, re.IGNORECASE) for m in template.get("match", [])]
+        template["_fields"] = {
+            field: re.compile(pattern, re.IGNORECASE | re.MULTILINE)
+            for field, pattern in template.get("fields", {}).items()
+        }
+        lines = template.get("lines")
+        if lines:
+            template["_lines"] = {
+                key: re.compile(lines[key], re.IGNORECASE | re.MULTILINE)
+                for key in ("start", "end", "pattern") if lines.get(key)
+            }
+    return templates
+
+
+# -- line items -----------------------------------------------------------
+
+def _item(name, quantity, price, amount=None, description="", code=""):
+    quantity, price, amount = to_number(quantity), to_number(price), to_number(amount)
+    name = re.sub(r"\s+", " ", (name or "").strip(" |:-*•\t"))
+    if not name or price is None or quantity is None or NOT_AN_ITEM.search(name):
+        return None
+    item = {"name": name, "quantity": quantity, "price": price, "description": description or ""}
+    if code:
+        item["code"] = code.strip()
+    if amount is not None:
+        item["amount"] = amount
+    return item
+
+
+def _markdown_items(lines):
+    items, columns = [], None
+    for line in lines:
+        if not line.strip().startswith("|"):
+            columns = None
+            continue
+        cells = [c.strip() for c in line.strip().strip("|").split("|")]
+        if all(re.fullmatch(r":?-{2,}:?", c) or not c for c in cells):
+            continue
+        if columns is None:
+            columns = {}
+            for index, cell in enumerate(cells):
+                label = cell.lower()
+                for field, names in TABLE_COLUMNS.items():
+                    if field not in columns and any(n in label for n in names):
+                        columns[field] = index
+                        break
+            if not {"name", "quantity", "price"} <= set(columns):
+                columns = None
+            continue
+        get = lambda field: cells[columns[field]] if field in columns and columns[field] < len(cells) else None
+        item = _item(get("name"), get("quantity"), get("price"), get("amount"), code=get("code") or "")
+        if item:
+            items.append(item)
+    return items
+
+
+def _row_items(lines, pattern):
+    items = []
+    for line in lines:
+        match = pattern.match(line)
+        if not match:
+            continue
+        groups = match.groupdict()
+        item = _item(groups.get("name"), groups.get("quantity"), groups.get("price"),
+                     groups.get("amount"), groups.get("description") or "", groups.get("code") or "")
+        if item:
+            items.append(item)
+    return items
+
+
+def _table_region(lines):
+    """Lines between a "Qty" header row and the first total row, if there is a header."""
+    for start, line in enumerate(lines):
+        if TABLE_HEADER.search(line):
+            region = lines[start + 1:]
+            for end, row in enumerate(region):
+                if TABLE_END.search(row):
+                    return region[:end]
+            return region
+    return lines
+
+
+def line_items(text):
+    """Line items found by the first generic reader that finds any."""
+    lines = text.splitlines()
+    items = _markdown_items(lines) or _row_items(lines, TIMES_ROW)
+    return items or _row_items(_table_region(lines), COLUMN_ROW)
+
+
+# -- header fields --------------------------------------------------------
+
+def _field(pattern, text, last=False):
+    matches = re.findall(pattern, text, re.IGNORECASE | re.MULTILINE)
+    if not matches:
+        return None
+    return (matches[-1] if last else matches[0]).strip()
+
+
+def _currency(text):
+    codes = Counter(re.findall(r"\b(" + "|".join(sorted(CURRENCY_CODES)) + r")\b", text))
+    if codes:
+        return codes.most_common(1)[0][0]
+    symbols = Counter(ch for ch in text if ch in CURRENCY_SYMBOLS)
+    if symbols:
+        return CURRENCY_SYMBOLS[symbols.most_common(1)[0][0]]
+    return None
+
+
+def _vendor_guess(text):
+    """The first line ending in a legal form ("... Trading LLC"), if any."""
+    for line in text.splitlines()[:15]:
+        words = re.findall(r"[A-Za-z]+", line)
+        if 1 < len(words) <= 8 and words[-1].lower() in LEGAL_SUFFIXES:
+            return line.strip(" #*|:-")
+    return None
+
+
+def _header(text):
+    # Vision output often bolds labels ("**Invoice Number:** INV-1")
+    text = re.sub(r"\*\*|__", "", text)
+    # The last "total" on a page is the grand total, after subtotal and tax
+    fields = {field: _field(pattern, text, last=field == "total") for field, pattern in FIELD_PATTERNS.items()}
+    fields["currency"] = _currency(text)
+    return fields
+
+
+# -- scoring --------------------------------------------------------------
+
+def confidence(parsed, vendor_certain=False):
+    """Score a parse by the fields found and whether its numbers add up.
+
+    A parse without a vendor scores 0: the vendor drives resolution,
+    pricing and creation, so such documents always go to the LLM.
+    """
+    if not parsed.get("vendor"):
+        return 0.0
+    score = WEIGHTS["vendor"] * (1.0 if vendor_certain else 0.5)
+    for field in ("invoice_number", "date"):
+        if parsed.get(field):
+            score += WEIGHTS[field]
+    if parsed.get("_currency_found"):
+        score += WEIGHTS["currency"]
+    products = parsed.get("products") or []
+    if not products:
+        return round(score, 3)
+    score += WEIGHTS["products"]
+
+    checked = 0.0
+    for product in products:
+        if "amount" in product:
+            checked += 1.0 if _close(product["quantity"] * product["price"], product["amount"]) else 0.0
+        else:
+            checked += 0.5
+    score += WEIGHTS["lines_add_up"] * checked / len(products)
+
+    line_sum = sum(p.get("amount", p["quantity"] * p["price"]) for p in products)
+    if any(_close(line_sum, target) for target in (parsed.get("_subtotal"), parsed.get("total"))):
+        score += WEIGHTS["total_adds_up"]
+    return round(score, 3)
+
+
+def _result(fields, products, vendor, vendor_certain):
+    parsed = {
+        "vendor": vendor or "",
+        "invoice_number": fields.get("invoice_number") or "",
+        "date": fields.get("date") or "",
+        "products": products,
+        "total": to_number(fields.get("total")) or 0.0,
+        "currency": fields.get("currency") or "USD",
+        "_currency_found": bool(fields.get("currency")),
+        "_subtotal": to_number(fields.get("subtotal")),
+    }
+    score = confidence(parsed, vendor_certain)
+    for key in ("_currency_found", "_subtotal"):
+        del parsed[key]
+    for product in products:
+        product.pop("amount", None)
+    return parsed, score
+
+
+def parse_with_template(template, text):
+    fields = _header(text)
+    for field, pattern in template["_fields"].items():
+        match = pattern.search(text)
+        if match:
+            fields[field] = (match.group(1) if match.groups() else match.group(0)).strip()
+    if template.get("currency"):
+        fields["currency"] = template["currency"]
+
+    section = text
+    anchors = template.get("_lines", {})
+    if "start" in anchors:
+        start = anchors["start"].search(section)
+        section = section[start.end():] if start else section
+    if "end" in anchors:
+        end = anchors["end"].search(section)
+        section = section[:end.start()] if end else section
+    lines = section.splitlines()
+    products = _row_items(lines, anchors["pattern"]) if "pattern" in anchors else line_items(section)
+    return _result(fields, products, template.get("vendor") or fields.get("vendor"), True)
+
+
+def parse_generic(text):
+    fields = _header(text)
+    vendor = fields.get("vendor")
+    certain = bool(vendor)
+    if not vendor:
+        vendor = _vendor_guess(text)
+    return _result(fields, line_items(text), vendor, certain)
+
+
+class LocalParser:
+    """Vendor templates plus the generic parser, with hit-rate counters.
+
+    ``parse`` returns ``(parsed, confidence, source)`` for the best
+    candidate; callers decide on the threshold. ``record`` counts how each
+    document was finally parsed (``local``, ``cache`` or ``llm``) so
+    ``stats`` can report the local hit rate.
+    """
+
+    def __init__(self, templates=None):
+        self.templates = load_templates(PARSER_TEMPLATES) if templates is None else templates
+        self.counts = Counter()
+        self.seconds = Counter()
+        self.lock = threading.Lock()
+
+    def parse(self, text):
+        text = (text or "").replace("\r\n", "\n")
+        candidates = []
+        for template in self.templates:
+            if any(m.search(text) for m in template["_match"]):
+                parsed, score = parse_with_template(template, text)
+                candidates.append((score, f"template:{template['name']}", parsed))
+        parsed, score = parse_generic(text)
+        candidates.append((score, "generic", parsed))
+        score, source, parsed = max(candidates, key=lambda c: c[0])
+        return parsed, score, source
+
+    def record(self, outcome, seconds=0.0):
+        with self.lock:
+            self.counts[outcome] += 1
+            self.seconds[outcome] += seconds
+
+    def stats(self):
+        with self.lock:
+            total = sum(self.counts.values())
+            return {
+                "documents": total,
+                "local": self.counts["local"],
+                "cache": self.counts["cache"],
+                "llm": self.counts["llm"],
+                "local_hit_rate": round(self.counts["local"] / total, 3) if total else 0.0,
+                "avg_seconds": {
+                    outcome: round(self.seconds[outcome] / count, 4)
+                    for outcome, count in self.counts.items() if count
+                },
+            }
@@ -0,0 +1,233 @@
+"""Prometheus-style metrics and per-request stage traces.
+
+Counters and histograms live in this process and are rendered in the
+Prometheus text format by ``render`` (served at ``/metrics``). Callback
+gauges read values other objects already keep, such as cache hits, at
+scrape time, so they cost nothing in between.
+
+``stage(name)`` (or the ``timed(name)`` decorator) times one pipeline
+stage into ``invoice_stage_seconds``. On a thread with an active trace
+(``start_trace``, one per web request) the stage's time, Odoo RPCs and
+LLM calls are also added to that trace, which the app logs as a single
+line per request. Recording is a lock, a bisect and a few additions;
+``METRICS_ENABLED=0`` turns the decorators into no-ops.
+"""
+import bisect
+import contextlib
+import functools
+import math
+import os
+import threading
+import time
+from collections import Counter as _Tally
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+registry = []
+_trace = threading.local()
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.label_names)
+
+    def samples(self):
+        """``[(suffix, label names, label values, value)]`` for rendering."""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, names, values, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_labels(names, values)} {_number(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [("", self.label_names, key, value) for key, value in sorted(self.values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        names = self.label_names + ("le",)
+        with self.lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self.values.items()]
+        samples = []
+        for key, counts, total, count in sorted(series):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket
+                samples.append(("_bucket", names, key + (_number(bound),), cumulative))
+            samples.append(("_sum", self.label_names, key, total))
+            samples.append(("_count", self.label_names, key, count))
+        return samples
+
+
+class CallbackGauge(_Metric):
+    """Values read at scrape time from ``collect()``, a ``{label values: value}`` dict."""
+
+    def __init__(self, name, help, labels=(), collect=None, kind="gauge"):
+        super().__init__(name, help, labels)
+        self.collect = collect
+        self.kind = kind
+
+    def samples(self):
+        try:
+            values = self.collect() if self.collect else {}
+        except Exception:
+            values = {}
+        return [("", self.label_names, tuple(key), value) for key, value in sorted(values.items())]
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format."""
+    return "\n".join(metric.render() for metric in registry) + "\n"
+
+
+STAGE_SECONDS = Histogram("invoice_stage_seconds", "Time spent in each pipeline stage.", ["stage"])
+ODOO_RPC_SECONDS = Histogram("odoo_rpc_seconds", "Odoo execute_kw latency.", ["model", "method"])
+ODOO_RPC_ERRORS = Counter("odoo_rpc_errors_total", "Odoo execute_kw calls that raised.", ["model", "method"])
+LLM_REQUEST_SECONDS = Histogram(
+    "llm_request_seconds", "OpenAI request latency, per attempt.", ["model"],
+    buckets=(0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0),
+)
+LLM_REQUESTS = Counter("llm_requests_total", "OpenAI requests by outcome.", ["model", "outcome"])
+LLM_TOKENS = Counter("llm_tokens_total", "OpenAI tokens used.", ["model", "kind"])
+HTTP_SECONDS = Histogram("http_request_seconds", "Web request latency.", ["endpoint", "method", "status"])
+
+
+# -- traces ----------------------------------------------------------------
+
+def start_trace():
+    _trace.current = _Tally()
+
+
+def finish_trace():
+    """The current thread's trace (seconds per stage plus counts), then clear it."""
+    trace = getattr(_trace, "current", None)
+    _trace.current = None
+    return trace
+
+
+def _add(**amounts):
+    trace = getattr(_trace, "current", None)
+    if trace is not None:
+        trace.update(amounts)
+
+
+def format_trace(trace):
+    return " ".join(f"{name}={value:.3f}" if isinstance(value, float) else f"{name}={value}"
+                    for name, value in trace.items())
+
+
+# -- recording -------------------------------------------------------------
+
+@contextlib.contextmanager
+def stage(name):
+    """Time the enclosed block as pipeline stage ``name``."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        _add(**{name: elapsed})
+
+
+def timed(name):
+    """Decorator form of ``stage``."""
+    def decorate(fn):
+        if not METRICS_ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                STAGE_SECONDS.observe(elapsed, stage=name)
+                _add(**{name: elapsed})
+        return wrapper
+    return decorate
+
+
+def odoo_rpc(model, method, seconds, failed=False):
+    if not METRICS_ENABLED:
+        return
+    ODOO_RPC_SECONDS.observe(seconds, model=model, method=method)
+    if failed:
+        ODOO_RPC_ERRORS.inc(model=model, method=method)
+    _add(odoo_rpcs=1, odoo_seconds=seconds)
+
+
+def llm_request(model, seconds, outcome):
+    if not METRICS_ENABLED:
+        return
+    LLM_REQUEST_SECONDS.observe(seconds, model=model)
+    LLM_REQUESTS.inc(model=model, outcome=outcome)
+
+
+def llm_tokens(model, prompt, completion):
+    if not METRICS_ENABLED:
+        return
+    LLM_TOKENS.inc(prompt, model=model, kind="prompt")
+    LLM_TOKENS.inc(completion, model=model, kind="completion")
+    _add(llm_tokens=prompt + completion)
@@ -0,0 +1,285 @@
+import http.client
+import itertools
+import logging
+import queue
+import random
+import socket
+import sys
+import threading
+import time
+import xmlrpc.client
+
+# Methods that only read data and are always safe to send twice
+READ_METHODS = {
+    "search", "search_read", "read", "search_count", "name_search",
+    "fields_get", "read_group", "name_get", "check_access_rights",
+}
+RETRY_STATUS = {429, 502, 503, 504}
+
+
+class OdooRPCError(Exception):
+    """An error reported by the Odoo server for a JSON-RPC call."""
+
+
+class _TimeoutTransport(xmlrpc.client.Transport):
+    """XML-RPC transport with a socket timeout; reuses its HTTP/1.1 connection."""
+
+    def __init__(self, timeout, **kwargs):
+        super().__init__(**kwargs)
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        conn = super().make_connection(host)
+        conn.timeout = self.timeout
+        return conn
+
+
+class _SafeTimeoutTransport(xmlrpc.client.SafeTransport):
+    def __init__(self, timeout, **kwargs):
+        super().__init__(**kwargs)
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        conn = super().make_connection(host)
+        conn.timeout = self.timeout
+        return conn
+
+
+def _requests():
+    """``requests``, if anything has imported it.
+
+    Only the JSON-RPC transport needs it, and importing it takes longer
+    than the rest of the app's Odoo code; when it is not loaded no error
+    can come from it.
+    """
+    return sys.modules.get("requests")
+
+
+def _is_transient(error):
+    """Connection drops, timeouts and gateway errors are worth retrying."""
+    if isinstance(error, xmlrpc.client.ProtocolError):
+        return error.errcode in RETRY_STATUS
+    requests = _requests()
+    if requests is not None:
+        if isinstance(error, requests.HTTPError):
+            return error.response is not None and error.response.status_code in RETRY_STATUS
+        if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+            return True
+    return isinstance(error, (ConnectionError, socket.timeout, http.client.HTTPException))
+
+
+def _never_sent(error):
+    """True when the request cannot have reached the server."""
+    pending = [error]
+    for _ in range(10):
+        if not pending:
+            break
+        current = pending.pop()
+        if isinstance(current, ConnectionRefusedError):
+            return True
+        requests = _requests()
+        if requests is not None and isinstance(current, requests.exceptions.ConnectTimeout):
+            return True
+        if type(current).__name__ == "NewConnectionError":
+            return True
+        for nested in (current.__cause__, current.__context__, getattr(current, "reason", None),
+                       *[arg for arg in current.args if isinstance(arg, BaseException)]):
+            if isinstance(nested, BaseException):
+                pending.append(nested)
+    return False
+
+
+def may_have_written(error):
+    """False when a failed write certainly changed nothing on the server.
+
+    That is when the request never left (see ``_never_sent``) or the
+    server answered with an error, which rolls its transaction back.
+    Timeouts and dropped connections after sending are unknown.
+    """
+    if isinstance(error, (xmlrpc.client.Fault, OdooRPCError)):
+        return False
+    return not _never_sent(error)
+
+
+class OdooClient:
+    """Thread-safe Odoo external API client with pooled keep-alive connections.
+
+    ``transport`` is ``"xmlrpc"`` (the default) or ``"jsonrpc"``. XML-RPC
+    calls check a persistent ``ServerProxy`` out of a pool, so concurrent
+    threads never share one connection; JSON-RPC calls go through a pooled
+    ``requests`` session. Transient failures are retried with exponential
+    backoff and jitter. Writes are only retried when the request never
+    reached the server, so a retry cannot create a record twice.
+
+    ``execute_kw`` keeps the ``ServerProxy`` signature, so the client is a
+    drop-in replacement for ``xmlrpc.client.ServerProxy(".../object")``.
+    """
+
+    def __init__(self, url, db, username, password, transport="xmlrpc", pool_size=8,
+                 timeout=15, retries=3, backoff=0.25):
+        if transport not in ("xmlrpc", "jsonrpc"):
+            raise ValueError(f"Unknown Odoo transport {transport!r}")
+        self.url = url.rstrip("/")
+        self.db = db
+        self.username = username
+        self.password = password
+        self.transport = transport
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.uid = None
+
+        self.proxies = queue.LifoQueue()
+        self.created = 0
+        self.session = None
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.retried = 0
+        self.slots = threading.BoundedSemaphore(pool_size)
+
+    # -- connections ----------------------------------------------------
+
+    def _new_proxy(self, endpoint):
+        transport_class = _SafeTimeoutTransport if self.url.startswith("https") else _TimeoutTransport
+        return xmlrpc.client.ServerProxy(
+            f"{self.url}/xmlrpc/2/{endpoint}",
+            transport=transport_class(self.timeout),
+            allow_none=True,
+        )
+
+    def _checkout(self):
+        try:
+            return self.proxies.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                self.created += 1
+            return self._new_proxy("object")
+
+    def _checkin(self, proxy):
+        self.proxies.put(proxy)
+
+    def _discard(self, proxy):
+        try:
+            proxy("close")()
+        except Exception:
+            pass
+        with self.lock:
+            self.created -= 1
+
+    def _session(self):
+        if self.session is None:
+            with self.lock:
+                if self.session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self.session = session
+        return self.session
+
+    def close(self):
+        """Drop every pooled connection (e.g. after forking)."""
+        while True:
+            try:
+                self._discard(self.proxies.get_nowait())
+            except queue.Empty:
+                break
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+    # -- calls ----------------------------------------------------------
+
+    def _jsonrpc(self, service, method, args):
+        payload = {
+            "jsonrpc": "2.0",
+            "method": "call",
+            "params": {"service": service, "method": method, "args": args},
+            "id": next(self.ids),
+        }
+        response = self._session().post(f"{self.url}/jsonrpc", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        if data.get("error"):
+            error = data["error"]
+            message = (error.get("data") or {}).get("message") or error.get("message")
+            raise OdooRPCError(message)
+        return data.get("result")
+
+    def _with_retries(self, send, idempotent):
+        attempt = 0
+        while True:
+            try:
+                return send()
+            except Exception as e:
+                attempt += 1
+                if attempt > self.retries or not _is_transient(e) or not (idempotent or _never_sent(e)):
+                    raise
+                delay = self.backoff * (2 ** (attempt - 1))
+                delay = random.uniform(delay / 2, delay)
+                with self.lock:
+                    self.retried += 1
+                logging.warning(f"Odoo call failed ({e}); retry {attempt}/{self.retries} in {delay:.2f}s")
+                time.sleep(delay)
+
+    def authenticate(self):
+        """Log in and remember the user ID; returns it, or False on bad credentials."""
+        if self.transport == "jsonrpc":
+            send = lambda: self._jsonrpc("common", "authenticate",
+                                         [self.db, self.username, self.password, {}])
+        else:
+            send = lambda: self._new_proxy("common").authenticate(
+                self.db, self.username, self.password, {})
+        self.uid = self._with_retries(send, idempotent=True)
+        return self.uid
+
+    def execute_kw(self, db, uid, password, model, method, args, kwargs=None):
+        """Call ``model.method(*args, **kwargs)`` on the server."""
+        kwargs = kwargs or {}
+        with self.lock:
+            self.calls += 1
+        idempotent = method in READ_METHODS
+
+        if self.transport == "jsonrpc":
+            return self._with_retries(
+                lambda: self._jsonrpc("object", "execute_kw",
+                                      [db, uid, password, model, method, args, kwargs]),
+                idempotent,
+            )
+
+        def send():
+            with self.slots:
+                proxy = self._checkout()
+                try:
+                    result = proxy.execute_kw(db, uid, password, model, method, args, kwargs)
+                except xmlrpc.client.Fault:
+                    self._checkin(proxy)
+                    raise
+                except Exception:
+                    self._discard(proxy)
+                    raise
+                self._checkin(proxy)
+                return result
+
+        return self._with_retries(send, idempotent)
+
+    def call(self, model, method, args, kwargs=None):
+        """``execute_kw`` with this client's own database and credentials."""
+        return self.execute_kw(self.db, self.uid, self.password, model, method, args, kwargs)
+
+    def stats(self):
+        with self.lock:
+            idle = self.proxies.qsize()
+            return {
+                "transport": self.transport,
+                "pool_size": self.pool_size,
+                "connections": self.created if self.transport == "xmlrpc" else None,
+                "idle": idle if self.transport == "xmlrpc" else None,
+                "calls": self.calls,
+                "retries": self.retried,
+            }
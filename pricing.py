@@ -0,0 +1,138 @@
+import time
+
+SUPPLIERINFO_FIELDS = ["partner_id", "product_id", "product_tmpl_id", "min_qty", "price", "currency_id",
+                       "date_start", "date_end", "sequence"]
+
+
+def _id(value):
+    """The id of a many2one read from Odoo (``[id, name]``, an int or False)."""
+    if isinstance(value, (list, tuple)):
+        return value[0] if value else None
+    return value or None
+
+
+def _currency(value, default):
+    if isinstance(value, (list, tuple)) and len(value) > 1:
+        return value[1]
+    return default
+
+
+class SupplierPricing:
+    """Vendor purchase prices from ``product.supplierinfo``.
+
+    ``fetch`` reads the resolved vendor's price entries for every matched
+    product in one ``search_read`` (entries on the variant or on its
+    template). ``price_lines`` then picks each line's entry locally, like
+    Odoo's seller selection: valid on ``today``, ``min_qty`` at most the
+    line quantity, variant entries before template ones, then the lowest
+    sequence and the highest quantity break. All prices are converted per
+    currency in one pass, and a document price that differs from the
+    agreed one by more than ``deviation`` is flagged.
+    """
+
+    def __init__(self, execute, deviation=0.05, prefer_supplier=False):
+        self.execute = execute
+        self.deviation = deviation
+        self.prefer_supplier = prefer_supplier
+
+    def fetch(self, vendor_id, products):
+        """Entries of ``vendor_id`` for ``products`` (matched product rows), by product id."""
+        if not vendor_id or not products:
+            return {}
+        product_ids = sorted({p["id"] for p in products})
+        template_ids = sorted({_id(p.get("product_tmpl_id")) for p in products} - {None})
+        domain = [["partner_id", "=", vendor_id]]
+        if template_ids:
+            domain += ["|", ["product_id", "in", product_ids],
+                       "&", ["product_id", "=", False], ["product_tmpl_id", "in", template_ids]]
+        else:
+            domain.append(["product_id", "in", product_ids])
+        rows = self.execute("product.supplierinfo", "search_read", [domain], {"fields": SUPPLIERINFO_FIELDS})
+
+        by_variant = {}
+        by_template = {}
+        for row in rows:
+            if _id(row.get("product_id")):
+                by_variant.setdefault(_id(row["product_id"]), []).append(row)
+            else:
+                by_template.setdefault(_id(row.get("product_tmpl_id")), []).append(row)
+        return {
+            p["id"]: by_variant.get(p["id"], []) + by_template.get(_id(p.get("product_tmpl_id")), [])
+            for p in products
+        }
+
+    @staticmethod
+    def select(entries, quantity, today):
+        """The entry that applies to ``quantity`` on ``today`` (``YYYY-MM-DD``), or None."""
+        valid = [
+            entry for entry in entries
+            if (entry.get("min_qty") or 0) <= quantity
+            and (not entry.get("date_start") or entry["date_start"] <= today)
+            and (not entry.get("date_end") or entry["date_end"] >= today)
+        ]
+        if not valid:
+            return None
+        return min(valid, key=lambda entry: (
+            not _id(entry.get("product_id")), entry.get("sequence") or 0, -(entry.get("min_qty") or 0),
+            entry.get("price") or 0.0, entry["id"],
+        ))
+
+    def price_lines(self, lines, entries, currency, convert, today=None):
+        """Price matched lines in ``currency``.
+
+        Each line is ``{"product": row, "quantity", "price", "currency"}``
+        with ``price`` None when the document gave none. ``convert(amounts,
+        from_currency, to_currency)`` converts a list at one rate. Returns,
+        per line, the price and where it came from (``document``,
+        ``supplier`` or ``list_price``), the original price and currency,
+        the agreed ``supplier_price`` and the ``price_deviation`` of the
+        document price from it, with ``price_flag`` set past ``deviation``.
+        """
+        today = today or time.strftime("%Y-%m-%d")
+        results = []
+        pending = {}
+
+        def later(amount, from_currency, result, field):
+            # Collected per currency and converted together below
+            pending.setdefault(from_currency, []).append((amount, result, field))
+
+        for line in lines:
+            product = line["product"]
+            entry = self.select(entries.get(product["id"], []), line["quantity"], today)
+            if line["price"] is not None and not (entry and self.prefer_supplier):
+                source, original_price, original_currency = "document", line["price"], line["currency"]
+            elif entry:
+                source = "supplier"
+                original_price = float(entry.get("price") or 0.0)
+                original_currency = _currency(entry.get("currency_id"), currency)
+            else:
+                # Same fallback as before supplier prices: the sales price,
+                # taken to be in the document currency
+                source = "list_price"
+                original_price, original_currency = float(product.get("list_price", 0)), line["currency"]
+            result = {
+                "price": None,
+                "original_price": original_price,
+                "original_currency": original_currency,
+                "price_source": source,
+                "supplier_price": None,
+                "price_deviation": None,
+                "price_flag": False,
+            }
+            later(original_price, original_currency, result, "price")
+            if entry:
+                later(float(entry.get("price") or 0.0), _currency(entry.get("currency_id"), currency),
+                      result, "supplier_price")
+            results.append(result)
+
+        for from_currency, items in pending.items():
+            converted = convert([amount for amount, _, _ in items], from_currency, currency)
+            for (_, result, field), amount in zip(items, converted):
+                result[field] = amount
+
+        for result in results:
+            agreed = result["supplier_price"]
+            if agreed and result["price_source"] == "document":
+                result["price_deviation"] = round((result["price"] - agreed) / agreed, 4)
+                result["price_flag"] = abs(result["price_deviation"]) > self.deviation
+        return results
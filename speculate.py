@@ -0,0 +1,176 @@
+import copy
+import json
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from cache import cache_key
+
+
+class Speculator:
+    """Parse and validate extracted text before the user confirms it.
+
+    ``start(text)`` runs ``parse(text)`` and then ``validate(parsed)`` on
+    a small pool while the user reads the extracted text. ``confirm(text)``
+    returns the same results, waiting for them if they are still running.
+    Parse results are keyed by a hash of the text and validations by a
+    hash of the parsed data, so an edit only re-runs the stages it
+    changes: edited text is parsed again, and validated again only when
+    it parses differently. Failed stages (an exception, or a result
+    ``usable`` rejects, by default an empty one) are not reused: a caller
+    that was waiting on one runs the stage again itself. Results are kept
+    for ``ttl`` seconds, at most ``max_entries`` of them. ``iter_stage``
+    runs a stage step by step for callers that stream its progress,
+    sharing it the same way.
+    """
+
+    def __init__(self, parse, validate, max_workers=2, max_entries=256, ttl=600, usable=bool):
+        self.parse = parse
+        self.validate = validate
+        self.usable = usable
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculate")
+        self.entries = OrderedDict()
+        self.counts = Counter()
+        self.lock = threading.Lock()
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        while self.entries:
+            key, (created_at, _) = next(iter(self.entries.items()))
+            if created_at >= cutoff and len(self.entries) <= self.max_entries:
+                break
+            del self.entries[key]
+
+    def _key(self, stage, value):
+        if isinstance(value, str):
+            # Browsers post the text back with CRLF line breaks; key it like
+            # the text /extract produced (and like the parse cache does)
+            return cache_key(stage, value.replace("\r\n", "\n").strip())
+        return cache_key(stage, json.dumps(value, sort_keys=True))
+
+    def _claim(self, stage, value):
+        """``(future, owner)`` for ``stage`` of ``value``; the owner must compute it."""
+        key = self._key(stage, value)
+        with self.lock:
+            self._expire()
+            entry = self.entries.get(key)
+            if entry is not None:
+                future = entry[1]
+                if not future.done() or self._succeeded(future):
+                    self.entries.move_to_end(key)
+                    return future, False
+            future = Future()
+            future.set_running_or_notify_cancel()
+            self.entries[key] = (time.time(), future)
+            return future, True
+
+    def _succeeded(self, future):
+        """Whether ``future`` (waited for) holds a result worth reusing."""
+        return future.exception() is None and self.usable(future.result())
+
+    def _run(self, future, fn, value):
+        try:
+            future.set_result(fn(value))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def _speculate(self, future, text):
+        try:
+            parsed = self._run(future, self.parse, text).result()
+            if self.usable(parsed):
+                validation, owner = self._claim("validate", parsed)
+                if owner:
+                    self._run(validation, self.validate, parsed)
+        except Exception as e:
+            logging.warning(f"Speculative parse/validate failed: {e}")
+
+    def start(self, text):
+        """Begin parsing and validating ``text`` in the background."""
+        if not text:
+            return
+        future, owner = self._claim("parse", text)
+        if owner:
+            with self.lock:
+                self.counts["started"] += 1
+            self.executor.submit(self._speculate, future, text)
+
+    def _stage(self, stage, fn, value):
+        future, owner = self._claim(stage, value)
+        with self.lock:
+            self.counts[f"{stage}_{'miss' if owner else 'hit'}"] += 1
+        if not owner and not self._succeeded(future):
+            # The run this joined failed; it is not reused, so try once more
+            future, owner = self._claim(stage, value)
+        if owner:
+            self._run(future, fn, value)
+        try:
+            return future.result()
+        except Exception as e:
+            logging.error(f"{stage} failed: {e}")
+            return None
+
+    def confirm(self, text):
+        """``(parsed, validated)`` for ``text``, reusing what ``start`` computed.
+
+        Stages not started (or started for other input) run in the calling
+        thread. Either value may be None when its stage failed.
+        """
+        parsed = self._stage("parse", self.parse, text)
+        if not parsed:
+            return parsed, None
+        validated = self._stage("validate", self.validate, parsed)
+        # Callers may change what they get; the entry stays as computed
+        return copy.deepcopy(parsed), copy.deepcopy(validated)
+
+    def iter_stage(self, stage, steps, value, result_event):
+        """Run ``stage`` of ``value`` step by step, yielding its progress.
+
+        ``steps(value)`` yields ``(event, data)`` pairs and ends with
+        ``(result_event, result)``; the result is shared like ``confirm``'s.
+        When the stage is already running or done for ``value``, only its
+        result is yielded, once it is ready; if that run failed, this one
+        runs the stage itself. If the caller stops early the stage counts as
+        failed, so the next caller runs it again.
+        """
+        future, owner = self._claim(stage, value)
+        with self.lock:
+            self.counts[f"{stage}_{'miss' if owner else 'hit'}"] += 1
+        if not owner and not self._succeeded(future):
+            future, owner = self._claim(stage, value)
+        if not owner:
+            yield result_event, copy.deepcopy(future.result())
+            return
+        result = None
+        try:
+            for event, data in steps(value):
+                if event == result_event:
+                    result = data
+                yield event, data
+        except GeneratorExit:
+            future.set_exception(RuntimeError(f"{stage} was abandoned"))
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        future.set_result(result)
+
+    def ready(self, text):
+        """Whether ``confirm(text)`` has both results without waiting."""
+        parsed = self._finished("parse", text)
+        return self.usable(parsed) and self._finished("validate", parsed) is not None
+
+    def _finished(self, stage, value):
+        with self.lock:
+            entry = self.entries.get(self._key(stage, value))
+        if entry is None or not entry[1].done() or not self._succeeded(entry[1]):
+            return None
+        return entry[1].result()
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts, entries=len(self.entries))
@@ -0,0 +1,29 @@
+from catalog import ProductCatalog
+
+ROWS = [
+    {"id": 1, "name": "Widget large", "default_code": "W-1", "write_date": "2024-01-01 00:00:00"},
+    {"id": 2, "name": "Widgets small", "default_code": "W-2", "write_date": "2024-01-01 00:00:00"},
+    {"id": 3, "name": "Gadget", "default_code": "G-3", "write_date": "2024-01-01 00:00:00"},
+]
+
+
+def loaded_catalog(rows):
+    catalog = ProductCatalog(lambda model, method, args, kwargs: [r for r in rows if r["id"] > args[0][-1][2]])
+    catalog.load()
+    return catalog
+
+
+def test_single_cut_word_matches_the_words_it_starts():
+    catalog = loaded_catalog(ROWS)
+
+    assert [row["id"] for row in catalog.match("widg")] == [1, 2]
+    assert [row["id"] for row in catalog.match("Widgets")] == [2]
+
+
+def test_single_word_with_too_many_completions_uses_the_word_itself():
+    rows = [{"id": i, "name": f"Bolt{i:02d} zinc", "default_code": f"B-{i:02d}", "write_date": "2024-01-01"}
+            for i in range(1, 41)]
+    rows.append({"id": 99, "name": "Bolt zinc", "default_code": "B-99", "write_date": "2024-01-01"})
+    catalog = loaded_catalog(rows)
+
+    assert [row["id"] for row in catalog.match("bolt")] == [99]
@@ -0,0 +1,44 @@
+import pytest
+
+from drafts import DraftStore
+
+VALIDATED = {"vendor_name": "Acme", "products": [{"id": 3, "name": "Bolt", "code": "B-3", "price": 0.5}]}
+
+
+@pytest.mark.parametrize("change", [
+    {"id": 3, "quantity": None},
+    {"id": 3, "quantity": "ten"},
+    {"id": 3, "quantity": -1},
+    {"id": 3, "quantity": True},
+    {"id": 3},
+    {"id": "3", "quantity": 1},
+    {"quantity": 1},
+    "3",
+])
+def test_update_lines_rejects_malformed_changes(change):
+    drafts = DraftStore()
+    draft_id = drafts.create(VALIDATED, lines=[{"id": 3, "name": "Bolt", "code": "B-3", "price": 0.5, "quantity": 2}])
+
+    with pytest.raises(ValueError):
+        drafts.update_lines(draft_id, [{"id": 3, "quantity": 5}, change])
+
+    assert drafts.get(draft_id)["lines"][0]["quantity"] == 2
+
+
+def test_update_lines_sets_and_removes_lines():
+    drafts = DraftStore()
+    draft_id = drafts.create(VALIDATED)
+
+    assert drafts.update_lines(draft_id, [{"id": 3, "quantity": "4"}])["lines"][0]["quantity"] == 4.0
+    assert drafts.update_lines(draft_id, [{"id": 3, "quantity": 0}])["lines"] == []
+
+
+def test_patch_lines_returns_400_for_bad_quantity():
+    app = pytest.importorskip("app")
+    draft_id = app.drafts.create(VALIDATED)
+
+    response = app.app.test_client().patch(f"/api/drafts/{draft_id}/lines",
+                                           json={"lines": [{"id": 3, "quantity": None}]})
+
+    assert response.status_code == 400
+    assert "Quantity" in response.get_json()["error"]
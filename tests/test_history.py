@@ -0,0 +1,16 @@
+import history
+from history import OrderHistory
+
+
+def test_in_memory_history_works_after_fork():
+    orders = OrderHistory(execute=None)
+    orders.record("po", 7, {"vendor_name": "Acme", "products": [{"price": 2.5, "quantity": 4}]})
+
+    history._reopen_after_fork()
+
+    assert orders.synced_at is None
+    orders.record("invoice", 8, {"vendor_name": "Acme", "invoice_number": "INV-1", "products": []})
+    page = orders.query(vendor="acme")
+    assert page["total"] == 1
+    assert page["orders"][0]["record_id"] == 8
+    assert page["orders"][0]["invoice_number"] == "INV-1"
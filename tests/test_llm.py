@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+
+import llm
+from benchmarks import fake_openai
+
+MESSAGES = [{"role": "user", "content": "Read this invoice"}]
+
+
+@pytest.fixture
+def fake():
+    server = fake_openai.FakeOpenAI(latency=0.01, jitter=0.0)
+    http, url = fake_openai.start(server)
+    fake_openai.configure(url)
+    yield server
+    http.shutdown()
+
+
+def gateway(**options):
+    settings = dict(rpm=0, tpm=0, retries=3, backoff=0.01, backoff_max=0.05, hedge_percentile=0, timeout=10)
+    settings.update(options)
+    return llm.LLMGateway(**settings)
+
+
+def reply_text(response):
+    return response["choices"][0]["message"]["content"]
+
+
+def test_server_error_is_retried(fake):
+    fake.script_next(status=500)
+    llm_gateway = gateway()
+
+    response = llm_gateway.chat(model="gpt-4o-mini", messages=MESSAGES)
+
+    assert reply_text(response) == fake.text
+    assert fake.statuses == {500: 1, 200: 1}
+    assert llm_gateway.stats()["retries"] == 1
+
+
+def test_rate_limit_waits_for_retry_after(fake):
+    fake.script_next(status=429, retry_after=1)
+    llm_gateway = gateway()
+
+    started = time.monotonic()
+    llm_gateway.chat(model="gpt-4o-mini", messages=MESSAGES)
+
+    assert time.monotonic() - started >= 1.0
+    assert fake.statuses == {429: 1, 200: 1}
+    assert llm_gateway.stats()["rate_limited"] == 1
+
+
+def test_request_bucket_throttles_a_burst(fake):
+    # The fake enforces the same limit: a burst past it would come back as 429s
+    fake.rpm = 120
+    fake.requests_left = 120.0
+    llm_gateway = gateway(rpm=120)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=llm_gateway.chat, kwargs={"model": "gpt-4o-mini", "messages": MESSAGES})
+               for _ in range(122)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Two requests past a minute's worth wait for the bucket to refill (2 per second)
+    assert time.monotonic() - started >= 0.8
+    assert fake.statuses == {200: 122}
+    assert llm_gateway.stats()["throttled_seconds"] > 0
+
+
+def test_slow_request_is_hedged_and_the_faster_reply_wins(fake):
+    llm_gateway = gateway(hedge_percentile=95, hedge_min_seconds=0.1)
+    for _ in range(llm.HEDGE_MIN_SAMPLES):
+        llm_gateway.chat(model="gpt-4o-mini", messages=MESSAGES)
+    fake.script_next(delay=3.0)
+
+    started = time.monotonic()
+    response = llm_gateway.chat(model="gpt-4o-mini", messages=MESSAGES)
+
+    assert time.monotonic() - started < 1.0
+    assert reply_text(response) == fake.text
+    assert llm_gateway.stats()["hedges"] == 1
+    assert llm_gateway.stats()["hedge_wins"] == 1
+
+
+def test_stream_is_retried_before_the_first_piece(fake):
+    fake.script_next(status=503)
+    llm_gateway = gateway()
+
+    pieces = list(llm_gateway.stream(model="gpt-4o-mini", messages=MESSAGES))
+
+    assert "".join(pieces) == fake.text
+    assert fake.statuses == {503: 1, 200: 1}
+    assert llm_gateway.stats()["retries"] == 1
+
+
+def test_stream_is_not_retried_after_the_first_piece(fake):
+    openai = llm._openai()
+
+    def dropped_after_first_chunk(**kwargs):
+        # The real client against the fake, losing the connection mid-reply
+        for number, chunk in enumerate(openai.ChatCompletion.create(**kwargs)):
+            if number == 1:
+                raise openai.error.APIConnectionError("Connection reset by peer")
+            yield chunk
+
+    llm_gateway = gateway(create=dropped_after_first_chunk)
+    pieces = []
+    with pytest.raises(openai.error.APIConnectionError):
+        for piece in llm_gateway.stream(model="gpt-4o-mini", messages=MESSAGES):
+            pieces.append(piece)
+
+    assert pieces == [fake.text[:fake_openai.STREAM_PIECE_CHARS]]
+    assert fake.statuses == {200: 1}
+    assert llm_gateway.stats().get("retries", 0) == 0
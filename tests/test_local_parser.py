@@ -0,0 +1,26 @@
+from local_parser import LocalParser
+
+TABLE = """Invoice Number: INV-2001
+Invoice Date: 2024-05-02
+
+| Description | Qty | Unit Price | Amount |
+|---|---|---|---|
+| Copy paper A4 80g | 10 | $4.50 | $45.00 |
+| Toner cartridge 12A | 2 | $61.00 | $122.00 |
+
+Total: $167.00"""
+
+
+def test_parse_without_vendor_is_not_accepted_locally():
+    parsed, score, source = LocalParser([]).parse("Northwind Supplies\n" + TABLE)
+
+    assert parsed["vendor"] == ""
+    assert len(parsed["products"]) == 2
+    assert score == 0.0
+
+
+def test_parse_with_labelled_vendor_scores_its_fields():
+    parsed, score, source = LocalParser([]).parse("Vendor: Northwind Supplies LLC\n" + TABLE)
+
+    assert parsed["vendor"] == "Northwind Supplies LLC"
+    assert score >= 0.8
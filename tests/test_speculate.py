@@ -0,0 +1,92 @@
+import threading
+
+from speculate import Speculator
+
+
+def counting_speculator():
+    calls = {"parse": 0, "validate": 0}
+    release = threading.Event()
+
+    def parse(text):
+        calls["parse"] += 1
+        release.wait(5)
+        return {"vendor": "Acme", "lines": text.splitlines()}
+
+    def validate(parsed):
+        calls["validate"] += 1
+        return {"vendor_name": parsed["vendor"]}
+
+    return Speculator(parse, validate), calls, release
+
+
+def test_confirm_with_crlf_reuses_speculation_started_with_lf():
+    speculation, calls, release = counting_speculator()
+    speculation.start("a\nb")
+    release.set()
+
+    parsed, validated = speculation.confirm("a\r\nb")
+
+    assert parsed == {"vendor": "Acme", "lines": ["a", "b"]}
+    assert validated == {"vendor_name": "Acme"}
+    assert calls == {"parse": 1, "validate": 1}
+    assert speculation.stats()["parse_hit"] == 1
+
+
+def test_ready_and_iter_stage_match_crlf_text():
+    speculation, calls, release = counting_speculator()
+    release.set()
+    speculation.start("a\nb")
+    speculation.confirm("a\nb")
+
+    assert speculation.ready("a\r\nb\r\n")
+
+    def steps(text):
+        raise AssertionError("the speculative parse should be joined, not re-run")
+        yield
+
+    events = list(speculation.iter_stage("parse", steps, "a\r\nb", "parsed"))
+    assert events == [("parsed", {"vendor": "Acme", "lines": ["a", "b"]})]
+    assert calls["parse"] == 1
+
+
+def test_confirm_parses_again_when_the_speculative_parse_failed():
+    from compare import parsed_ok, unparsed_invoice
+
+    replies = [unparsed_invoice(), {"vendor": "Acme", "products": []}]
+    calls = []
+
+    def parse(text):
+        calls.append(text)
+        return replies[len(calls) - 1]
+
+    speculation = Speculator(parse, lambda parsed: {"vendor_name": parsed["vendor"]}, usable=parsed_ok)
+    speculation.start("a\nb")
+    speculation.executor.shutdown(wait=True)
+
+    assert not speculation.ready("a\nb")
+    parsed, validated = speculation.confirm("a\r\nb")
+
+    assert len(calls) == 2
+    assert parsed == {"vendor": "Acme", "products": []}
+    assert validated == {"vendor_name": "Acme"}
+
+
+def test_a_failed_joined_parse_is_run_again_by_the_waiter():
+    release = threading.Event()
+    calls = []
+
+    def parse(text):
+        calls.append(text)
+        if len(calls) == 1:
+            release.wait(5)
+            raise RuntimeError("429 Too Many Requests")
+        return {"vendor": "Acme"}
+
+    speculation = Speculator(parse, lambda parsed: {"vendor_name": parsed["vendor"]})
+    speculation.start("a\nb")
+    release.set()
+
+    parsed, validated = speculation.confirm("a\nb")
+
+    assert len(calls) == 2
+    assert validated == {"vendor_name": "Acme"}
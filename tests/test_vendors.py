@@ -0,0 +1,53 @@
+from vendors import VendorResolver
+
+
+class FakePartners:
+    """res.partner in Odoo: ``search_read`` and ``create`` calls are recorded."""
+
+    def __init__(self, suppliers):
+        self.suppliers = list(suppliers)
+        self.calls = []
+
+    def __call__(self, model, method, args, kwargs=None):
+        self.calls.append(method)
+        if method == "create":
+            self.suppliers.append({"id": 100 + len(self.suppliers), "name": args[0]["name"],
+                                   "property_purchase_currency_id": False})
+            return self.suppliers[-1]["id"]
+        domain = args[0]
+        if domain[0][1] == "=ilike":
+            rows = [s for s in self.suppliers if s["name"].lower() == domain[0][2].lower()]
+        else:
+            rows = list(self.suppliers)
+        return rows[:(kwargs or {}).get("limit") or None]
+
+
+def test_find_checks_odoo_when_the_index_is_stale():
+    odoo = FakePartners([{"id": 1, "name": "Acme Trading LLC", "property_purchase_currency_id": [2, "EUR"]}])
+    vendors = VendorResolver(odoo, ttl=900)
+    vendors.load()
+    # Added in Odoo (or by another worker) after the index loaded
+    odoo.suppliers.append({"id": 7, "name": "Northwind Supplies", "property_purchase_currency_id": [3, "GBP"]})
+
+    assert vendors.resolve("Northwind Supplies") is None
+    assert vendors.find("northwind supplies") == {"id": 7, "name": "Northwind Supplies", "currency": "GBP"}
+    # Remembered: the next lookup needs no RPC
+    calls = len(odoo.calls)
+    assert vendors.find("Northwind Supplies")["id"] == 7
+    assert len(odoo.calls) == calls
+
+
+def test_resolve_vendor_reuses_a_vendor_missing_from_the_index():
+    import compare
+
+    odoo = FakePartners([])
+    integration = compare.OdooIntegration()
+    integration._execute = odoo
+    integration.vendors = VendorResolver(odoo, ttl=900)
+    integration.vendors.load()
+    odoo.suppliers.append({"id": 7, "name": "Northwind Supplies", "property_purchase_currency_id": False})
+
+    assert integration._resolve_vendor({"vendor_name": "Northwind Supplies"}) == 7
+    assert "create" not in odoo.calls
+    assert integration._resolve_vendor({"vendor_name": "Brand New Co"}) == 101
+    assert odoo.calls.count("create") == 1
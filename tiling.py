@@ -0,0 +1,150 @@
+"""Locate text on a scanned page and plan the crops sent to the vision model.
+
+Text rows are found with projection profiles: the page is shrunk to a
+small grayscale copy, binarized, and squeezed to a one-pixel-wide column
+(and, per text line, a one-pixel-high row) with a box filter, which gives
+the share of dark pixels on every row and column. Runs of inked rows are
+text lines; lines close together form blocks. The planner then crops away
+margins and blank gaps, picks the smallest scale at which a line of text
+stays legible, and cuts the content into tiles that the vision API takes
+at "low" or "high" detail without downscaling them again.
+"""
+import math
+import statistics
+
+from PIL import Image, ImageOps
+
+ANALYSIS_SIZE = 2048
+INK_LEVEL = 96          # gray levels darker than this (after inversion: lighter) count as ink
+ROW_INK = 0.01          # share of inked pixels that makes a row part of a text line
+COLUMN_INK = 0.005
+LINE_GAP = 1            # blank analysis rows tolerated inside one text line
+BLOCK_GAP_LINES = 2.5   # blank space, in line heights, that separates two blocks
+PADDING_LINES = 0.75    # margin kept around cropped content, in line heights
+
+# Vision API image accounting (gpt-4o): "low" detail is a flat 85 tokens
+# for an image up to 512x512; "high" detail costs 85 plus 170 per 512px
+# square, after fitting into 2048x2048 and scaling the short side to 768
+LOW_DETAIL_SIZE = 512
+HIGH_DETAIL_SHORT = 768
+HIGH_DETAIL_LONG = 2048
+BASE_TOKENS = 85
+TILE_TOKENS = 170
+
+
+def vision_tokens(size, detail):
+    """Image tokens the vision API charges for an image of ``size`` pixels."""
+    if detail == "low":
+        return BASE_TOKENS
+    width, height = size
+    scale = min(1.0, HIGH_DETAIL_LONG / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, HIGH_DETAIL_SHORT / min(width, height))
+    width, height = width * scale, height * scale
+    return BASE_TOKENS + TILE_TOKENS * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def _ink(img):
+    """Binary ink mask (text white on black) of a small grayscale copy."""
+    gray = ImageOps.grayscale(img)
+    gray.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE), Image.Resampling.BOX)
+    return ImageOps.invert(gray).point(lambda v: 255 if v > 255 - INK_LEVEL else 0)
+
+
+def _runs(profile, threshold, gap):
+    """(start, end) index runs where ``profile`` exceeds ``threshold``."""
+    runs = []
+    for i, value in enumerate(profile):
+        if value / 255 <= threshold:
+            continue
+        if runs and i - runs[-1][1] <= gap + 1:
+            runs[-1][1] = i + 1
+        else:
+            runs.append([i, i + 1])
+    return runs
+
+
+def text_lines(img):
+    """Bounding boxes ``(left, top, right, bottom)`` of text lines, in ``img`` pixels."""
+    ink = _ink(img)
+    scale = img.width / ink.width
+    rows = list(ink.resize((1, ink.height), Image.Resampling.BOX).getdata())
+    lines = []
+    for top, bottom in _runs(rows, ROW_INK, LINE_GAP):
+        band = ink.crop((0, top, ink.width, bottom))
+        columns = list(band.resize((band.width, 1), Image.Resampling.BOX).getdata())
+        spans = _runs(columns, COLUMN_INK, 0)
+        if not spans:
+            continue
+        left, right = spans[0][0], spans[-1][1]
+        lines.append((
+            int(left * scale), int(top * scale),
+            min(img.width, math.ceil(right * scale)), min(img.height, math.ceil(bottom * scale)),
+        ))
+    return lines
+
+
+def _box(lines, pad, size):
+    return (
+        max(0, min(l[0] for l in lines) - pad), max(0, min(l[1] for l in lines) - pad),
+        min(size[0], max(l[2] for l in lines) + pad), min(size[1], max(l[3] for l in lines) + pad),
+    )
+
+
+def plan_tiles(img, min_line_px=14):
+    """Crops of ``img`` to send, as ``[(boxes, scale, detail)]`` in reading order.
+
+    Each tile is a stack of ``boxes`` (runs of text lines, blank gaps
+    between them cut out) to be resized by ``scale`` and pasted one under
+    the other. ``scale`` makes the median text line about ``min_line_px``
+    tall, never enlarging. Content that fits a low detail image goes as one
+    85-token tile; otherwise tiles are sized to the high detail 512px
+    grid without triggering the API's own downscale. Pages with no
+    detectable text fall back to the whole page at low detail.
+    """
+    lines = text_lines(img)
+    if not lines:
+        scale = min(1.0, LOW_DETAIL_SIZE / max(img.size))
+        return [([(0, 0, img.width, img.height)], scale, "low")]
+
+    line_height = statistics.median(l[3] - l[1] for l in lines)
+    pad = int(line_height * PADDING_LINES)
+    block_gap = line_height * BLOCK_GAP_LINES
+
+    # Runs of lines without a large blank gap between them
+    runs = [[lines[0]]]
+    for line in lines[1:]:
+        if line[1] - runs[-1][-1][3] > block_gap:
+            runs.append([])
+        runs[-1].append(line)
+    boxes = [_box(run, pad, img.size) for run in runs]
+
+    scale = min(1.0, min_line_px / max(line_height, 1))
+    width = max(b[2] - b[0] for b in boxes)
+    scale = min(scale, HIGH_DETAIL_LONG / width)
+    stacked = sum(b[3] - b[1] for b in boxes) * scale
+    if max(width * scale, stacked) <= LOW_DETAIL_SIZE:
+        return [(boxes, scale, "low")]
+
+    # Wider than 768 means the short side is the height, which the API
+    # caps at 768; a 512 tall tile then costs one row of 512px squares
+    # (less a few pixels for rounding when the crops are resized)
+    limit = HIGH_DETAIL_LONG if width * scale <= HIGH_DETAIL_SHORT else LOW_DETAIL_SIZE
+    max_height = (limit - 8) / scale
+
+    tiles, tile, used = [], [], 0
+    for run in runs:
+        start = 0
+        for end in range(len(run)):
+            height = run[end][3] - run[start][1] + 2 * pad
+            if used + height > max_height and (tile or end > start):
+                if end > start:
+                    tile.append(_box(run[start:end], pad, img.size))
+                    start = end
+                tiles.append(tile)
+                tile, used = [], 0
+        box = _box(run[start:], pad, img.size)
+        tile.append(box)
+        used += box[3] - box[1]
+    tiles.append(tile)
+    return [(tile, scale, "high") for tile in tiles]
@@ -0,0 +1,124 @@
+import re
+import threading
+import time
+
+VENDOR_FIELDS = ["name", "property_purchase_currency_id"]
+LEGAL_SUFFIXES = {
+    "co", "company", "corp", "corporation", "inc", "incorporated", "llc", "llp",
+    "ltd", "limited", "plc", "pvt", "private", "gmbh", "ag", "sa", "sarl",
+    "srl", "bv", "nv", "fze", "fzco", "fzc", "fzllc", "est", "wll",
+}
+
+
+def normalize_vendor(name):
+    """Lowercase, drop punctuation and trailing legal-form words."""
+    tokens = re.findall(r"[a-z0-9]+", (name or "").lower())
+    while len(tokens) > 1 and tokens[-1] in LEGAL_SUFFIXES:
+        tokens.pop()
+    return " ".join(tokens)
+
+
+class VendorResolver:
+    """In-memory index of suppliers with their purchase currency.
+
+    The supplier list is loaded in one ``search_read`` that reads
+    ``property_purchase_currency_id`` alongside the name; the many2one
+    comes back as ``[id, "EUR"]``, so the currency needs no second read.
+    Names are matched on a normalized form ("ACME Trading LLC" and
+    "Acme Trading" are the same vendor). Vendors created by this process
+    are added with ``remember`` so repeat suppliers cost no RPC at all.
+    The index is reloaded every ``ttl`` seconds or on ``invalidate()``,
+    by one caller at a time while the others wait for it. The index dict
+    is never changed in place, only replaced, so lookups read a consistent
+    snapshot without the lock.
+    """
+
+    def __init__(self, execute, ttl=900):
+        self.execute = execute
+        self.ttl = ttl
+        self.by_name = {}
+        self.loaded_at = None
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()
+
+    @staticmethod
+    def _vendor(row):
+        currency = row.get("property_purchase_currency_id")
+        return {
+            "id": row["id"],
+            "name": row["name"],
+            "currency": currency[1] if currency else None,
+        }
+
+    def load(self):
+        """Load every supplier into the index."""
+        rows = self.execute(
+            "res.partner", "search_read",
+            [[["supplier_rank", ">", 0]]],
+            {"fields": VENDOR_FIELDS, "order": "id"}
+        )
+        by_name = {}
+        for row in rows:
+            by_name.setdefault(normalize_vendor(row["name"]), self._vendor(row))
+        with self.lock:
+            self.by_name = by_name
+            self.loaded_at = time.monotonic()
+        return len(by_name)
+
+    def _fresh(self):
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < self.ttl
+
+    def resolve(self, name):
+        """Return ``{"id", "name", "currency"}`` for a vendor name, or None."""
+        key = normalize_vendor(name)
+        if not key:
+            return None
+        if not self._fresh():
+            with self.load_lock:
+                if not self._fresh():
+                    self.load()
+        by_name = self.by_name
+        vendor = by_name.get(key)
+        if vendor:
+            return vendor
+        # Same containment test as an ilike search, but local
+        for indexed, vendor in by_name.items():
+            if key in indexed:
+                return vendor
+        return None
+
+    def find(self, name):
+        """Like ``resolve``, but a miss is checked live in Odoo.
+
+        The index may predate suppliers added since it loaded (in Odoo or
+        by another worker), so call this before creating a vendor.
+        """
+        vendor = self.resolve(name)
+        if vendor or not normalize_vendor(name):
+            return vendor
+        rows = self.execute(
+            "res.partner", "search_read",
+            [[["name", "=ilike", name.strip()], ["supplier_rank", ">", 0]]],
+            {"fields": VENDOR_FIELDS, "order": "id", "limit": 1}
+        )
+        if not rows:
+            return None
+        vendor = self._vendor(rows[0])
+        self.remember(vendor["id"], vendor["name"], vendor["currency"])
+        return vendor
+
+    def remember(self, vendor_id, name, currency=None):
+        """Add a vendor this process just created or looked up."""
+        vendor = {"id": vendor_id, "name": name, "currency": currency}
+        with self.lock:
+            self.by_name = dict(self.by_name, **{normalize_vendor(name): vendor})
+
+    def invalidate(self, name=None):
+        """Forget one vendor, or drop the whole index so it reloads on next use."""
+        with self.lock:
+            if name is None:
+                self.loaded_at = None
+            else:
+                by_name = dict(self.by_name)
+                by_name.pop(normalize_vendor(name), None)
+                self.by_name = by_name
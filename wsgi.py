@@ -0,0 +1,11 @@
+"""WSGI entry point for production: ``gunicorn -c gunicorn.conf.py wsgi:app``.
+
+Importing this module connects to Odoo and preloads the vendor index,
+currency rates and product catalog. With ``preload_app`` gunicorn does
+that once in the master process and every forked worker starts warm.
+If Odoo cannot be reached, the server starts anyway and each worker keeps
+connecting in the background (``post_fork`` in ``gunicorn.conf.py``).
+"""
+from app import app, odoo_integration
+
+odoo_integration.warm_up()